@@ -0,0 +1,375 @@
+# -*- coding: UTF-8 -*-
+"""
+基金数据缓存模块 v1.0
+FundMetaCache: 基于 SQLite 保存 基金代码 → fund_key/基金名称/基金类型 的映射，
+               供 fund_classifier.py 与 fund_valuation.py 共用，跨进程复用查询结果
+NavDetailCache: 进程内的净值详情缓存，按交易日历（见 fund_calendar）判断净值是否可能已更新
+FundUniverseIndex: 基于 SQLite 保存东方财富网全市场基金列表（代码/名称/官方类型），
+                   供 fund_classifier.py 批量分类，无需逐只请求
+"""
+
+import datetime
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+from fund_calendar import MarketCalendar
+
+DEFAULT_CACHE_DIR = ".cache"
+
+
+class FundMetaCache:
+    """基金元数据缓存（SQLite，带过期时间与容量上限）"""
+
+    FIELDS = ("fund_key", "fund_name", "fund_type")
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        ttl: int = 7 * 24 * 3600,
+        max_entries: int = 200000,
+        evict_every: int = 256,
+        touch_interval: int = 3600,
+        touch_batch: int = 256
+    ):
+        """
+        初始化元数据缓存
+
+        Args:
+            cache_dir: 缓存目录，数据库文件为 cache_dir/fund_meta.db
+            ttl: 条目有效期（秒），过期条目视为未命中
+            max_entries: 最大条目数，超出后按最近访问时间淘汰
+            evict_every: 每写入多少次检查一次容量
+            touch_interval: 命中时访问时间早于该秒数才记录新的访问时间（淘汰只需要粗粒度的访问时间）
+            touch_batch: 暂存的访问时间达到该数量时批量写入
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self.touch_interval = touch_interval
+        self.touch_batch = touch_batch
+        self._writes_since_evict = 0
+        # 基金代码 → 待写入的访问时间，命中时不再逐条 UPDATE + commit
+        self._pending_touches: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, "fund_meta.db")
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fund_meta (
+                fund_code   TEXT PRIMARY KEY,
+                fund_key    TEXT,
+                fund_name   TEXT,
+                fund_type   TEXT,
+                updated_at  REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_fund_meta_accessed ON fund_meta (accessed_at)"
+        )
+        self._conn.commit()
+
+        self.evict()
+
+    def get(self, fund_code: str) -> Optional[Dict]:
+        """
+        查询基金元数据
+
+        命中时只在访问时间已过期 touch_interval 时暂存新的访问时间，累计 touch_batch 条后批量写入
+
+        Returns:
+            未过期时返回 {"fund_key", "fund_name", "fund_type"}（缺失字段为 None），否则返回 None
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fund_key, fund_name, fund_type, updated_at, accessed_at FROM fund_meta WHERE fund_code = ?",
+                (fund_code,)
+            ).fetchone()
+
+            if not row:
+                return None
+
+            if now - row[3] > self.ttl:
+                return None
+
+            if now - row[4] > self.touch_interval:
+                self._pending_touches[fund_code] = now
+                if len(self._pending_touches) >= self.touch_batch:
+                    self._flush_touches()
+
+        return dict(zip(self.FIELDS, row[:3]))
+
+    def _flush_touches(self, commit: bool = True):
+        """批量写入暂存的访问时间（调用方需持有 _lock）"""
+        if not self._pending_touches:
+            return
+        touches = [(accessed_at, code) for code, accessed_at in self._pending_touches.items()]
+        self._pending_touches.clear()
+        try:
+            self._conn.executemany(
+                "UPDATE fund_meta SET accessed_at = MAX(accessed_at, ?) WHERE fund_code = ?",
+                touches
+            )
+            if commit:
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"写入元数据缓存访问时间失败: {e}")
+
+    def put(self, fund_code: str, **fields):
+        """
+        写入基金元数据，只覆盖传入的非空字段
+
+        Args:
+            fund_code: 基金代码
+            **fields: fund_key / fund_name / fund_type
+        """
+        values = [fields.get(name) for name in self.FIELDS]
+        now = time.time()
+
+        with self._lock:
+            try:
+                self._flush_touches(commit=False)
+                self._conn.execute(
+                    """
+                    INSERT INTO fund_meta (fund_code, fund_key, fund_name, fund_type, updated_at, accessed_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(fund_code) DO UPDATE SET
+                        fund_key = COALESCE(excluded.fund_key, fund_meta.fund_key),
+                        fund_name = COALESCE(excluded.fund_name, fund_meta.fund_name),
+                        fund_type = COALESCE(excluded.fund_type, fund_meta.fund_type),
+                        updated_at = excluded.updated_at,
+                        accessed_at = excluded.accessed_at
+                    """,
+                    (fund_code, *values, now, now)
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"写入基金{fund_code}元数据缓存失败: {e}")
+                return
+
+            self._writes_since_evict += 1
+            if self._writes_since_evict < self.evict_every:
+                return
+            self._writes_since_evict = 0
+
+        self.evict()
+
+    def evict(self):
+        """删除过期条目，并在超出容量时淘汰最久未访问的条目"""
+        with self._lock:
+            # 先写入暂存的访问时间，淘汰顺序才准确
+            self._flush_touches(commit=False)
+            try:
+                self._conn.execute(
+                    "DELETE FROM fund_meta WHERE updated_at < ?",
+                    (time.time() - self.ttl,)
+                )
+                count = self._conn.execute("SELECT COUNT(*) FROM fund_meta").fetchone()[0]
+                overflow = count - self.max_entries
+                if overflow > 0:
+                    self._conn.execute(
+                        """
+                        DELETE FROM fund_meta WHERE fund_code IN (
+                            SELECT fund_code FROM fund_meta ORDER BY accessed_at LIMIT ?
+                        )
+                        """,
+                        (overflow,)
+                    )
+                    logger.debug(f"元数据缓存超出容量，已淘汰 {overflow} 条")
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"清理元数据缓存失败: {e}")
+
+    def close(self):
+        """写入暂存的访问时间并关闭数据库连接"""
+        with self._lock:
+            self._flush_touches()
+            self._conn.close()
+
+
+class NavDetailCache:
+    """净值详情缓存（net_value/net_value_date 每个交易日最多变化一次）"""
+
+    def __init__(
+        self,
+        nav_publish_hour: int = 18,
+        refresh_interval: int = 1800,
+        calendar: Optional[MarketCalendar] = None
+    ):
+        """
+        初始化净值详情缓存
+
+        Args:
+            nav_publish_hour: 当日净值开始发布的时刻（小时），此前盘中只需要估值
+            refresh_interval: 净值尚未更新到预期日期时的重新获取间隔（秒）
+            calendar: 交易日历，None 表示只按工作日判断交易日
+        """
+        self.nav_publish_hour = nav_publish_hour
+        self.calendar = calendar or MarketCalendar()
+        self.refresh_interval = refresh_interval
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def latest_nav_date(self, now: Optional[datetime.datetime] = None) -> str:
+        """
+        当前时刻可以期待的最新净值日期
+
+        交易日净值发布时刻之后为当天，否则为上一个交易日
+        """
+        now = now or datetime.datetime.now()
+        return self.calendar.latest_nav_date(now, self.nav_publish_hour).strftime("%Y-%m-%d")
+
+    def get(self, fund_code: str, now: Optional[datetime.datetime] = None) -> Optional[Dict]:
+        """
+        查询仍然有效的净值详情
+
+        缓存的净值日期已达到预期最新日期，或距上次获取不足 refresh_interval 时返回缓存，
+        否则返回 None 表示需要重新获取
+        """
+        with self._lock:
+            entry = self._cache.get(fund_code)
+        if not entry:
+            return None
+
+        detail, fetched_at = entry
+        if detail["net_value_date"] >= self.latest_nav_date(now):
+            return detail
+        if time.time() - fetched_at < self.refresh_interval:
+            return detail
+        return None
+
+    def put(self, fund_code: str, detail: Dict):
+        """缓存净值详情，净值日期未知时不缓存"""
+        if not detail or detail.get("net_value_date", "N/A") == "N/A":
+            return
+        with self._lock:
+            self._cache[fund_code] = (detail, time.time())
+
+
+class FundUniverseIndex:
+    """全市场基金索引（SQLite，整表替换，按下载时间判断是否需要刷新）"""
+
+    # SQLite 单条语句的参数个数上限较低，批量查询时分块
+    LOOKUP_BATCH = 500
+
+    def __init__(self, cache_dir: Optional[str] = DEFAULT_CACHE_DIR, ttl: int = 24 * 3600):
+        """
+        初始化全市场基金索引
+
+        Args:
+            cache_dir: 缓存目录，数据库文件为 cache_dir/fund_universe.db；None 时仅保存在内存中
+            ttl: 索引有效期（秒），超过后需要重新下载
+        """
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.db_path = os.path.join(cache_dir, "fund_universe.db")
+        else:
+            self.db_path = ":memory:"
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+        if cache_dir:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fund_universe (
+                fund_code TEXT PRIMARY KEY,
+                fund_name TEXT NOT NULL,
+                fund_type TEXT NOT NULL,
+                pinyin    TEXT
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fund_universe_meta (
+                id        INTEGER PRIMARY KEY CHECK (id = 1),
+                loaded_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM fund_universe").fetchone()[0]
+
+    @property
+    def loaded_at(self) -> Optional[float]:
+        """最近一次写入索引的时间戳，从未写入时为 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT loaded_at FROM fund_universe_meta WHERE id = 1").fetchone()
+        return row[0] if row else None
+
+    def is_fresh(self) -> bool:
+        """索引是否存在且未过期"""
+        loaded_at = self.loaded_at
+        return loaded_at is not None and time.time() - loaded_at <= self.ttl
+
+    def replace(self, entries: Iterable[Tuple[str, str, str, str]]) -> int:
+        """
+        用新下载的基金列表整体替换索引
+
+        Args:
+            entries: [(基金代码, 基金名称, 基金类型, 拼音缩写), ...]
+
+        Returns:
+            写入的基金数量
+        """
+        with self._lock:
+            try:
+                with self._conn:
+                    self._conn.execute("DELETE FROM fund_universe")
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO fund_universe (fund_code, fund_name, fund_type, pinyin) "
+                        "VALUES (?, ?, ?, ?)",
+                        entries
+                    )
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO fund_universe_meta (id, loaded_at) VALUES (1, ?)",
+                        (time.time(),)
+                    )
+                return self._conn.execute("SELECT COUNT(*) FROM fund_universe").fetchone()[0]
+            except sqlite3.Error as e:
+                logger.warning(f"写入全市场基金索引失败: {e}")
+                return 0
+
+    def lookup(self, fund_codes: List[str]) -> Dict[str, Dict]:
+        """
+        批量查询基金
+
+        Returns:
+            {基金代码: {"fund_name", "fund_type"}}，只包含命中的基金
+        """
+        found = {}
+        with self._lock:
+            for i in range(0, len(fund_codes), self.LOOKUP_BATCH):
+                batch = fund_codes[i:i + self.LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT fund_code, fund_name, fund_type FROM fund_universe "
+                    f"WHERE fund_code IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for code, name, fund_type in rows:
+                    found[code] = {"fund_name": name, "fund_type": fund_type}
+        return found
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,201 @@
+# -*- coding: UTF-8 -*-
+"""
+A股交易日历模块 v1.0
+交易日 = 工作日且不在节假日列表中；节假日从文本文件加载（每行一个 YYYY-MM-DD，# 开头为注释）
+盘中估值只在交易时段（9:30-11:30、13:00-15:00）更新，净值在交易日晚间的发布窗口内公布
+MarketScheduler 据此计算监控模式下一次有意义的刷新时刻：
+- 交易时段内按估值刷新间隔
+- 交易日净值发布窗口内按净值刷新间隔
+- 其余时间（午休、夜间、周末、节假日）休眠到下一个交易时段或净值发布窗口开始
+"""
+
+import datetime
+import os
+import time
+from typing import Callable, Iterable, Optional, Tuple
+
+from loguru import logger
+
+# 盘中估值更新的交易时段
+TRADING_SESSIONS = (
+    (datetime.time(9, 30), datetime.time(11, 30)),
+    (datetime.time(13, 0), datetime.time(15, 0)),
+)
+
+# 日历向后查找的最大天数（覆盖最长的节假日）
+MAX_LOOKAHEAD_DAYS = 30
+# 长时间休眠时每段等待的最长秒数，系统休眠或校时后仍能按墙上时钟准时醒来
+MAX_SLEEP_STEP = 60
+
+
+def load_holidays(path: str) -> set:
+    """从文本文件加载节假日日期"""
+    holidays = set()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_num, line in enumerate(f, 1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            try:
+                holidays.add(datetime.datetime.strptime(line, "%Y-%m-%d").date())
+            except ValueError:
+                logger.warning(f"节假日文件第 {line_num} 行格式不正确，已忽略: {line}")
+    return holidays
+
+
+class MarketCalendar:
+    """A股交易日历"""
+
+    def __init__(self, holidays: Iterable[datetime.date] = (), sessions=TRADING_SESSIONS):
+        """
+        Args:
+            holidays: 非交易的工作日（法定节假日）
+            sessions: 交易时段 ((开始, 结束), ...)，按时间顺序排列
+        """
+        self.holidays = frozenset(holidays)
+        self.sessions = sessions
+
+    @classmethod
+    def from_file(cls, path: Optional[str]) -> "MarketCalendar":
+        """从节假日文件创建日历，path 为空时只按工作日判断"""
+        if not path:
+            return cls()
+        if not os.path.exists(path):
+            logger.warning(f"节假日文件不存在: {path}，只按工作日判断交易日")
+            return cls()
+        holidays = load_holidays(path)
+        logger.info(f"已加载 {len(holidays)} 个节假日: {path}")
+        return cls(holidays)
+
+    def is_trading_day(self, day: datetime.date) -> bool:
+        return day.weekday() < 5 and day not in self.holidays
+
+    def previous_trading_day(self, day: datetime.date) -> datetime.date:
+        """day 之前（不含 day）最近的交易日"""
+        day -= datetime.timedelta(days=1)
+        for _ in range(MAX_LOOKAHEAD_DAYS):
+            if self.is_trading_day(day):
+                return day
+            day -= datetime.timedelta(days=1)
+        return day
+
+    def next_trading_day(self, day: datetime.date) -> datetime.date:
+        """day 之后（不含 day）最近的交易日"""
+        day += datetime.timedelta(days=1)
+        for _ in range(MAX_LOOKAHEAD_DAYS):
+            if self.is_trading_day(day):
+                return day
+            day += datetime.timedelta(days=1)
+        return day
+
+    def session_end(self, now: datetime.datetime) -> Optional[datetime.datetime]:
+        """now 处于交易时段内时返回该时段的结束时刻，否则返回 None"""
+        if not self.is_trading_day(now.date()):
+            return None
+        for start, end in self.sessions:
+            if start <= now.time() < end:
+                return datetime.datetime.combine(now.date(), end)
+        return None
+
+    def next_estimate_update(self, now: datetime.datetime) -> datetime.datetime:
+        """盘中估值下一次可能更新的时刻：交易时段内为 now，否则为下一个交易时段开始"""
+        day = now.date()
+        if self.is_trading_day(day):
+            for start, end in self.sessions:
+                if now.time() < end:
+                    return max(now, datetime.datetime.combine(day, start))
+        day = self.next_trading_day(day)
+        return datetime.datetime.combine(day, self.sessions[0][0])
+
+    def latest_nav_date(self, now: datetime.datetime, publish_hour: int) -> datetime.date:
+        """now 时刻可以期待的最新净值日期：交易日发布时刻之后为当天，否则为上一个交易日"""
+        day = now.date()
+        if self.is_trading_day(day) and now.hour >= publish_hour:
+            return day
+        return self.previous_trading_day(day)
+
+
+class MarketScheduler:
+    """监控模式的刷新时刻计算"""
+
+    def __init__(
+        self,
+        calendar: MarketCalendar,
+        estimate_interval: float,
+        nav_interval: float = 600,
+        nav_window: Tuple[int, int] = (18, 23)
+    ):
+        """
+        Args:
+            calendar: 交易日历
+            estimate_interval: 交易时段内的刷新间隔（秒）
+            nav_interval: 净值发布窗口内的刷新间隔（秒）
+            nav_window: 交易日净值发布窗口 (开始小时, 结束小时)
+        """
+        self.calendar = calendar
+        self.estimate_interval = estimate_interval
+        self.nav_interval = nav_interval
+        self.nav_window = nav_window
+
+    def _nav_window(self, day: datetime.date) -> Tuple[datetime.datetime, datetime.datetime]:
+        start_hour, end_hour = self.nav_window
+        return (
+            datetime.datetime.combine(day, datetime.time(start_hour)),
+            datetime.datetime.combine(day, datetime.time(end_hour)),
+        )
+
+    def is_active(self, now: datetime.datetime) -> bool:
+        """now 是否处于交易时段或交易日净值发布窗口内"""
+        if self.calendar.session_end(now):
+            return True
+        if not self.calendar.is_trading_day(now.date()):
+            return False
+        window_start, window_end = self._nav_window(now.date())
+        return window_start <= now < window_end
+
+    def next_run(self, now: Optional[datetime.datetime] = None) -> Tuple[datetime.datetime, str]:
+        """
+        下一次刷新的时刻与原因
+
+        交易时段内的最后一次刷新对齐到收盘时刻，以取得当日最终估值
+        """
+        now = now or datetime.datetime.now()
+
+        session_end = self.calendar.session_end(now)
+        if session_end:
+            return min(now + datetime.timedelta(seconds=self.estimate_interval), session_end), "盘中估值"
+
+        if self.calendar.is_trading_day(now.date()):
+            window_start, window_end = self._nav_window(now.date())
+            if window_start <= now < window_end:
+                return min(now + datetime.timedelta(seconds=self.nav_interval), window_end), "净值发布"
+            nav_start = window_start if now < window_start else None
+        else:
+            nav_start = None
+
+        next_session = self.calendar.next_estimate_update(now)
+        if nav_start is None:
+            nav_start = self._nav_window(self.calendar.next_trading_day(now.date()))[0]
+
+        if next_session <= nav_start:
+            return next_session, "开盘"
+        return nav_start, "净值发布"
+
+
+def sleep_until(moment: datetime.datetime, wait: Callable[[float], Optional[bool]] = time.sleep) -> bool:
+    """
+    按墙上时钟分段等待到 moment
+
+    Args:
+        moment: 醒来的时刻
+        wait: 等待函数，返回 True 表示提前结束（如 threading.Event.wait）
+
+    Returns:
+        是否被提前结束
+    """
+    while True:
+        remaining = (moment - datetime.datetime.now()).total_seconds()
+        if remaining <= 0:
+            return False
+        if wait(min(remaining, MAX_SLEEP_STEP)):
+            return True
@@ -0,0 +1,215 @@
+# -*- coding: UTF-8 -*-
+"""
+基金分类存储模块 v1.0
+category.txt 的 SQLite 索引格式：按基金代码建唯一索引，支持按代码查询与按原顺序惰性遍历，
+十万级基金的分类文件无需整体读入内存
+提供文本格式（FUND|基金代码|基金名称|基金类型|状态）与索引格式的互相转换
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+from typing import Dict, Iterable, Iterator, Optional
+
+from loguru import logger
+
+SQLITE_HEADER = b"SQLite format 3\x00"
+CATEGORY_FIELDS = ("fund_code", "fund_name", "fund_type", "status")
+
+
+def is_category_db(path: str) -> bool:
+    """根据文件头判断是否为 SQLite 索引格式的分类文件"""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+    except OSError:
+        return False
+
+
+def parse_category_line(line: str) -> Optional[Dict]:
+    """解析文本分类文件的一行，注释、空行或格式不符时返回 None"""
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+
+    parts = line.split('|')
+    if parts[0] != 'FUND' or len(parts) < 5:
+        return None
+
+    return dict(zip(CATEGORY_FIELDS, parts[1:5]))
+
+
+def format_category_line(record: Dict) -> str:
+    """格式化为文本分类文件的一行"""
+    return f"FUND|{record['fund_code']}|{record['fund_name']}|{record['fund_type']}|{record['status']}"
+
+
+def iter_category_text(path: str) -> Iterator[Dict]:
+    """逐行遍历文本分类文件"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            record = parse_category_line(line)
+            if record:
+                yield record
+
+
+class CategoryStore:
+    """SQLite 索引格式的分类文件"""
+
+    # 惰性遍历时每次从数据库读取的行数
+    FETCH_SIZE = 1000
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS category (
+                seq       INTEGER PRIMARY KEY,
+                fund_code TEXT NOT NULL UNIQUE,
+                fund_name TEXT NOT NULL,
+                fund_type TEXT NOT NULL,
+                status    TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+        self._len = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self) -> int:
+        if self._len is None:
+            self._len = self._conn.execute("SELECT COUNT(*) FROM category").fetchone()[0]
+        return self._len
+
+    def __iter__(self) -> Iterator[Dict]:
+        """按写入顺序惰性遍历所有基金"""
+        cursor = self._conn.execute(
+            "SELECT fund_code, fund_name, fund_type, status FROM category ORDER BY seq"
+        )
+        while True:
+            rows = cursor.fetchmany(self.FETCH_SIZE)
+            if not rows:
+                return
+            for row in rows:
+                yield dict(zip(CATEGORY_FIELDS, row))
+
+    def get(self, fund_code: str) -> Optional[Dict]:
+        """按基金代码查询"""
+        row = self._conn.execute(
+            "SELECT fund_code, fund_name, fund_type, status FROM category WHERE fund_code = ?",
+            (fund_code,)
+        ).fetchone()
+        return dict(zip(CATEGORY_FIELDS, row)) if row else None
+
+    def replace(self, records: Iterable[Dict]) -> int:
+        """
+        用 records 整体替换分类内容，保持记录顺序，重复代码以最后一条为准
+
+        Returns:
+            写入后的基金数量
+        """
+        with self._conn:
+            self._conn.execute("DELETE FROM category")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO category (fund_code, fund_name, fund_type, status) VALUES (?, ?, ?, ?)",
+                ((r['fund_code'], r['fund_name'], r['fund_type'], r['status']) for r in records)
+            )
+        self._len = None
+        return len(self)
+
+    def close(self):
+        """关闭数据库连接"""
+        self._conn.close()
+
+
+def write_category_db(records: Iterable[Dict], db_path: str) -> int:
+    """将分类记录写入索引文件（先写临时文件再替换）"""
+    tmp_path = db_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    try:
+        with CategoryStore(tmp_path) as store:
+            count = store.replace(records)
+        os.replace(tmp_path, db_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count
+
+
+def write_category_text(records: Iterable[Dict], text_path: str) -> int:
+    """将分类记录写为文本分类文件（不含统计头，先写临时文件再替换）"""
+    count = 0
+    tmp_path = text_path + ".tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write("# 基金分类配置文件\n")
+            f.write("# 字段: FUND|基金代码|基金名称|基金类型|状态\n")
+            for record in records:
+                f.write(format_category_line(record) + '\n')
+                count += 1
+        os.replace(tmp_path, text_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count
+
+
+def convert_category(input_file: str, output_file: str) -> int:
+    """
+    在文本格式与索引格式之间转换，方向由输入文件格式决定
+
+    Returns:
+        转换的基金数量
+    """
+    if is_category_db(input_file):
+        with CategoryStore(input_file) as store:
+            count = write_category_text(store, output_file)
+        logger.info(f"索引分类文件已转换为文本格式: {output_file} ({count} 只基金)")
+    else:
+        count = write_category_db(iter_category_text(input_file), output_file)
+        logger.info(f"文本分类文件已转换为索引格式: {output_file} ({count} 只基金)")
+    return count
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description="分类文件格式转换工具 - 文本格式与 SQLite 索引格式互相转换",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  # 文本 → 索引
+  python fund_category.py -i category.txt -o category.db
+
+  # 索引 → 文本
+  python fund_category.py -i category.db -o category.txt
+        """
+    )
+
+    parser.add_argument("-i", "--input", type=str, required=True,
+                        help="输入分类文件（文本或索引格式，自动识别）")
+    parser.add_argument("-o", "--output", type=str, required=True,
+                        help="输出分类文件")
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        logger.error(f"分类文件不存在: {args.input}")
+        sys.exit(1)
+
+    convert_category(args.input, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,34 +5,109 @@
 输入：funds_list.txt
 输出：category.txt（标准化分类文件）
 数据源：东方财富网/天天基金网
+可选使用东方财富网全市场基金列表批量分类，仅列表中未找到的基金逐只查询；
+增量模式下只分析 category.txt 中尚不存在或分析失败的基金
 """
 
 import argparse
 import json
 import os
 import re
+import shutil
 import sys
+import tempfile
 import threading
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from typing import Dict, List, Optional
 
-import requests
 import urllib3
 from loguru import logger
 
+from fund_cache import DEFAULT_CACHE_DIR, FundMetaCache, FundUniverseIndex
+from fund_category import (
+    CategoryStore,
+    format_category_line,
+    is_category_db,
+    iter_category_text,
+    write_category_db,
+)
+from fund_http import create_session, format_pool_stats, prewarm, session_pool_stats
+from fund_parser import STREAM_CHUNK_SIZE, parse_eastmoney_info_stream, parse_fund_universe
+from fund_ratelimit import DEFAULT_INITIAL_RATE, DEFAULT_RATE_LIMIT, HostRateLimiter
+
 urllib3.disable_warnings()
 
 
 class FundClassifier:
     """基金分类器"""
 
-    def __init__(self, max_workers: int = 4):
-        self.session = requests.Session()
+    FUND_UNIVERSE_URL = "http://fund.eastmoney.com/js/fundcode_search.js"
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+        use_universe: bool = False,
+        rate_limit: float = DEFAULT_RATE_LIMIT
+    ):
+        """
+        初始化分类器
+
+        Args:
+            max_workers: 逐只查询时的并行线程数
+            cache_dir: 基金元数据与全市场基金索引的缓存目录，None 表示不持久化
+            use_universe: 是否先用全市场基金列表批量分类
+            rate_limit: 每个主机的速率上限（次/秒），实际速率自动探测，遇到限流自动降速；0 表示不限速
+        """
+        self.rate_limiter = HostRateLimiter(rate_limit) if rate_limit else None
+        self.session = create_session(pool_size=max_workers, rate_limiter=self.rate_limiter)
+        prewarm(self.session, ["http://fund.eastmoney.com/"])
         self.fund_cache = {}
+        self.meta_cache = FundMetaCache(cache_dir) if cache_dir else None
+        self.universe = FundUniverseIndex(cache_dir) if use_universe else None
         self.max_workers = max_workers
 
+    def load_universe(self, force_refresh: bool = False) -> bool:
+        """
+        确保全市场基金索引可用，索引不存在、已过期或 force_refresh 时重新下载
+
+        Returns:
+            索引是否可用；下载失败但存在旧索引时继续使用旧索引
+        """
+        if self.universe is None:
+            return False
+
+        if not force_refresh and self.universe.is_fresh():
+            logger.info(f"使用本地全市场基金索引: {len(self.universe)} 只基金")
+            return True
+
+        try:
+            headers = {
+                "Accept-Encoding": "gzip, deflate",
+                "Referer": "http://fund.eastmoney.com/"
+            }
+            response = self.session.get(
+                self.FUND_UNIVERSE_URL, headers=headers, timeout=30, verify=False, expect_html=False
+            )
+            response.encoding = 'utf-8'
+
+            entries = parse_fund_universe(response.text)
+            if not entries:
+                raise ValueError("基金列表为空或格式无法解析")
+
+            count = self.universe.replace(entries)
+            logger.info(f"全市场基金索引已更新: {count} 只基金")
+            return count > 0
+
+        except Exception as e:
+            logger.error(f"下载全市场基金列表失败: {e}")
+            if len(self.universe):
+                logger.warning("继续使用已过期的本地全市场基金索引")
+                return True
+            return False
+
     def read_fund_codes(self, file_path: str) -> List[str]:
         """从文件读取基金代码列表"""
         fund_codes = []
@@ -64,41 +139,65 @@ class FundClassifier:
             logger.error(f"读取基金代码文件失败: {e}")
             return []
 
+    @staticmethod
+    def infer_fund_type(fund_name: str) -> str:
+        """根据基金名称关键字判断基金类型"""
+        if "QDII" in fund_name.upper():
+            return "QDII型"
+        elif "指数" in fund_name or "ETF" in fund_name.upper():
+            return "指数型"
+        elif "债券" in fund_name:
+            return "债券型"
+        elif "货币" in fund_name:
+            return "货币型"
+        return "普通型"
+
     def get_fund_info_from_eastmoney(self, fund_code: str) -> Optional[Dict]:
-        """从东方财富网获取基金基本信息"""
+        """从东方财富网获取基金基本信息（优先读取本地缓存）"""
+        if fund_code in self.fund_cache:
+            return self.fund_cache[fund_code]
+
+        cached = self.meta_cache.get(fund_code) if self.meta_cache else None
+        if cached and cached["fund_name"]:
+            fund_info = {
+                "fund_code": fund_code,
+                "fund_name": cached["fund_name"],
+                "fund_type": cached["fund_type"] or self.infer_fund_type(cached["fund_name"])
+            }
+            self.fund_cache[fund_code] = fund_info
+            return fund_info
+
         try:
             url = f"http://fund.eastmoney.com/pingzhongdata/{fund_code}.js"
             headers = {
-                "Referer": f"http://fund.eastmoney.com/{fund_code}.html",
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+                "Accept-Encoding": "gzip, deflate",
+                "Referer": f"http://fund.eastmoney.com/{fund_code}.html"
             }
 
-            response = self.session.get(url, headers=headers, timeout=10, verify=False)
-            response.encoding = 'utf-8'
-
-            name_match = re.search(r'var fS_name = "(.*?)"', response.text)
-            fund_name = name_match.group(1) if name_match else f"基金{fund_code}"
+            # 只需要脚本开头的 fS_name / fS_code，取到后即关闭连接，不下载净值历史
+            with self.session.get(
+                url, headers=headers, timeout=10, verify=False, stream=True, expect_html=False
+            ) as response:
+                parsed = parse_eastmoney_info_stream(
+                    fund_code, response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+                )
 
-            code_match = re.search(r'var fS_code = "(.*?)"', response.text)
-            fund_code_actual = code_match.group(1) if code_match else fund_code
+            fund_name = parsed["fund_name"]
+            fund_code_actual = parsed["fund_key"]
 
-            # 判断基金类型
-            fund_type = "普通型"
-            if "QDII" in fund_name.upper():
-                fund_type = "QDII型"
-            elif "指数" in fund_name or "ETF" in fund_name.upper():
-                fund_type = "指数型"
-            elif "债券" in fund_name:
-                fund_type = "债券型"
-            elif "货币" in fund_name:
-                fund_type = "货币型"
+            fund_type = self.infer_fund_type(fund_name)
 
-            return {
+            fund_info = {
                 "fund_code": fund_code_actual,
                 "fund_name": fund_name,
                 "fund_type": fund_type
             }
 
+            self.fund_cache[fund_code] = fund_info
+            if self.meta_cache:
+                self.meta_cache.put(fund_code, fund_name=fund_name, fund_type=fund_type)
+            return fund_info
+
         except Exception as e:
             logger.error(f"从东方财富网获取基金{fund_code}信息失败: {e}")
             return None
@@ -123,8 +222,79 @@ class FundClassifier:
             "status": "success"
         }
 
-    def analyze_all_funds(self, fund_codes: List[str]) -> List[Dict]:
-        """批量分析多只基金（并行化）"""
+    def analyze_all_funds(self, fund_codes: List[str], universe_ready: Optional[bool] = None) -> List[Dict]:
+        """
+        批量分析多只基金，启用全市场索引时只逐只查询索引中未找到的基金
+
+        Args:
+            fund_codes: 基金代码列表
+            universe_ready: 调用方已执行 load_universe 时传入其结果，不再重复加载（下载失败时不会再下载一次）
+        """
+        if universe_ready is None:
+            universe_ready = self.load_universe()
+        if self.universe is None or not universe_ready:
+            return self.analyze_funds_online(fund_codes)
+
+        hits = self.universe.lookup(fund_codes)
+        misses = [code for code in fund_codes if code not in hits]
+        logger.info(f"全市场基金索引命中 {len(hits)} 只，需逐只查询 {len(misses)} 只")
+
+        online = {r["fund_code"]: r for r in self.analyze_funds_online(misses)} if misses else {}
+
+        results = []
+        for code in fund_codes:
+            if code in hits:
+                results.append({
+                    "fund_code": code,
+                    "fund_name": hits[code]["fund_name"],
+                    "fund_type": hits[code]["fund_type"],
+                    "status": "success"
+                })
+            else:
+                results.append(online[code])
+        return results
+
+    def analyze_incremental(
+        self,
+        fund_codes: List[str],
+        category_file: str,
+        universe_ready: Optional[bool] = None
+    ) -> List[Dict]:
+        """
+        增量分析：复用已有分类文件中成功的结果，只分析新增或失败的基金
+
+        Args:
+            fund_codes: 当前基金代码列表，结果按此顺序排列
+            category_file: 已有的分类文件，不存在时等同于全量分析
+            universe_ready: 见 analyze_all_funds
+
+        Returns:
+            与全量分析格式相同的结果列表
+        """
+        existing = {}
+        if os.path.exists(category_file):
+            try:
+                if is_category_db(category_file):
+                    with CategoryStore(category_file) as store:
+                        records = list(store)
+                else:
+                    records = list(iter_category_text(category_file))
+                existing = {r["fund_code"]: r for r in records if r["status"] != "failed"}
+            except Exception as e:
+                logger.error(f"解析已有分类文件失败，改为全量分析: {e}")
+
+        pending = [code for code in fund_codes if code not in existing]
+        removed = len(set(existing) - set(fund_codes))
+        logger.info(
+            f"增量分析: 复用 {len(fund_codes) - len(pending)} 只，待分析 {len(pending)} 只，"
+            f"移除 {removed} 只"
+        )
+
+        fresh = {r["fund_code"]: r for r in self.analyze_all_funds(pending, universe_ready)} if pending else {}
+        return [existing[code] if code in existing else fresh[code] for code in fund_codes]
+
+    def analyze_funds_online(self, fund_codes: List[str]) -> List[Dict]:
+        """逐只请求分析多只基金（并行化）"""
         results = []
         result_lock = threading.Lock()
 
@@ -147,7 +317,12 @@ class FundClassifier:
         return results
 
     def generate_category_file(self, results: List[Dict], output_file: str = "category.txt"):
-        """生成标准化的分类文件"""
+        """生成标准化的分类文件，output_file 以 .db 结尾时生成索引格式"""
+        if output_file.endswith(".db"):
+            count = write_category_db(results, output_file)
+            logger.info(f"索引分类文件已生成: {output_file} ({count} 只基金)")
+            return output_file
+
         lines = []
 
         now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -179,12 +354,23 @@ class FundClassifier:
         lines.append("")
 
         for r in results:
-            line = f"FUND|{r['fund_code']}|{r['fund_name']}|{r['fund_type']}|{r['status']}"
-            lines.append(line)
-            lines.append("")
+            lines.append(format_category_line(r))
 
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(lines))
+        # 先写临时文件再替换，避免中途失败留下不完整的分类文件
+        output_dir = os.path.dirname(os.path.abspath(output_file))
+        fd, tmp_path = tempfile.mkstemp(prefix=".category_", suffix=".tmp", dir=output_dir)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+            # mkstemp 创建的文件权限为 0600，保持与直接写入时一致
+            if os.path.exists(output_file):
+                shutil.copymode(output_file, tmp_path)
+            else:
+                os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, output_file)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
 
         logger.info(f"分类文件已生成: {output_file}")
         logger.info(f"  - 基金总数: {total}")
@@ -205,6 +391,9 @@ class FundClassifier:
         print(f"\n总计: {total} 只基金")
         print(f"成功: {success} 只")
         print(f"失败: {total - success} 只")
+        print(format_pool_stats(session_pool_stats(self.session)))
+        if self.rate_limiter:
+            print(self.rate_limiter.summary())
 
         type_count = {}
         for r in results:
@@ -240,16 +429,34 @@ def main():
 
   # 指定基金代码（逗号分隔）
   python fund_classifier.py --codes 017174,023537,513260
+
+  # 使用全市场基金列表批量分类（适合大量基金）
+  python fund_classifier.py --universe
+
+  # 增量分类：只分析 category.txt 中没有或失败的基金
+  python fund_classifier.py --incremental
         """
     )
 
     parser.add_argument("-i", "--input", type=str, default="funds_list.txt",
                         help="输入基金代码文件路径 (默认: funds_list.txt)")
     parser.add_argument("-o", "--output", type=str, default="category.txt",
-                        help="输出分类文件路径 (默认: category.txt)")
+                        help="输出分类文件路径，以 .db 结尾时输出索引格式 (默认: category.txt)")
     parser.add_argument("--codes", type=str, help="直接指定基金代码，逗号分隔")
     parser.add_argument("--workers", type=int, default=4,
                         help="并行线程数 (默认: 4)")
+    parser.add_argument("--cache-dir", type=str, default=DEFAULT_CACHE_DIR,
+                        help=f"基金元数据缓存目录 (默认: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="不使用本地元数据缓存")
+    parser.add_argument("--rate-limit", type=float, default=DEFAULT_RATE_LIMIT,
+                        help=f"每个主机的速率上限（次/秒），实际速率从 {DEFAULT_INITIAL_RATE:g} 起自动探测，遇到限流自动降速，0 表示不限速 (默认: {DEFAULT_RATE_LIMIT:g})")
+    parser.add_argument("--universe", action="store_true",
+                        help="使用东方财富网全市场基金列表批量分类，仅未找到的基金逐只查询")
+    parser.add_argument("--refresh-universe", action="store_true",
+                        help="强制重新下载全市场基金列表（隐含 --universe）")
+    parser.add_argument("--incremental", action="store_true",
+                        help="增量模式：复用输出文件中已成功分类的基金，只分析新增或失败的基金")
     parser.add_argument("--verbose", action="store_true", help="显示详细日志")
 
     args = parser.parse_args()
@@ -258,7 +465,15 @@ def main():
         logger.remove()
         logger.add(sys.stderr, level="DEBUG")
 
-    classifier = FundClassifier(max_workers=args.workers)
+    classifier = FundClassifier(
+        max_workers=args.workers,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        use_universe=args.universe or args.refresh_universe,
+        rate_limit=args.rate_limit
+    )
+
+    # 强制刷新的结果（包括下载失败）直接交给分析步骤，不再按常规条件重新加载
+    universe_ready = classifier.load_universe(force_refresh=True) if args.refresh_universe else None
 
     fund_codes = []
 
@@ -273,7 +488,10 @@ def main():
         return
 
     logger.info(f"开始分析 {len(fund_codes)} 只基金...")
-    results = classifier.analyze_all_funds(fund_codes)
+    if args.incremental:
+        results = classifier.analyze_incremental(fund_codes, args.output, universe_ready)
+    else:
+        results = classifier.analyze_all_funds(fund_codes, universe_ready)
 
     classifier.generate_category_file(results, args.output)
     classifier.print_summary(results)
@@ -0,0 +1,254 @@
+# -*- coding: UTF-8 -*-
+"""
+自适应并发模块 v1.0
+AIMD（加性增、乘性减）控制同时在途的基金数量：
+- 启动阶段（慢启动）：延迟与失败率正常且并发已被用满时，每完成一只基金并发加 1，每轮约翻倍
+- 首次退化之后：每完成约一轮（当前并发数只基金）并发加 1
+- 平滑延迟超过基线的若干倍或失败率超过阈值时，并发乘以减小系数，每轮最多减一次
+基线取观察到的最低平滑延迟，并在数分钟内逐渐向当前延迟靠拢，以适应开盘与晚间上游延迟的变化
+同步代码用 slot()（或 acquire()/release()），异步代码用 async_slot()（可在多个事件循环中使用，如多次 asyncio.run）
+"""
+
+import asyncio
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+# 自适应模式下的初始并发
+INITIAL_CONCURRENCY = 4
+# 固定并发时多线程引擎默认的线程数
+DEFAULT_MAX_WORKERS = 4
+# 自适应并发时多线程引擎默认的并发上限，实际并发从 INITIAL_CONCURRENCY 起按上游状况调整
+ADAPTIVE_MAX_WORKERS = 32
+
+
+def default_max_workers(adaptive: bool) -> int:
+    """未指定线程数时多线程引擎的并发上限"""
+    return ADAPTIVE_MAX_WORKERS if adaptive else DEFAULT_MAX_WORKERS
+
+
+class _Slot:
+    """一次占用的结果，调用方在成功时置 ok = True"""
+
+    __slots__ = ("ok", "start")
+
+    def __init__(self):
+        self.ok = False
+        self.start = time.monotonic()
+
+
+class AdaptiveConcurrency:
+    """AIMD 并发控制器（线程安全；异步用法需在同一个事件循环中）"""
+
+    def __init__(
+        self,
+        max_limit: int,
+        initial: Optional[int] = None,
+        min_limit: int = 1,
+        adaptive: bool = True,
+        latency_tolerance: float = 2.0,
+        max_error_rate: float = 0.25,
+        decrease_factor: float = 0.75,
+        baseline_window: float = 300,
+        history_size: int = 256
+    ):
+        """
+        Args:
+            max_limit: 并发上限
+            initial: 初始并发，默认为上限
+            min_limit: 并发下限
+            adaptive: False 时固定为 max_limit，只做限流不做调整
+            latency_tolerance: 平滑延迟超过基线多少倍视为退化
+            max_error_rate: 失败率（指数平滑）超过该值视为退化
+            decrease_factor: 退化时并发乘以该系数
+            baseline_window: 延迟基线向当前延迟靠拢的时间尺度（秒）
+            history_size: 保留的并发调整记录数
+        """
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.adaptive = adaptive
+        self.latency_tolerance = latency_tolerance
+        self.max_error_rate = max_error_rate
+        self.decrease_factor = decrease_factor
+        self.baseline_window = baseline_window
+
+        initial = self.max_limit if initial is None or not adaptive else initial
+        self._limit = float(min(self.max_limit, max(self.min_limit, initial)))
+        self._in_flight = 0
+        self._smoothed = None
+        self._baseline = None
+        self._baseline_updated = time.monotonic()
+        self._error_rate = 0.0
+        self._since_decrease = 0
+        self._slow_start = True
+        self.adjustments = 0
+        # (时间戳, 调整后的并发, 原因)
+        self.history = deque(maxlen=history_size)
+        self.history.append((time.time(), self.limit, "初始"))
+
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        # 每个事件循环各自的 Condition（asyncio.Condition 绑定创建时的事件循环），事件循环回收后自动移除
+        self._async_conds: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Condition]" = (
+            weakref.WeakKeyDictionary()
+        )
+        # 跨事件循环唤醒的任务，保留引用直到完成
+        self._notify_tasks = set()
+
+    @property
+    def limit(self) -> int:
+        """当前并发上限"""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _on_complete(self, latency: float, ok: bool):
+        """记录一次完成并按 AIMD 调整并发（调用方需持有锁）"""
+        saturated = self._in_flight >= self.limit
+        self._in_flight -= 1
+        if not self.adaptive:
+            return
+
+        self._error_rate = self._error_rate * 0.9 + (0.0 if ok else 0.1)
+        if ok:
+            self._smoothed = latency if self._smoothed is None else self._smoothed * 0.8 + latency * 0.2
+            now = time.monotonic()
+            if self._baseline is None or self._smoothed < self._baseline:
+                self._baseline = self._smoothed
+            else:
+                drift = min(1.0, (now - self._baseline_updated) / self.baseline_window)
+                self._baseline += (self._smoothed - self._baseline) * drift
+            self._baseline_updated = now
+
+        self._since_decrease += 1
+        previous = self.limit
+        if self._error_rate > self.max_error_rate:
+            reason = f"失败率 {self._error_rate:.0%}"
+        elif self._smoothed is not None and self._smoothed > self._baseline * self.latency_tolerance:
+            reason = f"延迟 {self._smoothed:.2f}s (基线 {self._baseline:.2f}s)"
+        else:
+            reason = None
+
+        if reason:
+            # 同一轮内的多次退化信号只减一次，避免并发被连续砍到下限
+            if self._since_decrease < previous:
+                return
+            self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+            self._since_decrease = 0
+            self._slow_start = False
+        elif saturated:
+            step = 1 if self._slow_start else 1 / self._limit
+            self._limit = min(self.max_limit, self._limit + step)
+            reason = "慢启动" if self._slow_start else "延迟正常"
+
+        if self.limit != previous:
+            self.adjustments += 1
+            self.history.append((time.time(), self.limit, reason))
+            logger.debug(f"并发 {previous} → {self.limit} ({reason})")
+
+    def acquire(self) -> _Slot:
+        """占用一个并发名额（阻塞等待），完成后必须调用 release"""
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+        return _Slot()
+
+    def release(self, slot: _Slot, record: bool = True):
+        """归还名额；record 为 False 时（如任务取消）不计入延迟与失败率"""
+        with self._cond:
+            if record:
+                self._on_complete(time.monotonic() - slot.start, slot.ok)
+            else:
+                self._in_flight -= 1
+            self._cond.notify_all()
+        self._notify_async()
+
+    @contextmanager
+    def slot(self):
+        """占用一个并发名额（阻塞等待），with 块内将 slot.ok 置为 True 表示成功"""
+        slot = self.acquire()
+        try:
+            yield slot
+        finally:
+            self.release(slot)
+
+    @asynccontextmanager
+    async def async_slot(self):
+        """占用一个并发名额（不阻塞事件循环），用法同 slot()"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            cond = self._async_conds.get(loop)
+            if cond is None:
+                cond = self._async_conds[loop] = asyncio.Condition()
+
+        async with cond:
+            await cond.wait_for(lambda: self._in_flight < self.limit)
+            with self._lock:
+                self._in_flight += 1
+
+        slot = _Slot()
+        try:
+            yield slot
+        finally:
+            with self._lock:
+                self._on_complete(time.monotonic() - slot.start, slot.ok)
+            async with cond:
+                cond.notify_all()
+            self._notify_async(exclude=loop)
+
+    def _notify_async(self, exclude: Optional[asyncio.AbstractEventLoop] = None):
+        """唤醒其他事件循环中等待名额的协程（通过 call_soon_threadsafe 在各自的事件循环中执行）"""
+        with self._lock:
+            conds = [(loop, cond) for loop, cond in self._async_conds.items() if loop is not exclude]
+        for loop, cond in conds:
+            if loop.is_closed():
+                continue
+            try:
+                loop.call_soon_threadsafe(self._schedule_notify, cond)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+
+    def _schedule_notify(self, cond: asyncio.Condition):
+        """在 cond 所属的事件循环中调用"""
+        async def notify():
+            async with cond:
+                cond.notify_all()
+
+        task = asyncio.get_running_loop().create_task(notify())
+        self._notify_tasks.add(task)
+        task.add_done_callback(self._notify_tasks.discard)
+
+    def snapshot(self) -> Dict:
+        """当前状态与调整记录"""
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "latency": self._smoothed,
+                "baseline": self._baseline,
+                "error_rate": self._error_rate,
+                "history": list(self.history),
+            }
+
+    def summary(self, recent: int = 5) -> str:
+        """格式化当前并发与最近的调整记录"""
+        history: List[Tuple[float, int, str]] = list(self.history)
+        mode = "自适应" if self.adaptive else "固定"
+        lines = [
+            f"并发({mode}): 当前 {self.limit} (范围 {self.min_limit}-{self.max_limit})，"
+            f"调整 {self.adjustments} 次"
+        ]
+        for timestamp, limit, reason in history[-recent:]:
+            lines.append(f"  {time.strftime('%H:%M:%S', time.localtime(timestamp))} → {limit} ({reason})")
+        return "\n".join(lines)
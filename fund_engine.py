@@ -0,0 +1,452 @@
+# -*- coding: UTF-8 -*-
+"""
+估值引擎共用逻辑模块 v1.0
+FundValuation（线程池 + requests）与 AsyncFundValuation（asyncio + aiohttp）只负责发出请求，
+两者共用这里实现的：
+- 请求构造：每个接口的 URL、请求头、参数与请求体（FundRequest）
+- 响应处理：解析、写入各级缓存、向熔断器记录结果
+- 决策：基金信息从哪一级缓存取得、按获取计划走哪个数据源、哪些请求可以省去
+引擎中的每个步骤都是 构造请求 → 发出请求 → 处理响应（或处理异常）
+"""
+
+import datetime
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+
+from fund_cache import FundMetaCache, NavDetailCache
+from fund_calendar import MarketCalendar
+from fund_health import BreakerState, CircuitBreaker, HedgeStats, LatencyTracker
+from fund_http import FUND123_API_HEADERS
+from fund_parser import parse_csrf_token, parse_eastmoney_detail, parse_fund123_detail
+from fund_plan import FetchPlan
+from fund_quote import FundQuote, QdiiFlag, QuoteSource, to_float
+from fund_ratelimit import HostRateLimiter
+from fund_series import IntradaySeries, IntradaySeriesStore
+
+# 经东方财富网解析的基金信息在进程内的有效期（秒）
+EASTMONEY_INFO_TTL = 600
+# 盘中估值接口单页返回的估值点上限，一页取满时从最后一点继续翻页
+ESTIMATE_PAGE_SIZE = 200
+
+
+@dataclass
+class FundRequest:
+    """一次 HTTP 请求的描述，由引擎按各自的传输方式发出"""
+
+    method: str
+    url: str
+    headers: Dict[str, str]
+    params: Optional[Dict] = None
+    json: Optional[Dict] = None
+    # 该请求本来是否返回 HTML 页面；JSON 接口与 .js 数据文件为 False（见 fund_http.RateLimitedSession）
+    expect_html: bool = True
+
+
+class FundEngineBase:
+    """估值引擎共用的状态、请求构造、响应处理与决策（不含传输）"""
+
+    FUND123_BASE_URL = "https://www.fund123.cn"
+    EASTMONEY_BASE_URL = "https://fund.eastmoney.com"
+
+    def __init__(
+        self,
+        cache_dir: Optional[str],
+        hedge_percentile: Optional[float],
+        rate_limit: float,
+        calendar: Optional[MarketCalendar]
+    ):
+        """参数含义见 FundValuation / AsyncFundValuation"""
+        self.rate_limiter = HostRateLimiter(rate_limit) if rate_limit else None
+        self._csrf = ""
+        # 基金代码 → 天天基金解析的基金信息（含 fund_key）；东方财富网的结果只短期缓存，见 _eastmoney_info
+        self.fund_cache = {}
+        # 基金代码 → (东方财富网解析的基金信息, 过期时间)：天天基金查不到的基金不必每轮重复查询，
+        # 天天基金熔断恢复后过期即重新通过天天基金解析 fund_key
+        self._eastmoney_info: Dict[str, Tuple[Dict, float]] = {}
+        self.meta_cache = FundMetaCache(cache_dir) if cache_dir else None
+        self.nav_cache = NavDetailCache(calendar=calendar)
+        self.intraday_store = IntradaySeriesStore()
+        # 各数据源的熔断器，天天基金故障与恢复都会在数秒内体现，不再永久切换数据源
+        self.fund123_breaker = CircuitBreaker("fund123")
+        self.eastmoney_breaker = CircuitBreaker("eastmoney")
+        self.hedge_percentile = hedge_percentile
+        self.hedge_stats = HedgeStats()
+        self._latency = {"info": LatencyTracker(), "detail": LatencyTracker()}
+
+    @property
+    def use_eastmoney(self) -> bool:
+        """天天基金是否处于熔断中（此时所有请求直接走东方财富网）"""
+        return not self.fund123_breaker.available
+
+    def _should_hedge(self) -> bool:
+        """是否对天天基金请求启用对冲"""
+        return bool(self.hedge_percentile) and self.fund123_breaker.available
+
+    def get_intraday_series(self, fund_code: str) -> IntradaySeries:
+        """获取基金当日已获取的全部盘中估值点"""
+        return self.intraday_store.get(fund_code)
+
+    # ---- 天天基金会话与熔断 ----
+
+    def _csrf_page_request(self) -> FundRequest:
+        return FundRequest(
+            "GET",
+            f"{self.FUND123_BASE_URL}/fund",
+            {"Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8"}
+        )
+
+    def _on_csrf_page(self, text: str) -> bool:
+        """从页面中取出CSRF令牌，没有令牌时抛出 ValueError"""
+        csrf = parse_csrf_token(text)
+        if not csrf:
+            raise ValueError("页面中没有CSRF令牌")
+
+        self._csrf = csrf
+        logger.debug(f"CSRF令牌获取成功: {self._csrf[:10]}...")
+        self.fund123_breaker.record_success()
+        return True
+
+    def _on_csrf_error(self, error: Exception) -> bool:
+        logger.warning(f"初始化天天基金会话失败，暂时使用东方财富网: {error}")
+        self.fund123_breaker.record_failure()
+        return False
+
+    def _admit_fund123(self, need_csrf: bool) -> Tuple[bool, bool]:
+        """
+        请求天天基金前的熔断判断
+
+        熔断恢复探测（包括不需要令牌的详情请求）总是先重新获取CSRF令牌，探测成功时令牌也已刷新；
+        放行后调用方必须向 fund123_breaker 记录请求结果
+
+        Returns:
+            (是否放行, 是否需要先重新获取CSRF令牌)
+        """
+        probing = self.fund123_breaker.state is BreakerState.HALF_OPEN
+        if not self.fund123_breaker.allow():
+            return False, False
+        return True, probing or (need_csrf and not self._csrf)
+
+    def _invalidate_csrf(self, csrf: str):
+        """作废请求时使用的令牌（接口返回 success:false，可能是令牌过期），下一个请求前重新获取"""
+        if self._csrf == csrf:
+            self._csrf = ""
+
+    def _on_fund123_error(self, message: str, error: Exception):
+        logger.warning(f"{message}: {error}")
+        self.fund123_breaker.record_failure()
+
+    # ---- 东方财富网熔断 ----
+
+    def _admit_eastmoney(self, fund_code: str, what: str) -> bool:
+        """东方财富网熔断器是否放行；放行后调用方必须向 eastmoney_breaker 记录请求结果"""
+        if self.eastmoney_breaker.allow():
+            return True
+        logger.debug(f"东方财富网熔断中，跳过基金{fund_code}{what}")
+        return False
+
+    def _on_eastmoney_error(self, message: str, error: Exception) -> None:
+        logger.error(f"{message}: {error}")
+        self.eastmoney_breaker.record_failure()
+        return None
+
+    # ---- 基金信息 ----
+
+    def _named_fund_info(self, fund_code: str, plan: FetchPlan, fund_name: Optional[str]) -> Optional[Dict]:
+        """计划不需要 fund_key 时直接使用分类文件中的基金名称，省去基金信息请求"""
+        if fund_name and not plan.needs_fund_key:
+            return self.fund_cache.get(fund_code) or {"fund_key": fund_code, "fund_name": fund_name}
+        return None
+
+    def _cached_fund_info(self, fund_code: str) -> Optional[Dict]:
+        """依次查询进程内缓存、东方财富网短期缓存与持久化缓存，都没有时返回 None"""
+        if fund_code in self.fund_cache:
+            return self.fund_cache[fund_code]
+
+        entry = self._eastmoney_info.get(fund_code)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+
+        fund_info = lookup_cached_fund_info(self.meta_cache, fund_code, self.use_eastmoney)
+        if fund_info and fund_info.get("source") != QuoteSource.EASTMONEY.value:
+            self.fund_cache[fund_code] = fund_info
+        return fund_info
+
+    def _search_request(self, fund_code: str) -> FundRequest:
+        return FundRequest(
+            "POST",
+            f"{self.FUND123_BASE_URL}/api/fund/searchFund",
+            {**FUND123_API_HEADERS, "Referer": "https://www.fund123.cn/fund"},
+            params={"_csrf": self._csrf},
+            json={"fundCode": fund_code},
+            expect_html=False
+        )
+
+    def _on_search_result(self, fund_code: str, result: Dict) -> Optional[Dict]:
+        """处理 searchFund 响应，天天基金查不到该基金时返回 None（调用方改用东方财富网）"""
+        self.fund123_breaker.record_success()
+        if not result.get("success"):
+            logger.warning(f"从天天基金获取基金{fund_code}信息失败，尝试东方财富网")
+            return None
+
+        fund_info = {
+            "fund_key": result["fundInfo"]["key"],
+            "fund_name": result["fundInfo"]["fundName"]
+        }
+        self.fund_cache[fund_code] = fund_info
+        if self.meta_cache:
+            self.meta_cache.put(fund_code, **fund_info)
+        return fund_info
+
+    def _pingzhongdata_request(self, fund_code: str) -> FundRequest:
+        """只需要脚本开头的 fS_name / fS_code，引擎流式读取，取到后即关闭连接，不下载净值历史"""
+        return FundRequest(
+            "GET",
+            f"http://fund.eastmoney.com/pingzhongdata/{fund_code}.js",
+            {"Accept-Encoding": "gzip, deflate", "Referer": f"http://fund.eastmoney.com/{fund_code}.html"},
+            expect_html=False
+        )
+
+    def _on_eastmoney_info(self, fund_code: str, fund_info: Dict) -> Dict:
+        fund_info["source"] = QuoteSource.EASTMONEY.value
+        self.eastmoney_breaker.record_success()
+        # 不放入 fund_cache：天天基金恢复后需要重新通过天天基金解析 fund_key
+        self._eastmoney_info[fund_code] = (fund_info, time.monotonic() + EASTMONEY_INFO_TTL)
+        if self.meta_cache:
+            self.meta_cache.put(fund_code, fund_name=fund_info["fund_name"])
+        return fund_info
+
+    # ---- 净值详情与盘中估值 ----
+
+    def _matiaria_request(self, fund_code: str) -> FundRequest:
+        return FundRequest(
+            "GET",
+            f"{self.FUND123_BASE_URL}/matiaria?fundCode={fund_code}",
+            {**FUND123_API_HEADERS, "Referer": f"https://www.fund123.cn/matiaria?fundCode={fund_code}"}
+        )
+
+    def _on_matiaria_page(self, text: str) -> Dict:
+        self.fund123_breaker.record_success()
+        return parse_fund123_detail(text)
+
+    def _fundgz_request(self, fund_code: str) -> FundRequest:
+        return FundRequest(
+            "GET",
+            f"http://fundgz.1234567.com.cn/js/{fund_code}.js",
+            {"Referer": "http://fund.eastmoney.com/"},
+            expect_html=False
+        )
+
+    def _on_fundgz_script(self, fund_code: str, text: str) -> Optional[Dict]:
+        # 数据源已响应即视为可用，个别基金无估值数据不计入熔断
+        self.eastmoney_breaker.record_success()
+        detail = parse_eastmoney_detail(text)
+        if not detail:
+            logger.warning(f"无法解析基金{fund_code}的估值数据")
+            return None
+        # 标记来源：其中的 day_of_growth 是由盘中估值算出的，天天基金路径退回东方财富网时不能当作净值详情缓存
+        detail["source"] = QuoteSource.EASTMONEY.value
+        return detail
+
+    def _estimate_request(self, fund_code: str, fund_key: str) -> FundRequest:
+        series = self.intraday_store.get(fund_code)
+        return FundRequest(
+            "POST",
+            f"{self.FUND123_BASE_URL}/api/fund/queryFundEstimateIntraday",
+            {**FUND123_API_HEADERS, "Referer": f"https://www.fund123.cn/matiaria?fundCode={fund_code}"},
+            params={"_csrf": self._csrf},
+            json=build_estimate_request(fund_key, since=series.last_time),
+            expect_html=False
+        )
+
+    def _on_estimate_page(
+        self,
+        fund_code: str,
+        fund_key: str,
+        request: FundRequest,
+        result: Dict
+    ) -> Tuple[Optional[Dict], Optional[FundRequest]]:
+        """
+        处理一页盘中估值
+
+        一页取满 ESTIMATE_PAGE_SIZE 个点说明之后还有数据，返回从已有最后一点开始的下一页请求；
+        取满却没有新的点时说明接口没有按 startTime 的时分秒过滤，不再翻页，以免反复请求同一页
+
+        Returns:
+            (最新估值, 下一页请求)，两者只有一个不为 None；失败时均为 None
+        """
+        if not result.get("success"):
+            # 令牌过期等会话问题同样返回 success:false：计入熔断，并在下一个请求前重新获取令牌
+            logger.warning(f"获取基金{fund_code}估值失败: {result}")
+            self.fund123_breaker.record_failure()
+            self._invalidate_csrf(request.params["_csrf"])
+            self.intraday_store.reset(fund_code)
+            return None, None
+
+        self.fund123_breaker.record_success()
+        points = result.get("list") or []
+        series = self.intraday_store.get(fund_code)
+        added = series.extend(points)
+        if len(points) >= ESTIMATE_PAGE_SIZE:
+            if added:
+                return None, self._estimate_request(fund_code, fund_key)
+            logger.warning(f"基金{fund_code}盘中估值翻页没有新数据，估值停留在 {len(series)} 个点")
+        return series.latest_estimate(), None
+
+    def _on_estimate_error(self, fund_code: str, error: Exception) -> None:
+        self._on_fund123_error(f"获取基金{fund_code}估值异常", error)
+        self.intraday_store.reset(fund_code)
+        return None
+
+    # ---- 获取计划 ----
+
+    def _eastmoney_route(self, fund_info: Dict, plan: FetchPlan) -> Tuple[bool, bool]:
+        """
+        选择数据源
+
+        基金信息来自东方财富网时没有天天基金的 fund_key，无法请求盘中估值
+
+        Returns:
+            (是否走东方财富网, 天天基金是否不可用)；计划优先东方财富网而其不可用时，调用方退回天天基金完整路径
+        """
+        fund123_down = self.use_eastmoney or fund_info.get("source") == QuoteSource.EASTMONEY.value
+        return fund123_down or plan.source is QuoteSource.EASTMONEY, fund123_down
+
+    def _fund123_steps(self, fund_code: str, plan: FetchPlan) -> Tuple[Optional[Dict], bool, bool]:
+        """
+        天天基金路径需要发出的请求
+
+        当日净值已知或尚未到发布时间时复用缓存的详情；计划不需要估值时不请求估值
+
+        Returns:
+            (缓存的净值详情, 是否请求净值详情, 是否请求盘中估值)；两者都需要时引擎并行请求
+        """
+        detail = self.nav_cache.get(fund_code)
+        return detail, detail is None, plan.estimate
+
+    def _fund123_quote(
+        self,
+        fund_code: str,
+        fund_info: Dict,
+        plan: FetchPlan,
+        detail: Optional[Dict],
+        estimate: Optional[Dict],
+        fetched: bool
+    ) -> Optional[FundQuote]:
+        """
+        组装天天基金路径的结果，没有净值详情时返回 None
+
+        新请求到的净值详情写入缓存；天天基金失败时退回东方财富网得到的详情（日涨幅为盘中估算）不缓存，
+        下次刷新重新请求天天基金
+        """
+        if not detail:
+            return None
+        if fetched and detail.get("source") != QuoteSource.EASTMONEY.value:
+            self.nav_cache.put(fund_code, detail)
+        if not plan.estimate:
+            estimate = {"is_qdii": True} if plan.qdii else None
+        return build_fund123_quote(fund_code, fund_info, detail, estimate)
+
+
+def lookup_cached_fund_info(
+    meta_cache: Optional[FundMetaCache],
+    fund_code: str,
+    use_eastmoney: bool
+) -> Optional[Dict]:
+    """
+    从持久化缓存中查找基金基本信息
+
+    fund_key 只由天天基金写入；走东方财富网时只需基金名称，没有 fund_key 时取基金代码本身，
+    并标记来源为东方财富网（调用方不应长期缓存这类结果）
+    """
+    if not meta_cache:
+        return None
+
+    cached = meta_cache.get(fund_code)
+    if not cached or not cached["fund_name"]:
+        return None
+
+    if use_eastmoney and not cached["fund_key"]:
+        return {"fund_key": fund_code, "fund_name": cached["fund_name"], "source": QuoteSource.EASTMONEY.value}
+
+    if not cached["fund_key"]:
+        return None
+
+    return {"fund_key": cached["fund_key"], "fund_name": cached["fund_name"]}
+
+
+def build_estimate_request(fund_key: str, since: Optional[int] = None) -> Dict:
+    """
+    构造天天基金盘中估值接口的请求体
+
+    Args:
+        fund_key: 天天基金产品ID
+        since: 已有最后一个估值点的毫秒时间戳，传入时只请求此后的估值点
+    """
+    now = datetime.datetime.now()
+    if since:
+        start_time = datetime.datetime.fromtimestamp(since / 1000).strftime("%Y-%m-%d %H:%M:%S")
+    else:
+        start_time = now.strftime("%Y-%m-%d")
+    tomorrow = (now + datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+
+    return {
+        "startTime": start_time,
+        "endTime": tomorrow,
+        "limit": ESTIMATE_PAGE_SIZE,
+        "productId": fund_key,
+        "format": True,
+        "source": "WEALTHBFFWEB"
+    }
+
+
+def build_eastmoney_quote(fund_code: str, fund_info: Dict, detail: Dict) -> FundQuote:
+    """根据东方财富网数据组装单个基金的估值记录"""
+    is_qdii = QdiiFlag.BY_NAME if "QDII" in fund_info["fund_name"].upper() else QdiiFlag.NO
+
+    return FundQuote(
+        fund_code=fund_code,
+        fund_name=fund_info["fund_name"],
+        fund_key=fund_info["fund_key"],
+        net_value=to_float(detail.get("net_value")),
+        net_value_date=detail.get("net_value_date", "N/A"),
+        day_of_growth=to_float(detail.get("day_of_growth")),
+        estimate_time=detail.get("estimate_time", "N/A"),
+        forecast_growth=to_float(detail.get("estimate_growth")),
+        forecast_net_value=to_float(detail.get("estimate_value")),
+        is_qdii=is_qdii,
+        source=QuoteSource.EASTMONEY
+    )
+
+
+def build_fund123_quote(
+    fund_code: str,
+    fund_info: Dict,
+    fund_detail: Dict,
+    fund_estimate: Optional[Dict]
+) -> FundQuote:
+    """根据天天基金数据组装单个基金的估值记录"""
+    fund_estimate = fund_estimate or {}
+
+    if "QDII" in fund_info["fund_name"].upper():
+        is_qdii = QdiiFlag.BY_NAME
+    elif fund_estimate.get("is_qdii", False):
+        is_qdii = QdiiFlag.NO_INTRADAY
+    else:
+        is_qdii = QdiiFlag.NO
+
+    return FundQuote(
+        fund_code=fund_code,
+        fund_name=fund_info["fund_name"],
+        fund_key=fund_info["fund_key"],
+        net_value=to_float(fund_detail.get("net_value")),
+        net_value_date=fund_detail.get("net_value_date", "N/A"),
+        day_of_growth=to_float(fund_detail.get("day_of_growth")),
+        estimate_time=fund_estimate.get("estimate_time", "N/A"),
+        forecast_growth=to_float(fund_estimate.get("forecast_growth")),
+        forecast_net_value=to_float(fund_estimate.get("forecast_net_value")),
+        is_qdii=is_qdii,
+        source=QuoteSource.FUND123
+    )
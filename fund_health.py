@@ -0,0 +1,189 @@
+# -*- coding: UTF-8 -*-
+"""
+数据源健康状态模块 v1.0
+每个数据源（天天基金 / 东方财富网）一个熔断器：
+- 关闭：正常请求，连续失败达到阈值后打开
+- 打开：直接跳过该数据源，不再等待超时；冷却时间过后进入半开
+- 半开：只放行少量探测请求，成功即恢复关闭，失败则重新打开
+对冲请求：主数据源在最近耗时的指定分位内未返回时，同时请求备用数据源，取先返回者
+"""
+
+import threading
+import time
+from collections import deque
+from enum import Enum
+
+from loguru import logger
+
+
+class BreakerState(Enum):
+    """熔断器状态"""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """单个数据源的熔断器（线程安全，也可在事件循环中直接使用）"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+        half_open_max_calls: int = 1
+    ):
+        """
+        初始化熔断器
+
+        Args:
+            name: 数据源名称，用于日志
+            failure_threshold: 连续失败多少次后打开
+            reset_timeout: 打开后经过多少秒进入半开
+            half_open_max_calls: 半开状态下同时放行的探测请求数
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._state = BreakerState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> BreakerState:
+        with self._lock:
+            self._refresh_state()
+            return self._state
+
+    @property
+    def available(self) -> bool:
+        """是否值得尝试该数据源（不占用半开探测名额）"""
+        with self._lock:
+            self._refresh_state()
+            if self._state is BreakerState.OPEN:
+                return False
+            if self._state is BreakerState.HALF_OPEN:
+                return self._probes < self.half_open_max_calls
+            return True
+
+    def _refresh_state(self):
+        """
+        冷却时间已过时由打开转为半开（调用方需持有锁）
+
+        探测请求被取消而没有记录结果时，超过冷却时间后重新放行探测，避免一直停留在半开
+        """
+        now = time.monotonic()
+        if self._state is BreakerState.OPEN and now - self._opened_at >= self.reset_timeout:
+            self._state = BreakerState.HALF_OPEN
+            self._probes = 0
+            logger.info(f"数据源 {self.name} 熔断冷却结束，开始探测")
+        elif self._state is BreakerState.HALF_OPEN and self._probes and now - self._probe_started >= self.reset_timeout:
+            self._probes = 0
+
+    def allow(self) -> bool:
+        """
+        请求前调用，返回是否放行
+
+        放行后必须调用 record_success 或 record_failure 之一
+        """
+        with self._lock:
+            self._refresh_state()
+            if self._state is BreakerState.CLOSED:
+                return True
+            if self._state is BreakerState.HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                self._probe_started = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        """记录一次成功请求"""
+        with self._lock:
+            if self._state is not BreakerState.CLOSED:
+                logger.info(f"数据源 {self.name} 已恢复")
+            self._state = BreakerState.CLOSED
+            self._failures = 0
+            self._probes = 0
+
+    def record_failure(self):
+        """记录一次失败请求"""
+        with self._lock:
+            self._failures += 1
+            if self._state is BreakerState.HALF_OPEN:
+                self._trip()
+            elif self._state is BreakerState.CLOSED and self._failures >= self.failure_threshold:
+                self._trip()
+
+    def _trip(self):
+        """打开熔断器（调用方需持有锁）"""
+        self._state = BreakerState.OPEN
+        self._opened_at = time.monotonic()
+        self._probes = 0
+        logger.warning(
+            f"数据源 {self.name} 连续失败 {self._failures} 次，熔断 {self.reset_timeout:g} 秒"
+        )
+
+
+class LatencyTracker:
+    """记录最近若干次请求耗时，用于计算对冲等待时间"""
+
+    def __init__(self, window: int = 256, min_samples: int = 20, default: float = 1.0):
+        """
+        Args:
+            window: 保留的最近样本数
+            min_samples: 样本不足时使用 default
+            default: 样本不足时的耗时估计（秒）
+        """
+        self.min_samples = min_samples
+        self.default = default
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> float:
+        """最近样本的 pct 分位耗时（秒）"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return self.default
+            samples = sorted(self._samples)
+        index = min(len(samples) - 1, int(len(samples) * pct / 100))
+        return samples[index]
+
+
+class HedgeStats:
+    """对冲请求统计"""
+
+    def __init__(self):
+        self.requests = 0       # 走对冲逻辑的请求数
+        self.hedged = 0         # 主数据源超时后发出备用请求的次数
+        self.backup_wins = 0    # 备用请求先返回有效结果的次数
+        self._lock = threading.Lock()
+
+    def record(self, hedged: bool, backup_won: bool):
+        with self._lock:
+            self.requests += 1
+            self.hedged += hedged
+            self.backup_wins += backup_won
+
+    @property
+    def hedge_rate(self) -> float:
+        return self.hedged / self.requests if self.requests else 0.0
+
+    @property
+    def win_rate(self) -> float:
+        """备用请求发出后胜出的比例"""
+        return self.backup_wins / self.hedged if self.hedged else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"对冲请求: 共 {self.requests} 次，对冲 {self.hedged} 次 ({self.hedge_rate:.1%})，"
+            f"备用源胜出 {self.backup_wins} 次 ({self.win_rate:.1%})"
+        )
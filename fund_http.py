@@ -0,0 +1,196 @@
+# -*- coding: UTF-8 -*-
+"""
+HTTP 连接池模块 v1.0
+统一创建 requests 会话：按工作线程数设置每个主机的连接池大小，连接在各刷新周期间保持复用；
+启动时预先连接天天基金 / 东方财富网各主机，完成 TCP 与 TLS 握手；
+统计每个主机新建连接与复用连接的次数，用于衡量连接抖动；
+可选接入按主机限速（见 fund_ratelimit），会话发出的每个请求都先获取令牌；
+429/503 以外的 5xx 响应抛出 requests.HTTPError，由调用方计入数据源熔断；
+请求是否本应返回 HTML 由调用方通过 expect_html 显式说明，不根据 Accept 请求头推断
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+import requests
+from loguru import logger
+from requests.adapters import HTTPAdapter
+
+from fund_ratelimit import HostRateLimiter, is_server_error, is_throttle_response, parse_retry_after
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+# 所有请求共用的请求头，设置在会话上，不再每次请求重复构造
+COMMON_HEADERS = {
+    "Accept-Language": "zh-CN,zh;q=0.9",
+    "User-Agent": USER_AGENT
+}
+
+# 天天基金 JSON 接口的固定请求头（Referer 按基金另行设置）
+FUND123_API_HEADERS = {
+    "Content-Type": "application/json",
+    "Origin": "https://www.fund123.cn",
+    "X-API-Key": "foobar",
+    "accept": "json"
+}
+
+# 启动时预连接的主机（与实际请求使用相同的协议）
+PREWARM_URLS = (
+    "https://www.fund123.cn/",
+    "http://fund.eastmoney.com/",
+    "http://fundgz.1234567.com.cn/"
+)
+
+
+class RateLimitedSession(requests.Session):
+    """
+    每个请求发出前先获取所属主机的令牌，并根据响应调整该主机的速率（rate_limiter 为 None 时不限速）；
+    429/503 以外的 5xx 响应抛出 requests.HTTPError
+
+    get/post 等方法额外接受 expect_html：该请求本来是否返回 HTML 页面（默认 True）；
+    JSON 接口与 .js 数据文件应传 False，此时返回的 HTML 视为错误页（限流信号）
+    """
+
+    def __init__(self, rate_limiter: Optional[HostRateLimiter] = None):
+        super().__init__()
+        self.rate_limiter = rate_limiter
+        # request() 与 send() 在同一线程中调用（包括重定向），按线程传递 expect_html
+        self._local = threading.local()
+
+    def request(self, method, url, *args, expect_html: bool = True, **kwargs):
+        self._local.expect_html = expect_html
+        return super().request(method, url, *args, **kwargs)
+
+    def send(self, request, **kwargs):
+        url = request.url
+        if self.rate_limiter:
+            self.rate_limiter.acquire(url)
+        try:
+            response = super().send(request, **kwargs)
+        except requests.Timeout:
+            if self.rate_limiter:
+                self.rate_limiter.record_throttle(url)
+            raise
+
+        if is_server_error(response.status_code):
+            # 服务端故障不调整速率，抛出异常由调用方计入数据源熔断
+            response.close()
+            raise requests.HTTPError(f"{response.status_code} 服务器错误: {url}", response=response)
+
+        if self.rate_limiter:
+            if is_throttle_response(
+                response.status_code,
+                response.headers.get("Content-Type", ""),
+                getattr(self._local, "expect_html", True)
+            ):
+                self.rate_limiter.record_throttle(url, parse_retry_after(response.headers.get("Retry-After")))
+            else:
+                self.rate_limiter.record_success(url)
+        return response
+
+
+def create_session(
+    pool_size: int,
+    headers: Dict = None,
+    rate_limiter: Optional[HostRateLimiter] = None
+) -> requests.Session:
+    """
+    创建带连接池的会话
+
+    Args:
+        pool_size: 每个主机保持的最大连接数，应不小于同时请求该主机的线程数
+        headers: 会话默认请求头，默认为 COMMON_HEADERS
+        rate_limiter: 按主机限速器，None 表示不限速
+    """
+    session = RateLimitedSession(rate_limiter)
+    session.headers.update(COMMON_HEADERS if headers is None else headers)
+
+    # pool_block=False：并发超过池大小时临时新建连接而不是阻塞，统计中体现为新建连接
+    adapter = HTTPAdapter(pool_connections=len(PREWARM_URLS) * 2, pool_maxsize=pool_size, pool_block=False)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def prewarm(session: requests.Session, urls: Iterable[str] = PREWARM_URLS, connections_per_host: int = 1):
+    """
+    预先建立到各主机的连接（HEAD 请求），连接完成后留在连接池中供后续请求复用
+
+    预连接失败只记录日志，不影响正常请求
+    """
+    targets = [url for url in urls for _ in range(connections_per_host)]
+    if not targets:
+        return
+
+    def warm(url: str) -> bool:
+        try:
+            session.head(url, timeout=5, verify=False, allow_redirects=False).close()
+            return True
+        except requests.RequestException as e:
+            logger.debug(f"预连接 {url} 失败: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=len(targets), thread_name_prefix="http-prewarm") as executor:
+        warmed = sum(executor.map(warm, targets))
+
+    logger.debug(f"已预连接 {warmed}/{len(targets)} 个连接")
+
+
+def session_pool_stats(session: requests.Session) -> Dict[str, Dict[str, int]]:
+    """
+    汇总会话中各主机连接池的使用情况
+
+    Returns:
+        {主机: {"requests": 请求数, "new": 新建连接数, "reused": 复用连接数}}
+    """
+    stats = {}
+    seen = set()
+    for adapter in session.adapters.values():
+        if id(adapter) in seen:
+            continue
+        seen.add(id(adapter))
+
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{key.key_scheme}://{key.key_host}"
+            entry = stats.setdefault(host, {"requests": 0, "new": 0, "reused": 0})
+            entry["requests"] += pool.num_requests
+            entry["new"] += pool.num_connections
+            entry["reused"] += max(0, pool.num_requests - pool.num_connections)
+    return stats
+
+
+class ConnectionStats:
+    """异步引擎的连接统计（通过 aiohttp TraceConfig 回调累计）"""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, host: str, reused: bool):
+        with self._lock:
+            entry = self._stats.setdefault(host, {"requests": 0, "new": 0, "reused": 0})
+            entry["requests"] += 1
+            entry["reused" if reused else "new"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {host: dict(entry) for host, entry in self._stats.items()}
+
+
+def format_pool_stats(stats: Dict[str, Dict[str, int]]) -> str:
+    """格式化连接池统计"""
+    if not stats:
+        return "连接池: 暂无请求"
+
+    new = sum(entry["new"] for entry in stats.values())
+    reused = sum(entry["reused"] for entry in stats.values())
+    total = new + reused
+    lines = [f"连接池: 新建 {new} 次，复用 {reused} 次 (复用率 {reused / total:.1%})" if total else "连接池: 暂无请求"]
+    for host, entry in sorted(stats.items()):
+        lines.append(f"  {host}: 请求 {entry['requests']}，新建 {entry['new']}，复用 {entry['reused']}")
+    return "\n".join(lines)
@@ -1,31 +1,68 @@
 # -*- coding: UTF-8 -*-
 """
 场外基金实时估值监控程序 v1.0
-定时刷新基金估值数据并保存到文件
+定时刷新基金估值数据并保存到文件；
+获取失败的基金单独进入重试队列（指数退避加随机抖动），成功的基金立即写出，不因个别基金失败重拉整个列表；
+每轮在刷新间隔结束前的截止时间写出报告，未返回或失败的基金沿用上次成功的结果并标注数据时长，
+未完成的请求继续执行并在下一轮使用；
+增量模式下只刷新预计有新数据的基金（见 fund_schedule），没有变化时不重写输出文件；
+按交易时段调度时（见 fund_calendar），午休、夜间、周末与节假日休眠到下一个交易时段或净值发布窗口；
+MultiWatchlistMonitor 在单个进程中监控多个基金列表（见 fund_watchlist），共有的基金只获取一次
 """
 
 import argparse
 import datetime
+import heapq
 import os
+import random
 import sys
 import threading
 import time
-from typing import List
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from loguru import logger
 
-from fund_valuation import FundValuation, generate_report, read_fund_codes_from_file
+from fund_cache import DEFAULT_CACHE_DIR
+from fund_calendar import MarketCalendar, MarketScheduler, sleep_until
+from fund_concurrency import ADAPTIVE_MAX_WORKERS, DEFAULT_MAX_WORKERS
+from fund_http import format_pool_stats
+from fund_quote import FundQuote
+from fund_ratelimit import DEFAULT_INITIAL_RATE, DEFAULT_RATE_LIMIT
+from fund_schedule import IncrementalSchedule
+from fund_valuation import FundValuation, read_fund_codes_from_file, write_report
+from fund_watchlist import Watchlist, WatchlistScheduler
 
 
 class FundMonitor:
     """基金估值监控器"""
 
+    # 失败基金重试的退避时间：首次约 1 秒，之后每次翻倍，最长 30 秒，实际等待在 0.5~1.5 倍间随机
+    RETRY_BASE_DELAY = 1.0
+    RETRY_MAX_DELAY = 30.0
+    # 每轮重试最多占用刷新间隔的比例，避免拖延下一轮
+    RETRY_BUDGET_RATIO = 0.5
+    # 未指定截止余量时，在刷新间隔结束前该比例的时间写出报告
+    DEADLINE_MARGIN_RATIO = 0.1
+
     def __init__(
         self,
         fund_codes: List[str],
         output_file: str = "fund_valuation_result.txt",
         interval: int = 60,
-        max_retries: int = 3
+        max_retries: int = 3,
+        max_workers: Optional[int] = None,
+        engine: str = "thread",
+        concurrency: int = 200,
+        cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+        hedge_percentile: Optional[float] = None,
+        rate_limit: float = DEFAULT_RATE_LIMIT,
+        adaptive: bool = True,
+        deadline_margin: Optional[float] = None,
+        incremental: bool = False,
+        market_hours: bool = False,
+        nav_interval: float = 600,
+        holidays_file: Optional[str] = None
     ):
         """
         初始化监控器
@@ -34,15 +71,49 @@ class FundMonitor:
             fund_codes: 要监控的基金代码列表
             output_file: 输出文件路径
             interval: 刷新间隔（秒），默认60秒
-            max_retries: 最大重试次数
+            max_retries: 单只基金每轮的最大重试次数
+            max_workers: 多线程引擎的工作线程数（并发上限），线程池在各刷新周期间复用；None 时按是否自适应取默认值
+            engine: 估值引擎，thread(多线程) 或 async(asyncio)
+            concurrency: 异步引擎最大并发基金数
+            cache_dir: 基金元数据持久化缓存目录，None 表示不使用持久化缓存
+            hedge_percentile: 对冲请求的耗时分位，None 表示不对冲
+            rate_limit: 每个主机的速率上限（次/秒），实际速率自动探测；0 表示不限速
+            adaptive: 是否自适应调整并发，False 时固定为 max_workers / concurrency
+            deadline_margin: 每轮在刷新间隔结束前多少秒写出报告，默认为刷新间隔的 10%（至少 1 秒）
+            incremental: 增量模式，只刷新估值时间或净值日期预计会变化的基金
+            market_hours: 按交易时段调度，交易时段内按 interval 刷新，净值发布窗口内按 nav_interval 刷新，
+                          其余时间休眠到下一个交易时段或净值发布窗口
+            nav_interval: 净值发布窗口内的刷新间隔（秒）
+            holidays_file: 节假日文件（每行一个 YYYY-MM-DD），None 表示只按工作日判断交易日
         """
         self.fund_codes = fund_codes
         self.output_file = output_file
         self.interval = interval
         self.max_retries = max_retries
-
-        self.fund_valuation = FundValuation()
+        if deadline_margin is None:
+            deadline_margin = max(1.0, interval * self.DEADLINE_MARGIN_RATIO)
+        self.deadline_margin = min(deadline_margin, interval)
+        self.calendar = MarketCalendar.from_file(holidays_file)
+        self.scheduler = MarketScheduler(self.calendar, interval, nav_interval) if market_hours else None
+
+        if engine == "async":
+            from fund_valuation_async import AsyncFundValuation
+            self.fund_valuation = AsyncFundValuation(
+                max_concurrency=concurrency, cache_dir=cache_dir, hedge_percentile=hedge_percentile,
+                rate_limit=rate_limit, adaptive=adaptive, calendar=self.calendar
+            )
+        else:
+            self.fund_valuation = FundValuation(
+                max_workers=max_workers, cache_dir=cache_dir, hedge_percentile=hedge_percentile,
+                rate_limit=rate_limit, adaptive=adaptive, calendar=self.calendar
+            )
+        nav_cache = self.fund_valuation.nav_cache
+        self.schedule = IncrementalSchedule(
+            interval, nav_cache.latest_nav_date, nav_publish_hour=nav_cache.nav_publish_hour,
+            calendar=self.calendar
+        ) if incremental else None
         self.is_running = False
+        self._stop_event = threading.Event()
         self.monitor_thread = None
         self.last_update_time = None
         self.update_count = 0
@@ -51,36 +122,183 @@ class FundMonitor:
             "total_updates": 0,
             "successful_updates": 0,
             "failed_updates": 0,
+            "retried_funds": 0,
+            "recovered_funds": 0,
+            "late_funds": 0,
+            "skipped_funds": 0,
             "start_time": None
         }
+        # 基金代码 → 累计失败次数
+        self.fund_failures: Dict[str, int] = {}
+        # 基金代码 → (上次成功的结果, 获取时间戳)，截止时未返回或失败时沿用
+        self._last_good: Dict[str, Tuple[FundQuote, float]] = {}
+        # 截止时仍未完成的请求，下一轮直接等待其结果而不重复提交
+        self._in_flight: Dict[str, Future] = {}
+
+    def _retry_delay(self, attempt: int) -> float:
+        """第 attempt 次失败后的等待时间（指数退避加随机抖动，避免多只基金同时重试）"""
+        delay = min(self.RETRY_MAX_DELAY, self.RETRY_BASE_DELAY * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.5)
+
+    def _submit(self, fund_codes: Iterable[str]) -> Dict[str, Future]:
+        """提交基金请求，上一轮截止时仍在执行的基金沿用原请求"""
+        codes = list(dict.fromkeys(fund_codes))
+        new_codes = [code for code in codes if code not in self._in_flight]
+        if len(new_codes) < len(codes):
+            logger.info(f"{len(codes) - len(new_codes)} 只基金沿用上一轮未完成的请求")
+        self._in_flight.update(self.fund_valuation.submit_funds(new_codes))
+        return {code: self._in_flight[code] for code in codes}
+
+    def _harvest_late(self):
+        """增量模式下记录上一轮截止后才完成的请求结果，再据此判断本轮哪些基金需要刷新"""
+        for code, future in list(self._in_flight.items()):
+            if not future.done():
+                continue
+            del self._in_flight[code]
+            try:
+                quote = future.result()
+            except Exception:
+                continue
+            if not quote.is_failed:
+                self._last_good[code] = (quote, time.time())
+                if self.schedule:
+                    self.schedule.observe(quote)
+
+    def _publish(self, results: Dict[str, FundQuote]):
+        """按基金列表顺序写出报告，未返回或失败的基金沿用上次成功的结果"""
+        now = time.time()
+
+        def quotes():
+            for code in self.fund_codes:
+                quote = results.get(code)
+                if quote is None or quote.is_failed:
+                    last = self._last_good.get(code)
+                    if last:
+                        quote = last[0].stale(now - last[1])
+                    elif quote is None:
+                        quote = FundQuote.failed(code, "截止时间前未返回")
+                yield quote
+
+        with open(self.output_file, 'w', encoding='utf-8') as f:
+            write_report(quotes(), f)
 
     def fetch_and_save(self) -> bool:
         """
         获取基金数据并保存到文件
 
+        所有基金首次返回或到达截止时间（刷新间隔减去截止余量）时写出报告；
+        失败的基金按各自的退避时间在本轮预算内单独重试，到期的基金合并为一批请求，
+        有基金恢复即重新写出报告；截止时未完成的请求继续执行，下一轮直接使用其结果
+
         Returns:
             是否成功
         """
         try:
-            logger.info(f"正在获取 {len(self.fund_codes)} 个基金的数据...")
-
-            funds_data = self.fund_valuation.get_multiple_funds_data(self.fund_codes)
-
-            if not funds_data:
-                logger.warning("未获取到任何基金数据")
-                return False
-
-            report = generate_report(funds_data)
+            start = time.monotonic()
+            cycle_deadline = start + self.interval - self.deadline_margin
+            retry_deadline = min(cycle_deadline, start + self.interval * self.RETRY_BUDGET_RATIO)
+            results = {}
+            codes = self.fund_codes
+            if self.schedule:
+                self._harvest_late()
+                codes = self.schedule.due(self.fund_codes)
+                due_codes = set(codes)
+                for code in self.fund_codes:
+                    if code not in due_codes and code in self._last_good:
+                        results[code] = self._last_good[code][0]
+                self.stats["skipped_funds"] += len(results)
+                logger.info(f"正在获取 {len(codes)} 个基金的数据（{len(results)} 只预计无新数据，跳过）...")
+            else:
+                logger.info(f"正在获取 {len(codes)} 个基金的数据...")
+
+            pending = self._submit(codes)
+            waiting_first = set(pending)
+            attempts = dict.fromkeys(pending, 0)
+            retry_queue = []
+            failed_count = 0
+            published = False
+            # 增量模式下记录是否有基金的数据发生变化，无变化时不重写输出文件
+            changed = self.schedule is None or not os.path.exists(self.output_file)
+
+            while True:
+                now = time.monotonic()
+                due = []
+                while retry_queue and retry_queue[0][0] <= now:
+                    due.append(heapq.heappop(retry_queue)[1])
+                if due:
+                    self.stats["retried_funds"] += len(due)
+                    pending.update(self._submit(due))
+
+                if (not pending and not retry_queue) or now >= cycle_deadline or self._stop_event.is_set():
+                    break
 
-            with open(self.output_file, 'w', encoding='utf-8') as f:
-                f.write(report)
+                timeout = min(cycle_deadline, retry_queue[0][0] if retry_queue else cycle_deadline) - now
+                if pending:
+                    wait(pending.values(), timeout=timeout, return_when=FIRST_COMPLETED)
+                else:
+                    self._stop_event.wait(timeout)
+
+                recovered = 0
+                for code in [code for code, future in pending.items() if future.done()]:
+                    future = pending.pop(code)
+                    self._in_flight.pop(code, None)
+                    waiting_first.discard(code)
+                    try:
+                        quote = future.result()
+                    except Exception as e:
+                        quote = FundQuote.failed(code, str(e))
+                    results[code] = quote
+                    if self.schedule and self.schedule.observe(quote):
+                        changed = True
+
+                    if not quote.is_failed:
+                        self._last_good[code] = (quote, time.time())
+                        if attempts[code]:
+                            recovered += 1
+                        continue
+
+                    self.fund_failures[code] = self.fund_failures.get(code, 0) + 1
+                    if not attempts[code]:
+                        failed_count += 1
+                    retry_at = time.monotonic() + self._retry_delay(attempts[code])
+                    if attempts[code] < self.max_retries and retry_at <= retry_deadline:
+                        attempts[code] += 1
+                        heapq.heappush(retry_queue, (retry_at, code))
+                    else:
+                        logger.warning(f"基金 {code} 本轮重试 {attempts[code]} 次仍失败，留待下一轮")
+
+                if recovered:
+                    self.stats["recovered_funds"] += recovered
+                if not waiting_first and (not published or recovered):
+                    if changed:
+                        self._publish(results)
+                    if published:
+                        logger.info(f"重试成功 {recovered} 只基金，已更新: {self.output_file}")
+                    published = True
+
+            late = len(waiting_first)
+            if not published:
+                if not results and not self._last_good:
+                    logger.warning("未获取到任何基金数据")
+                    self.stats["failed_updates"] += 1
+                    return False
+                if changed:
+                    self._publish(results)
 
             self.last_update_time = datetime.datetime.now()
             self.update_count += 1
             self.stats["successful_updates"] += 1
-
-            logger.info(f"数据已保存到: {self.output_file}")
-            logger.info(f"本次更新基金数: {len(funds_data)}")
+            self.stats["late_funds"] += late
+
+            if changed:
+                logger.info(f"数据已保存到: {self.output_file}")
+            else:
+                logger.info("基金数据均无变化，未重写输出文件")
+            logger.info(f"本次更新基金数: {len(results)}，首次失败: {failed_count}")
+            if late:
+                logger.warning(f"{late} 只基金截止时未返回，已沿用上次结果，请求继续执行")
+            if retry_queue:
+                logger.warning(f"{len(retry_queue)} 只基金超出本轮时间预算，留待下一轮重试")
 
             return True
 
@@ -95,31 +313,33 @@ class FundMonitor:
         logger.info("场外基金实时估值监控已启动")
         logger.info(f"监控基金数: {len(self.fund_codes)}")
         logger.info(f"刷新间隔: {self.interval} 秒")
+        if self.scheduler:
+            logger.info(f"按交易时段调度，净值发布窗口刷新间隔: {self.scheduler.nav_interval:g} 秒")
         logger.info(f"输出文件: {self.output_file}")
         logger.info("=" * 60)
 
+        # 刷新周期以每轮开始时间为准，单轮耗时不会推迟之后的轮次
+        cycle_start = datetime.datetime.now()
         self.fetch_and_save()
 
         while self.is_running:
-            next_run = time.time() + self.interval
-
-            while self.is_running and time.time() < next_run:
-                time.sleep(1)
-
-            if not self.is_running:
+            next_run = self._next_run(cycle_start)
+            if sleep_until(next_run, self._stop_event.wait):
                 break
+            cycle_start = max(next_run, datetime.datetime.now())
 
             self.stats["total_updates"] += 1
+            self.fetch_and_save()
 
-            for attempt in range(self.max_retries):
-                if self.fetch_and_save():
-                    break
-                else:
-                    if attempt < self.max_retries - 1:
-                        logger.warning(f"第 {attempt + 1} 次尝试失败，{5 * (attempt + 1)} 秒后重试...")
-                        time.sleep(5 * (attempt + 1))
-                    else:
-                        logger.error(f"已达到最大重试次数 ({self.max_retries})，跳过本次更新")
+    def _next_run(self, cycle_start: datetime.datetime) -> datetime.datetime:
+        """下一轮的开始时刻，按交易时段调度时休眠期间记录下一次刷新的时刻与原因"""
+        if self.scheduler is None:
+            return cycle_start + datetime.timedelta(seconds=self.interval)
+
+        next_run, reason = self.scheduler.next_run(cycle_start)
+        if (next_run - cycle_start).total_seconds() > self.interval:
+            logger.info(f"下一次刷新: {next_run:%Y-%m-%d %H:%M:%S} ({reason})")
+        return next_run
 
     def start(self):
         """启动监控"""
@@ -128,6 +348,7 @@ class FundMonitor:
             return
 
         self.is_running = True
+        self._stop_event.clear()
         self.stats["start_time"] = datetime.datetime.now()
 
         self.monitor_thread = threading.Thread(target=self.monitor_loop)
@@ -143,6 +364,7 @@ class FundMonitor:
             return
 
         self.is_running = False
+        self._stop_event.set()
 
         if self.monitor_thread and self.monitor_thread.is_alive():
             self.monitor_thread.join(timeout=5)
@@ -165,6 +387,22 @@ class FundMonitor:
             if self.stats['total_updates'] > 0:
                 success_rate = (self.stats['successful_updates'] / self.stats['total_updates']) * 100
                 logger.info(f"成功率: {success_rate:.2f}%")
+            logger.info(f"单只基金重试: {self.stats['retried_funds']} 次，恢复 {self.stats['recovered_funds']} 次")
+            logger.info(f"截止时未返回: {self.stats['late_funds']} 只次")
+            if self.schedule:
+                logger.info(f"增量模式跳过请求: {self.stats['skipped_funds']} 只次")
+            if self.fund_failures:
+                worst = sorted(self.fund_failures.items(), key=lambda item: item[1], reverse=True)[:5]
+                logger.info("失败最多的基金: " + "，".join(f"{code}({count}次)" for code, count in worst))
+            if self.fund_valuation.hedge_percentile:
+                logger.info(self.fund_valuation.hedge_stats.summary())
+            for line in self.fund_valuation.concurrency.summary().splitlines():
+                logger.info(line)
+            for line in format_pool_stats(self.fund_valuation.pool_stats()).splitlines():
+                logger.info(line)
+            if self.fund_valuation.rate_limiter:
+                for line in self.fund_valuation.rate_limiter.summary().splitlines():
+                    logger.info(line)
             logger.info("=" * 60)
 
     def run_once(self) -> bool:
@@ -177,6 +415,246 @@ class FundMonitor:
         return self.fetch_and_save()
 
 
+class WatchlistBatch:
+    """同时到期、一起提交的一批基金及其截止时间"""
+
+    __slots__ = ("codes", "pending", "results", "deadline")
+
+    def __init__(self, codes: List[str], pending: Dict[str, Future], deadline: float):
+        self.codes = codes
+        self.pending = pending
+        self.results: Dict[str, FundQuote] = {}
+        # time.monotonic() 时间
+        self.deadline = deadline
+
+
+class MultiWatchlistMonitor(FundMonitor):
+    """多基金列表监控器：共用一个估值会话，按刷新堆调度每只基金，结果分发到各列表的报告"""
+
+    # 到期时间相差不足该秒数的基金合并为一批请求，避免各列表的刷新时刻逐渐错开后拆成多批
+    BATCH_WINDOW = 1.0
+
+    def __init__(self, watchlists: List[Watchlist], **kwargs):
+        """
+        初始化多列表监控器
+
+        Args:
+            watchlists: 基金列表及各自的刷新间隔、优先级与输出文件
+            kwargs: 传给 FundMonitor 的其他参数（fund_codes、output_file、interval 与 incremental 由列表决定）
+        """
+        self.queue = WatchlistScheduler(watchlists)
+        self.watchlists = self.queue.watchlists
+        super().__init__(
+            fund_codes=self.queue.fund_codes,
+            interval=min(watchlist.interval for watchlist in self.watchlists),
+            **kwargs
+        )
+        # 基金代码 → 连续失败次数，决定下一次重试的退避时间
+        self._attempts: Dict[str, int] = {}
+        # 已提交、尚未结束的批次
+        self._batches: List[WatchlistBatch] = []
+
+    def _publish_watchlist(self, watchlist: Watchlist, results: Dict[str, FundQuote]):
+        """
+        写出一个列表的报告
+
+        本轮未获取的基金使用最近一次成功的结果；本轮失败、未返回或已超过刷新间隔的结果标注数据时长
+        """
+        now = time.time()
+
+        def quotes():
+            for code in watchlist.fund_codes:
+                quote = results.get(code)
+                if quote is not None and not quote.is_failed:
+                    yield quote
+                    continue
+                last = self._last_good.get(code)
+                if last is None:
+                    yield quote or FundQuote.failed(code, "尚未获取到数据")
+                    continue
+                age = now - last[1]
+                yield last[0].stale(age) if code in results or age > self.queue.interval(code) else last[0]
+
+        with open(watchlist.output_file, 'w', encoding='utf-8') as f:
+            write_report(quotes(), f, title=f"场外基金实时估值 - {watchlist.name}")
+
+    def _start_batch(self):
+        """弹出所有到期的基金作为一批提交，截止时间为其中最短的刷新间隔减去截止余量"""
+        now = time.time()
+        codes = self.queue.pop_due(now + self.BATCH_WINDOW)
+        if not codes:
+            return
+        logger.info(f"正在获取 {len(codes)} 个到期基金的数据...")
+        try:
+            pending = self._submit(codes)
+        except Exception:
+            for code in codes:
+                self.queue.reschedule(code, now)
+            raise
+        budget = min(self.queue.interval(code) for code in codes)
+        deadline = time.monotonic() + max(0.0, budget - self.deadline_margin)
+        self._batches.append(WatchlistBatch(codes, pending, deadline))
+
+    def _collect(self):
+        """收下所有批次中已完成的请求"""
+        for batch in self._batches:
+            for code in [code for code, future in batch.pending.items() if future.done()]:
+                future = batch.pending.pop(code)
+                self._in_flight.pop(code, None)
+                try:
+                    batch.results[code] = future.result()
+                except Exception as e:
+                    batch.results[code] = FundQuote.failed(code, str(e))
+
+    def _finish_batch(self, batch: WatchlistBatch) -> bool:
+        """
+        结束一批请求：写出包含这些基金的列表并将基金重新入堆
+
+        成功的基金按刷新间隔重新入堆；失败的基金按退避时间入堆重试，超过最大重试次数后恢复按刷新间隔获取；
+        截止时仍未返回的请求继续执行，下次到期时直接使用其结果
+        """
+        finished = time.time()
+        # 基金代码 → 延迟，未记录的基金在 finally 中按刷新间隔入堆
+        delays: Dict[str, float] = {}
+        self.stats["total_updates"] += 1
+        try:
+            failed_count = 0
+            for code in batch.codes:
+                quote = batch.results.get(code)
+                if quote is None:
+                    continue
+                if not quote.is_failed:
+                    if self._attempts.pop(code, 0):
+                        self.stats["recovered_funds"] += 1
+                    self._last_good[code] = (quote, finished)
+                else:
+                    failed_count += 1
+                    self.fund_failures[code] = self.fund_failures.get(code, 0) + 1
+                    attempt = self._attempts.get(code, 0)
+                    if attempt < self.max_retries:
+                        self._attempts[code] = attempt + 1
+                        self.stats["retried_funds"] += 1
+                        delays[code] = min(self._retry_delay(attempt), self.queue.interval(code))
+                    else:
+                        del self._attempts[code]
+                        logger.warning(f"基金 {code} 连续重试 {attempt} 次仍失败，按刷新间隔继续获取")
+
+            watchlists = self.queue.lists_for(batch.codes)
+            for watchlist in watchlists:
+                self._publish_watchlist(watchlist, batch.results)
+
+            late = len(batch.codes) - len(batch.results)
+            self.last_update_time = datetime.datetime.now()
+            self.update_count += 1
+            self.stats["successful_updates"] += 1
+            self.stats["late_funds"] += late
+
+            logger.info(
+                f"本次更新基金数: {len(batch.results)}，失败: {failed_count}，"
+                f"已写出 {len(watchlists)} 个列表: {', '.join(watchlist.name for watchlist in watchlists)}"
+            )
+            if late:
+                logger.warning(f"{late} 只基金截止时未返回，已沿用上次结果，请求继续执行")
+            return True
+
+        except Exception as e:
+            logger.error(f"获取或保存数据失败: {e}")
+            self.stats["failed_updates"] += 1
+            return False
+
+        finally:
+            # 出错时批次中的基金同样重新入堆，不会从监控中消失
+            for code in batch.codes:
+                self.queue.reschedule(code, finished, delays.get(code))
+
+    def fetch_and_save(self) -> bool:
+        """
+        提交到期的基金，收下已完成的请求，并结束已全部返回或已到截止时间的批次
+
+        各批次的截止时间相互独立，等待一批结果期间之后到期的基金照常提交
+
+        Returns:
+            是否成功
+        """
+        try:
+            self._start_batch()
+            self._collect()
+        except Exception as e:
+            logger.error(f"获取或保存数据失败: {e}")
+            self.stats["failed_updates"] += 1
+            return False
+
+        success = True
+        now = time.monotonic()
+        stopping = self._stop_event.is_set()
+        for batch in [batch for batch in self._batches if not batch.pending or batch.deadline <= now or stopping]:
+            self._batches.remove(batch)
+            success = self._finish_batch(batch) and success
+        return success
+
+    def _wait(self, next_due: Optional[float]) -> bool:
+        """
+        有未结束的批次时等待任一请求完成、最早的批次截止或下一只基金到期，
+        否则休眠到下一只基金到期（按交易时段调度时休市期间休眠到下一个交易时段或净值发布窗口）
+
+        Returns:
+            是否被停止
+        """
+        if self._batches:
+            timeout = min(batch.deadline for batch in self._batches) - time.monotonic()
+            if next_due is not None:
+                timeout = min(timeout, next_due - time.time())
+            futures = [future for batch in self._batches for future in batch.pending.values()]
+            wait(futures, timeout=max(0.0, timeout), return_when=FIRST_COMPLETED)
+            return self._stop_event.is_set()
+
+        next_run = datetime.datetime.fromtimestamp(next_due)
+        if self.scheduler:
+            moment = max(next_run, datetime.datetime.now())
+            if not self.scheduler.is_active(moment):
+                next_run, reason = self.scheduler.next_run(moment)
+                logger.info(f"下一次刷新: {next_run:%Y-%m-%d %H:%M:%S} ({reason})")
+        return sleep_until(next_run, self._stop_event.wait)
+
+    def run_once(self) -> bool:
+        """
+        获取所有基金一次，等待各批次结束后返回
+
+        Returns:
+            是否成功
+        """
+        success = self.fetch_and_save()
+        while self._batches:
+            self._wait(None)
+            success = self.fetch_and_save() and success
+        return success
+
+    def monitor_loop(self):
+        """监控主循环：等待请求完成、批次截止或基金到期，每次醒来提交到期的基金并结束可以结束的批次"""
+        logger.info("=" * 60)
+        logger.info("场外基金实时估值监控已启动（多列表）")
+        logger.info(f"监控列表数: {len(self.watchlists)}，去重后基金数: {len(self.fund_codes)}")
+        for watchlist in self.watchlists:
+            logger.info(
+                f"  {watchlist.name}: {len(watchlist.fund_codes)} 只基金，刷新间隔 {watchlist.interval:g} 秒，"
+                f"优先级 {watchlist.priority}，输出 {watchlist.output_file}"
+            )
+        if self.scheduler:
+            logger.info("按交易时段调度，休市期间暂停刷新")
+        logger.info("=" * 60)
+
+        self.fetch_and_save()
+        while self.is_running:
+            next_due = self.queue.next_due()
+            if next_due is None and not self._batches:
+                logger.warning("没有需要监控的基金，监控结束")
+                self.is_running = False
+                break
+            if self._wait(next_due):
+                break
+            self.fetch_and_save()
+
+
 def create_sample_fund_file(file_path: str):
     """创建示例基金代码文件"""
     sample_content = """# 场外基金代码列表
@@ -217,6 +695,8 @@ def main():
   python fund_monitor.py -f funds.txt -o result.txt -i 30  # 自定义输出文件和刷新间隔
   python fund_monitor.py -f funds.txt --once        # 只执行一次
   python fund_monitor.py --create-sample            # 创建示例基金代码文件
+  python fund_monitor.py -f funds.txt --engine async  # 使用异步引擎
+  python fund_monitor.py --watchlist core.txt,30,2 --watchlist qdii.txt,300  # 多个基金列表
         """
     )
 
@@ -241,6 +721,40 @@ def main():
         help="刷新间隔秒数 (默认: 60)"
     )
 
+    parser.add_argument(
+        "--deadline-margin",
+        type=float,
+        default=None,
+        help="每轮在刷新间隔结束前多少秒写出报告，未返回的基金沿用上次结果 (默认: 刷新间隔的 10%%，至少 1 秒)"
+    )
+
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="增量模式：只刷新估值时间或净值日期预计会变化的基金，午休、收盘后与 QDII/货币基金大幅减少请求"
+    )
+
+    parser.add_argument(
+        "--market-hours",
+        action="store_true",
+        help="按交易时段调度：交易时段内按 --interval 刷新，交易日净值发布窗口（18-23 点）内按 --nav-interval 刷新，"
+             "午休、夜间、周末与节假日休眠到下一个交易时段或净值发布窗口"
+    )
+
+    parser.add_argument(
+        "--nav-interval",
+        type=int,
+        default=600,
+        help="按交易时段调度时，净值发布窗口内的刷新间隔秒数 (默认: 600)"
+    )
+
+    parser.add_argument(
+        "--holidays",
+        type=str,
+        default=None,
+        help="节假日文件，每行一个 YYYY-MM-DD（# 开头为注释），用于判断交易日 (默认: 只按工作日判断)"
+    )
+
     parser.add_argument(
         "--once",
         action="store_true",
@@ -253,44 +767,145 @@ def main():
         help="创建示例基金代码文件并退出"
     )
 
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help=f"最大并行线程数，实际并发按上游延迟与失败率自适应调整 "
+             f"(默认: {ADAPTIVE_MAX_WORKERS}，--fixed-concurrency 时为 {DEFAULT_MAX_WORKERS})"
+    )
+
+    parser.add_argument(
+        "--fixed-concurrency",
+        action="store_true",
+        help="固定并发：线程引擎固定为 --workers，异步引擎固定为 --concurrency，不做自适应调整"
+    )
+
+    parser.add_argument(
+        "--engine",
+        type=str,
+        choices=["thread", "async"],
+        default="thread",
+        help="估值引擎: thread(多线程) 或 async(asyncio) (默认: thread)"
+    )
+
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=200,
+        help="异步引擎最大并发基金数 (默认: 200)"
+    )
+
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=DEFAULT_CACHE_DIR,
+        help=f"基金元数据缓存目录 (默认: {DEFAULT_CACHE_DIR})"
+    )
+
+    parser.add_argument(
+        "--hedge-percentile",
+        type=float,
+        default=None,
+        help="对冲请求：天天基金超过该耗时分位（如 95）未返回时同时请求东方财富网 (默认: 不对冲)"
+    )
+
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=DEFAULT_RATE_LIMIT,
+        help=f"每个主机的速率上限（次/秒），实际速率从 {DEFAULT_INITIAL_RATE:g} 起自动探测，遇到限流自动降速，0 表示不限速 (默认: {DEFAULT_RATE_LIMIT:g})"
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="不使用本地元数据缓存"
+    )
+
     parser.add_argument(
         "--codes",
         type=str,
         help="直接指定基金代码，逗号分隔（如: 017174,023537,513260）"
     )
 
+    parser.add_argument(
+        "--watchlist",
+        type=str,
+        action="append",
+        metavar="FILE[,INTERVAL[,PRIORITY[,OUTPUT]]]",
+        help="多列表模式：基金文件及其刷新间隔（默认 --interval）、优先级（默认 0）与输出文件"
+             "（默认 <基金文件名>_valuation.txt），可多次指定；共有的基金只获取一次"
+    )
+
     args = parser.parse_args()
 
     if args.create_sample:
         create_sample_fund_file("funds_list.txt")
         return
 
-    fund_codes = []
+    options = dict(
+        deadline_margin=args.deadline_margin,
+        market_hours=args.market_hours,
+        nav_interval=args.nav_interval,
+        holidays_file=args.holidays,
+        max_workers=args.workers,
+        engine=args.engine,
+        concurrency=args.concurrency,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        hedge_percentile=args.hedge_percentile,
+        rate_limit=args.rate_limit,
+        adaptive=not args.fixed_concurrency
+    )
 
-    if args.codes:
-        fund_codes = [code.strip() for code in args.codes.split(",") if code.strip()]
-        logger.info(f"从命令行参数获取了 {len(fund_codes)} 个基金代码")
-    elif os.path.exists(args.fund_file):
-        fund_codes = read_fund_codes_from_file(args.fund_file)
+    if args.watchlist:
+        try:
+            watchlists = [Watchlist.parse(spec, args.interval) for spec in args.watchlist]
+        except ValueError as e:
+            logger.error(str(e))
+            return
+        for watchlist in watchlists:
+            if not watchlist.fund_codes:
+                logger.warning(f"基金列表 {watchlist.name} 没有有效的基金代码，已忽略")
+        watchlists = [watchlist for watchlist in watchlists if watchlist.fund_codes]
+        if not watchlists:
+            logger.error("没有有效的基金代码，程序退出")
+            return
+        if args.incremental:
+            logger.warning("多列表模式不支持增量模式，已忽略 --incremental")
+
+        monitor = MultiWatchlistMonitor(watchlists, **options)
+        output_files = ", ".join(watchlist.output_file for watchlist in watchlists)
     else:
-        logger.error(f"基金代码文件不存在: {args.fund_file}")
-        logger.info("使用 --create-sample 参数创建示例文件")
-        return
+        fund_codes = []
 
-    if not fund_codes:
-        logger.error("没有有效的基金代码，程序退出")
-        return
+        if args.codes:
+            fund_codes = [code.strip() for code in args.codes.split(",") if code.strip()]
+            logger.info(f"从命令行参数获取了 {len(fund_codes)} 个基金代码")
+        elif os.path.exists(args.fund_file):
+            fund_codes = read_fund_codes_from_file(args.fund_file)
+        else:
+            logger.error(f"基金代码文件不存在: {args.fund_file}")
+            logger.info("使用 --create-sample 参数创建示例文件")
+            return
 
-    monitor = FundMonitor(
-        fund_codes=fund_codes,
-        output_file=args.output,
-        interval=args.interval
-    )
+        if not fund_codes:
+            logger.error("没有有效的基金代码，程序退出")
+            return
+
+        monitor = FundMonitor(
+            fund_codes=fund_codes,
+            output_file=args.output,
+            interval=args.interval,
+            incremental=args.incremental,
+            **options
+        )
+        output_files = args.output
 
     if args.once:
         logger.info("执行单次更新...")
         if monitor.run_once():
-            logger.info(f"数据已保存到: {args.output}")
+            logger.info(f"数据已保存到: {output_files}")
         else:
             logger.error("更新失败")
     else:
@@ -0,0 +1,210 @@
+# -*- coding: UTF-8 -*-
+"""
+基金页面解析模块 v1.0
+集中解析天天基金 / 东方财富网返回的页面与脚本，所有正则均预编译，
+每个页面只扫描一遍并在取齐所需字段后立即停止；
+天天基金页面的数据在内嵌的 window.context 状态 JSON 中，先定位该 JSON 再扫描，不扫描前面的大段 HTML；
+pingzhongdata 脚本支持边下载边解析，取到基金名称和代码后即可断开连接；
+fundcode_search 脚本为全市场基金列表，一次解析即可得到所有基金的名称与官方类型
+"""
+
+import codecs
+import json
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 流式读取时每次读取的字节数
+STREAM_CHUNK_SIZE = 8192
+
+# 天天基金页面内嵌状态 JSON 的起始标记，以及其中当前基金的信息对象（不含嵌套对象）
+_FUND123_STATE_MARKER = "window.context"
+_FUND123_FUND_INFO_MARKER = '"fundInfo":{'
+_CSRF_PATTERN = re.compile(r'"csrf":"([^"\n]*)"')
+_FUND123_DETAIL_PATTERN = re.compile(r'"(dayOfGrowth|netValue|netValueDate)":"([^"\n]*)"')
+_EASTMONEY_INFO_PATTERN = re.compile(r'var (fS_name|fS_code) = "([^"\n]*)"')
+_JSONPGZ_PATTERN = re.compile(r'jsonpgz\((.*?)\);')
+
+_FUND123_DETAIL_FIELDS = {
+    "dayOfGrowth": "day_of_growth",
+    "netValue": "net_value",
+    "netValueDate": "net_value_date"
+}
+
+
+def _scan_fields(
+    pattern: re.Pattern,
+    text: str,
+    wanted: int,
+    start: int = 0,
+    end: Optional[int] = None
+) -> Dict[str, str]:
+    """单次扫描 text[start:end]，每个字段只取第一次出现的值，取齐 wanted 个字段后停止"""
+    found = {}
+    for match in pattern.finditer(text, start, len(text) if end is None else end):
+        name = match.group(1)
+        if name in found:
+            continue
+        found[name] = match.group(2)
+        if len(found) == wanted:
+            break
+    return found
+
+
+def _fund123_state_start(text: str) -> int:
+    """window.context 状态 JSON 在页面中的位置，没有时返回 0（扫描整个页面）"""
+    start = text.find(_FUND123_STATE_MARKER)
+    return start if start >= 0 else 0
+
+
+def parse_csrf_token(text: str) -> str:
+    """解析天天基金页面中的CSRF令牌（从状态 JSON 开始查找，找不到时查找整个页面）"""
+    start = _fund123_state_start(text)
+    csrf_match = _CSRF_PATTERN.search(text, start)
+    if not csrf_match and start:
+        csrf_match = _CSRF_PATTERN.search(text)
+    return csrf_match.group(1) if csrf_match else ""
+
+
+def parse_eastmoney_info(fund_code: str, text: str) -> Dict:
+    """解析东方财富网 pingzhongdata 脚本中的基金名称与代码"""
+    found = _scan_fields(_EASTMONEY_INFO_PATTERN, text, 2)
+
+    return {
+        "fund_key": found.get("fS_code", fund_code),
+        "fund_name": found.get("fS_name", f"基金{fund_code}")
+    }
+
+
+class EastmoneyInfoScanner:
+    """
+    pingzhongdata 脚本的增量解析器
+
+    fS_name / fS_code 位于脚本开头，而脚本其余部分是多年的净值历史（常达数百 KB），
+    逐块 feed 下载内容，两个变量都取到后 feed 返回 True，调用方即可停止读取
+    """
+
+    # 保留上一块末尾的字符数，保证跨块的变量定义也能匹配
+    OVERLAP = 256
+
+    def __init__(self, fund_code: str):
+        self.fund_code = fund_code
+        self.bytes_read = 0
+        self._found = {}
+        self._tail = ""
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    @property
+    def done(self) -> bool:
+        return len(self._found) == 2
+
+    def feed(self, chunk: bytes) -> bool:
+        """解析一块下载内容，返回是否已取齐全部字段"""
+        self.bytes_read += len(chunk)
+        text = self._tail + self._decoder.decode(chunk)
+        for name, value in _scan_fields(_EASTMONEY_INFO_PATTERN, text, 2).items():
+            self._found.setdefault(name, value)
+        self._tail = text[-self.OVERLAP:]
+        return self.done
+
+    def result(self) -> Dict:
+        """与 parse_eastmoney_info 相同格式的解析结果"""
+        return {
+            "fund_key": self._found.get("fS_code", self.fund_code),
+            "fund_name": self._found.get("fS_name", f"基金{self.fund_code}")
+        }
+
+
+def parse_eastmoney_info_stream(fund_code: str, chunks: Iterable[bytes]) -> Dict:
+    """
+    边读取边解析 pingzhongdata 脚本，取齐基金名称和代码后立即停止迭代
+
+    Args:
+        fund_code: 基金代码
+        chunks: 响应内容的字节块迭代器（如 requests 的 iter_content）
+    """
+    scanner = EastmoneyInfoScanner(fund_code)
+    for chunk in chunks:
+        if scanner.feed(chunk):
+            break
+    return scanner.result()
+
+
+def parse_eastmoney_detail(text: str) -> Optional[Dict]:
+    """解析东方财富网 fundgz JSONP 估值数据"""
+    jsonp_match = _JSONPGZ_PATTERN.search(text)
+    if not jsonp_match:
+        return None
+
+    data = json.loads(jsonp_match.group(1))
+
+    net_value = data.get("dwjz", "N/A")
+    net_value_date = data.get("jzrq", "N/A")
+    estimate_value = data.get("gsz", "N/A")
+    estimate_growth = data.get("gszzl", "N/A")
+    estimate_time = data.get("gztime", "N/A")
+
+    day_growth = "N/A"
+    try:
+        if net_value != "N/A" and estimate_value != "N/A":
+            nv = float(net_value)
+            ev = float(estimate_value)
+            day_growth = str(round((ev - nv) / nv * 100, 2))
+    except:
+        pass
+
+    return {
+        "net_value": net_value,
+        "net_value_date": net_value_date,
+        "day_of_growth": day_growth,
+        "estimate_value": estimate_value,
+        "estimate_growth": estimate_growth,
+        "estimate_time": estimate_time
+    }
+
+
+def parse_fund123_detail(text: str) -> Dict:
+    """
+    解析天天基金 matiaria 页面中的净值数据（单次扫描）
+
+    只在状态 JSON 的 fundInfo 对象内查找，相似基金列表中的同名字段不会被误取
+    （QDII 基金的 fundInfo 没有 dayOfGrowth，此时为 N/A）；页面中没有 fundInfo 时扫描整个页面
+    """
+    start = text.find(_FUND123_FUND_INFO_MARKER, _fund123_state_start(text))
+    if start >= 0:
+        end = text.find("}", start)
+        found = _scan_fields(
+            _FUND123_DETAIL_PATTERN, text, len(_FUND123_DETAIL_FIELDS), start, end if end >= 0 else len(text)
+        )
+    else:
+        found = _scan_fields(_FUND123_DETAIL_PATTERN, text, len(_FUND123_DETAIL_FIELDS))
+
+    return {
+        key: found.get(name, "N/A")
+        for name, key in _FUND123_DETAIL_FIELDS.items()
+    }
+
+
+def parse_fund_universe(text: str) -> List[Tuple[str, str, str, str]]:
+    """
+    解析东方财富网 fundcode_search.js 全市场基金列表
+
+    脚本格式为 var r = [["000001","HXCZHH","华夏成长混合","混合型-灵活","HUAXIACHENGZHANGHUNHE"],...];
+
+    Returns:
+        [(基金代码, 基金名称, 基金类型, 拼音缩写), ...]，格式不符时返回空列表
+    """
+    start = text.find("[")
+    end = text.rfind("]")
+    if start < 0 or end <= start:
+        return []
+
+    try:
+        rows = json.loads(text[start:end + 1])
+    except ValueError:
+        return []
+
+    return [
+        (row[0], row[2], row[3], row[1])
+        for row in rows
+        if isinstance(row, list) and len(row) >= 4 and row[0]
+    ]
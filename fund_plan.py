@@ -0,0 +1,53 @@
+# -*- coding: UTF-8 -*-
+"""
+基金获取计划模块 v1.0
+根据分类文件中的基金类型决定每只基金需要请求哪些接口、优先使用哪个数据源以及刷新周期：
+- QDII：天天基金盘中估值接口固定返回空列表，只请求净值详情
+- 货币型：没有盘中估值，净值每日更新一次，只请求净值详情
+- 债券型：东方财富网 fundgz 一次请求即可同时得到净值与估值
+- 其他：天天基金完整路径（基金信息 + 净值详情 + 盘中估值）
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+from fund_quote import QuoteSource
+
+
+@dataclass(frozen=True)
+class FetchPlan:
+    """单只基金的获取计划"""
+
+    source: QuoteSource = QuoteSource.FUND123
+    estimate: bool = True          # 是否请求天天基金盘中估值
+    qdii: bool = False             # 跳过估值时是否标记为 QDII
+    refresh_interval: int = 0      # 监控模式下的最短刷新间隔（秒），0 表示每轮都刷新
+
+    @property
+    def needs_fund_key(self) -> bool:
+        """是否需要天天基金的 fund_key（只有盘中估值接口需要）"""
+        return self.source is QuoteSource.FUND123 and self.estimate
+
+
+DEFAULT_PLAN = FetchPlan()
+QDII_PLAN = FetchPlan(estimate=False, qdii=True, refresh_interval=3600)
+MONEY_PLAN = FetchPlan(estimate=False, refresh_interval=3600)
+BOND_PLAN = FetchPlan(source=QuoteSource.EASTMONEY, refresh_interval=300)
+
+
+def plan_for_type(fund_type: Optional[str]) -> FetchPlan:
+    """
+    根据基金类型选择获取计划
+
+    同时支持关键字推断的类型（QDII型/货币型/债券型）与东方财富网官方类型（QDII-普通股票/货币型-普通货币/债券型-长债）
+    """
+    if not fund_type:
+        return DEFAULT_PLAN
+
+    if "QDII" in fund_type.upper():
+        return QDII_PLAN
+    if "货币" in fund_type:
+        return MONEY_PLAN
+    if "债券" in fund_type:
+        return BOND_PLAN
+    return DEFAULT_PLAN
@@ -0,0 +1,106 @@
+# -*- coding: UTF-8 -*-
+"""
+基金估值记录模块 v1.0
+FundQuote 使用 __slots__ 与浮点字段保存单只基金的估值结果，缺失数值为 NaN，
+只在序列化（JSON/CSV）时才转换为字典或字符串
+"""
+
+import datetime
+import math
+from dataclasses import dataclass, field, replace
+from enum import Enum, IntEnum
+from typing import Dict
+
+NAN = float("nan")
+FAILED_NAME = "获取失败"
+
+
+class QuoteSource(Enum):
+    """估值数据来源"""
+    FUND123 = "fund123"
+    EASTMONEY = "eastmoney"
+    FAILED = "failed"
+
+
+class QdiiFlag(IntEnum):
+    """QDII 标记，非零即视为 QDII"""
+    NO = 0
+    BY_NAME = 1        # 基金名称含 QDII
+    NO_INTRADAY = 2    # 无盘中估值数据
+
+
+def to_float(value) -> float:
+    """将接口返回的数值或字符串转换为浮点数，无法转换时返回 NaN"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+
+def format_float(value: float, digits: int, na: str = "N/A") -> str:
+    """格式化浮点数，NaN 显示为 na"""
+    return na if math.isnan(value) else f"{value:.{digits}f}"
+
+
+def _now() -> str:
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+@dataclass(slots=True)
+class FundQuote:
+    """单只基金的估值结果"""
+
+    fund_code: str
+    fund_name: str
+    fund_key: str = ""
+    net_value: float = NAN
+    net_value_date: str = "N/A"
+    day_of_growth: float = NAN
+    estimate_time: str = "N/A"
+    forecast_growth: float = NAN
+    forecast_net_value: float = NAN
+    is_qdii: QdiiFlag = QdiiFlag.NO
+    source: QuoteSource = QuoteSource.FUND123
+    update_time: str = field(default_factory=_now)
+    error: str = ""
+    age: float = 0.0    # 大于 0 表示本轮未及时获取，沿用的是 age 秒前的结果
+
+    @property
+    def is_stale(self) -> bool:
+        return self.age > 0
+
+    def stale(self, age: float) -> "FundQuote":
+        """返回标记为沿用旧值的副本"""
+        return replace(self, age=age)
+
+    @classmethod
+    def failed(cls, fund_code: str, error: str = "") -> "FundQuote":
+        """构造获取失败时的占位记录"""
+        return cls(fund_code=fund_code, fund_name=FAILED_NAME, source=QuoteSource.FAILED, error=error)
+
+    @property
+    def is_failed(self) -> bool:
+        return self.source is QuoteSource.FAILED
+
+    def to_dict(self) -> Dict:
+        """转换为与历史 JSON 输出兼容的字典"""
+        data = {
+            "fund_code": self.fund_code,
+            "fund_name": self.fund_name,
+            "fund_key": self.fund_key,
+            "net_value": format_float(self.net_value, 4),
+            "net_value_date": self.net_value_date,
+            "day_of_growth": format_float(self.day_of_growth, 2),
+            "estimate_time": self.estimate_time,
+            "forecast_growth": 0 if math.isnan(self.forecast_growth) else self.forecast_growth,
+            "forecast_net_value": 0 if math.isnan(self.forecast_net_value) else self.forecast_net_value,
+            "is_qdii": bool(self.is_qdii),
+            "source": self.source.value,
+            "update_time": self.update_time
+        }
+        if self.is_failed:
+            data["status"] = "failed"
+            data["error"] = self.error
+        if self.is_stale:
+            data["stale_seconds"] = int(self.age)
+        return data
@@ -0,0 +1,194 @@
+# -*- coding: UTF-8 -*-
+"""
+请求限速模块 v1.0
+每个上游主机一个令牌桶，所有请求路径共用（AIMD）：
+- 从起始速率开始按当前速率发放令牌，允许短时突发
+- 速率成为瓶颈（请求需要等待令牌）时，每次成功请求加性提高速率，逐步探测上游可承受的最大速率
+- 遇到超时、429、503 或本应返回 JSON/JS 却返回 HTML 错误页时，速率减半并暂停发放
+- 其他 5xx 是服务端故障而非限流，不调整速率，由调用方计入数据源熔断（见 fund_health）
+- 上限只用于防止失控，默认足够高，实际速率由探测决定
+同步代码用 acquire（阻塞等待），异步代码用 acquire_async
+"""
+
+import asyncio
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+# 每个主机默认的速率上限（次/秒），只防止失控，实际速率由加性增加探测
+DEFAULT_RATE_LIMIT = 1000.0
+# 每个主机的起始速率（次/秒）
+DEFAULT_INITIAL_RATE = 20.0
+# 表示限流的状态码；其他 5xx 视为服务端故障
+THROTTLE_STATUSES = (429, 503)
+
+
+class TokenBucket:
+    """单个主机的自适应令牌桶（线程安全）"""
+
+    def __init__(
+        self,
+        name: str,
+        max_rate: float,
+        initial_rate: float = DEFAULT_INITIAL_RATE,
+        min_rate: float = 0.5,
+        backoff_factor: float = 0.5,
+        penalty: float = 1.0,
+        increase: float = 0.2
+    ):
+        """
+        Args:
+            name: 主机名，用于日志
+            max_rate: 速率上限（次/秒）
+            initial_rate: 起始速率（次/秒），当前速率同时作为桶容量
+            min_rate: 退避后的速率下限
+            backoff_factor: 每次退避时速率乘以该系数
+            penalty: 退避时暂停发放令牌的秒数（429 带 Retry-After 时以其为准）
+            increase: 速率成为瓶颈时每次成功请求增加的速率（次/秒）；
+                      每秒约有 rate 次成功，因此持续受限时速率每秒约提高 rate * increase
+        """
+        self.name = name
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.backoff_factor = backoff_factor
+        self.penalty = penalty
+        self.increase = increase
+
+        self.rate = min(initial_rate, max_rate)
+        self.peak_rate = self.rate
+        self.throttled = 0
+        self._tokens = self.rate
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        """按经过的时间补充令牌（调用方需持有锁）"""
+        self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """
+        预占一个令牌
+
+        Returns:
+            需要等待的秒数，0 表示可立即请求
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def record_success(self):
+        """记录一次正常响应：令牌已用尽（速率是瓶颈）时加性提高速率"""
+        if self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                return
+            self.rate = min(self.max_rate, self.rate + self.increase)
+            self.peak_rate = max(self.peak_rate, self.rate)
+
+    def record_throttle(self, retry_after: Optional[float] = None):
+        """记录一次限流信号（超时 / 429 / 503 / HTML 错误页），降低速率并暂停发放令牌"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate * self.backoff_factor)
+            pause = retry_after if retry_after is not None else self.penalty
+            self._tokens = min(self._tokens, -pause * self.rate)
+            self.throttled += 1
+            rate = self.rate
+        logger.debug(f"主机 {self.name} 触发限流，速率降至 {rate:.1f} 次/秒，暂停 {pause:g} 秒")
+
+
+class HostRateLimiter:
+    """按主机划分的令牌桶集合"""
+
+    def __init__(self, max_rate: float = DEFAULT_RATE_LIMIT, **bucket_options):
+        """
+        Args:
+            max_rate: 每个主机的速率上限（次/秒）
+            bucket_options: 传给 TokenBucket 的其他参数（起始速率、增加步长等）
+        """
+        self.max_rate = max_rate
+        self.bucket_options = bucket_options
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url: str) -> TokenBucket:
+        """获取 url 所属主机的令牌桶"""
+        host = urlsplit(url).netloc or url
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.setdefault(
+                    host, TokenBucket(host, self.max_rate, **self.bucket_options)
+                )
+        return bucket
+
+    def acquire(self, url: str):
+        """阻塞直到可以请求 url"""
+        delay = self.bucket(url).reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self, url: str):
+        """等待直到可以请求 url（不阻塞事件循环）"""
+        delay = self.bucket(url).reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+    def record_success(self, url: str):
+        self.bucket(url).record_success()
+
+    def record_throttle(self, url: str, retry_after: Optional[float] = None):
+        self.bucket(url).record_throttle(retry_after)
+
+    def summary(self) -> str:
+        """各主机当前速率与限流次数"""
+        if not self._buckets:
+            return "限速: 暂无请求"
+
+        lines = [f"限速: 每主机上限 {self.max_rate:g} 次/秒"]
+        for host, bucket in sorted(self._buckets.items()):
+            lines.append(
+                f"  {host}: 当前 {bucket.rate:.1f} 次/秒，最高 {bucket.peak_rate:.1f} 次/秒，"
+                f"触发限流 {bucket.throttled} 次"
+            )
+        return "\n".join(lines)
+
+
+def is_throttle_response(status: int, content_type: str, expects_html: bool) -> bool:
+    """
+    判断响应是否为限流信号（429、503，或本应返回 JSON/JS 却返回 HTML 页面）
+
+    Args:
+        status: HTTP 状态码
+        content_type: 响应的 Content-Type
+        expects_html: 该请求本来是否就返回 HTML 页面（由调用方显式给出，不根据 Accept 请求头推断）
+    """
+    if status in THROTTLE_STATUSES:
+        return True
+    return not expects_html and "text/html" in content_type.lower()
+
+
+def is_server_error(status: int) -> bool:
+    """限流状态码以外的 5xx：服务端故障，应计入数据源熔断而不是降低速率"""
+    return status >= 500 and status not in THROTTLE_STATUSES
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 秒数，无法解析时返回 None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
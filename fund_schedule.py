@@ -0,0 +1,110 @@
+# -*- coding: UTF-8 -*-
+"""
+增量刷新调度模块 v1.0
+记录每只基金上次看到的估值时间与净值日期，只在预计有新数据时才重新获取：
+- 有盘中估值的基金：交易时段内每轮刷新，午休、收盘后与非交易日（含节假日，见 fund_calendar）等到下一个交易时段
+- 净值：最新净值日期已达到预期时，等到下一次净值发布时刻；尚未发布时按退避间隔轮询
+- 数据连续未变化时刷新间隔逐次翻倍（有上限），一旦变化立即恢复每轮刷新
+"""
+
+import datetime
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from fund_calendar import MarketCalendar
+from fund_quote import FundQuote
+
+
+class FundState:
+    """单只基金的增量刷新状态"""
+
+    __slots__ = ("estimate_time", "net_value_date", "unchanged", "next_due")
+
+    def __init__(self):
+        self.estimate_time = None
+        self.net_value_date = None
+        self.unchanged = 0
+        self.next_due = 0.0
+
+
+class IncrementalSchedule:
+    """按预计的数据更新时间安排每只基金的下一次刷新"""
+
+    def __init__(
+        self,
+        poll_interval: float,
+        latest_nav_date: Callable[[Optional[datetime.datetime]], str],
+        nav_publish_hour: int = 18,
+        max_idle: float = 1800,
+        calendar: Optional[MarketCalendar] = None
+    ):
+        """
+        Args:
+            poll_interval: 监控刷新间隔（秒），也是连续未变化时退避的起始间隔
+            latest_nav_date: 给定时刻可以期待的最新净值日期（通常为 NavDetailCache.latest_nav_date）
+            nav_publish_hour: 净值开始发布的时刻（小时）
+            max_idle: 数据未变化时两次刷新的最长间隔（秒）
+            calendar: 交易日历，None 表示只按工作日判断交易日
+        """
+        self.poll_interval = poll_interval
+        self.latest_nav_date = latest_nav_date
+        self.nav_publish_hour = nav_publish_hour
+        self.max_idle = max_idle
+        self.calendar = calendar or MarketCalendar()
+        self._states: Dict[str, FundState] = {}
+
+    def due(self, fund_codes: Iterable[str], now: Optional[float] = None) -> List[str]:
+        """本轮需要刷新的基金（从未获取过的基金总是需要刷新）"""
+        now = time.time() if now is None else now
+        # 留出半个刷新间隔的余量，避免到期时刻略晚于本轮开始而被推迟一整轮
+        horizon = now + self.poll_interval / 2
+        return [
+            code for code in fund_codes
+            if code not in self._states or self._states[code].next_due <= horizon
+        ]
+
+    def next_nav_publish(self, now: datetime.datetime) -> datetime.datetime:
+        """预期最新净值日期下一次变化的时刻"""
+        current = self.latest_nav_date(now)
+        day = now.date()
+        for _ in range(30):
+            moment = datetime.datetime.combine(day, datetime.time(self.nav_publish_hour))
+            if moment > now and self.latest_nav_date(moment) > current:
+                return moment
+            day += datetime.timedelta(days=1)
+        return now + datetime.timedelta(days=1)
+
+    def observe(self, quote: FundQuote, now: Optional[float] = None) -> bool:
+        """
+        记录一次获取结果并安排下一次刷新
+
+        Returns:
+            与上次相比数据是否有变化（失败的结果视为无变化，下一轮重新获取）
+        """
+        now = time.time() if now is None else now
+        state = self._states.setdefault(quote.fund_code, FundState())
+        if quote.is_failed:
+            state.next_due = now
+            return False
+
+        changed = (quote.estimate_time, quote.net_value_date) != (state.estimate_time, state.net_value_date)
+        state.estimate_time = quote.estimate_time
+        state.net_value_date = quote.net_value_date
+        state.unchanged = 0 if changed else state.unchanged + 1
+
+        if quote.net_value_date in (None, "", "N/A"):
+            # 净值日期未知（详情获取或解析失败）：视为未更新，不参与退避，下一轮重新获取
+            state.next_due = now
+            return changed
+
+        moment = datetime.datetime.fromtimestamp(now)
+        if quote.net_value_date < self.latest_nav_date(moment):
+            expected = moment
+        else:
+            expected = self.next_nav_publish(moment)
+        if quote.estimate_time != "N/A" and not quote.is_qdii:
+            expected = min(expected, self.calendar.next_estimate_update(moment))
+
+        backoff = min(self.max_idle, self.poll_interval * 2 ** state.unchanged) if state.unchanged else 0
+        state.next_due = max(expected.timestamp(), now + backoff)
+        return changed
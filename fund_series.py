@@ -0,0 +1,102 @@
+# -*- coding: UTF-8 -*-
+"""
+盘中估值序列存储模块 v1.0
+按基金保存当日全部盘中估值点（时间戳/估值涨幅/估值净值），使用紧凑的类型化数组而非字典，
+后续请求只需获取最后一个估值点之后的数据
+"""
+
+import datetime
+import threading
+from array import array
+from typing import Dict, List, Optional
+
+from fund_quote import NAN
+
+
+class IntradaySeries:
+    """单只基金的当日盘中估值序列（列式存储）"""
+
+    __slots__ = ("day", "times", "growths", "net_values", "_lock")
+
+    def __init__(self, day: str):
+        self.day = day
+        self.times = array("q")
+        self.growths = array("d")
+        self.net_values = array("d")
+        # 同一基金的估值请求可能在多个工作线程中同时返回，追加与读取最新点需互斥
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @property
+    def last_time(self) -> Optional[int]:
+        """最后一个估值点的毫秒时间戳"""
+        return self.times[-1] if self.times else None
+
+    def extend(self, points: List[Dict]) -> int:
+        """
+        追加估值点，只保留时间晚于已有最后一点的数据
+
+        Args:
+            points: queryFundEstimateIntraday 返回的 list
+
+        Returns:
+            实际追加的点数
+        """
+        with self._lock:
+            last = self.last_time
+            added = 0
+            for point in points:
+                ts = int(point["time"])
+                if last is not None and ts <= last:
+                    continue
+                self.times.append(ts)
+                self.growths.append(float(point.get("forecastGrowth") or 0))
+                self.net_values.append(float(point.get("forecastNetValue") or 0))
+                last = ts
+                added += 1
+            return added
+
+    def latest_estimate(self) -> Dict:
+        """以最新估值点构造估值数据；序列为空时视为无盘中估值（QDII）"""
+        with self._lock:
+            if not self.times:
+                return {
+                    "estimate_time": "N/A",
+                    "forecast_growth": NAN,
+                    "forecast_net_value": NAN,
+                    "is_qdii": True
+                }
+            last_time = self.times[-1]
+            forecast_growth = self.growths[-1]
+            forecast_net_value = self.net_values[-1]
+
+        return {
+            "estimate_time": datetime.datetime.fromtimestamp(last_time / 1000).strftime("%H:%M"),
+            "forecast_growth": round(forecast_growth * 100, 2) if forecast_growth else 0,
+            "forecast_net_value": round(forecast_net_value, 4) if forecast_net_value else 0
+        }
+
+
+class IntradaySeriesStore:
+    """所有基金的盘中估值序列，跨交易日自动清空"""
+
+    def __init__(self):
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def get(self, fund_code: str) -> IntradaySeries:
+        """获取基金当日的估值序列，不存在或已跨日时新建"""
+        today = datetime.date.today().strftime("%Y-%m-%d")
+        with self._lock:
+            series = self._series.get(fund_code)
+            if series is None or series.day != today:
+                series = IntradaySeries(today)
+                self._series[fund_code] = series
+            return series
+
+    def reset(self, fund_code: str):
+        """丢弃基金的估值序列，下次请求将重新获取全天数据"""
+        with self._lock:
+            self._series.pop(fund_code, None)
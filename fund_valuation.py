@@ -6,492 +6,567 @@
 """
 
 import datetime
-import json
+import heapq
+import io
+import math
 import os
+import queue
 import re
+import shutil
+import tempfile
 import threading
 import time
-from typing import Dict, List, Optional
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple
 
 import requests
 import urllib3
 from loguru import logger
 
-urllib3.disable_warnings()
-
+from fund_cache import DEFAULT_CACHE_DIR
+from fund_calendar import MarketCalendar
+from fund_concurrency import INITIAL_CONCURRENCY, AdaptiveConcurrency, default_max_workers
+from fund_engine import FundEngineBase, FundRequest, build_eastmoney_quote
+from fund_http import create_session, prewarm, session_pool_stats
+from fund_parser import STREAM_CHUNK_SIZE, parse_eastmoney_info_stream
+from fund_plan import plan_for_type
+from fund_quote import FundQuote, format_float
+from fund_ratelimit import DEFAULT_RATE_LIMIT
 
-class FundValuation:
-    """场外基金实时估值获取类"""
+urllib3.disable_warnings()
 
-    FUND123_BASE_URL = "https://www.fund123.cn"
-    EASTMONEY_BASE_URL = "https://fund.eastmoney.com"
 
-    def __init__(self):
-        self.session = requests.Session()
-        self._csrf = ""
-        self.fund_cache = {}
-        self.use_eastmoney = False
+class FundValuation(FundEngineBase):
+    """场外基金实时估值获取类（线程池 + requests），请求构造、响应处理与获取计划见 fund_engine.FundEngineBase"""
+
+    # 计入东方财富网熔断的传输错误，解析失败只记录日志
+    TRANSPORT_ERRORS = (requests.RequestException,)
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+        hedge_percentile: Optional[float] = None,
+        rate_limit: float = DEFAULT_RATE_LIMIT,
+        adaptive: bool = True,
+        calendar: Optional[MarketCalendar] = None
+    ):
+        """
+        初始化估值获取器
+
+        Args:
+            max_workers: 批量获取时的工作线程数（同时在途基金数的上限），线程池在多次批量调用间复用；
+                         None 时自适应为 32，固定并发为 4（见 fund_concurrency.default_max_workers）
+            cache_dir: 基金元数据持久化缓存目录，None 表示不使用持久化缓存
+            hedge_percentile: 启用对冲请求时的耗时分位（如 95），天天基金在该分位耗时内
+                              未返回时同时请求东方财富网，取先返回者；None 表示不对冲
+            rate_limit: 每个主机的速率上限（次/秒），实际速率自动探测，遇到限流自动降速；0 表示不限速
+            adaptive: 是否按上游延迟与失败率自适应调整并发（AIMD），False 时固定为 max_workers
+            calendar: 交易日历（判断净值是否可能已更新），None 表示只按工作日判断交易日
+        """
+        super().__init__(cache_dir, hedge_percentile, rate_limit, calendar)
+        max_workers = max_workers or default_max_workers(adaptive)
+        # 连接池需容纳批量、流水线与对冲三个线程池同时请求同一主机
+        self.session = create_session(pool_size=max_workers * 3, rate_limiter=self.rate_limiter)
+        # 令牌作废后只由一个线程重新获取，其他线程沿用新令牌
+        self._csrf_lock = threading.Lock()
+        self.max_workers = max_workers
+        self.concurrency = AdaptiveConcurrency(max_workers, initial=INITIAL_CONCURRENCY, adaptive=adaptive)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="fund-valuation"
+        )
+        # 单只基金内部的并行子请求使用独立线程池，避免与批量线程池互相等待
+        self._pipeline_executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="fund-pipeline"
+        )
+        # 对冲请求的主/备请求在独立线程池中执行，落败的请求在后台完成
+        self._hedge_executor = ThreadPoolExecutor(
+            max_workers=max_workers * 2,
+            thread_name_prefix="fund-hedge"
+        ) if hedge_percentile else None
+        # 批量提交的基金先在调度线程中按提交顺序等待并发名额，取得名额后才交给线程池，等待中的基金不占用工作线程
+        self._dispatch_queue = queue.SimpleQueue()
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="fund-dispatch", daemon=True)
+        self._dispatcher.start()
+        prewarm(self.session)
         self.init_session()
 
-    def init_session(self):
-        """初始化会话，获取CSRF令牌"""
+    def close(self):
+        """关闭工作线程池和HTTP会话"""
+        self._dispatch_queue.put(None)
+        self._dispatcher.join()
+        self.executor.shutdown(wait=True)
+        self._pipeline_executor.shutdown(wait=True)
+        if self._hedge_executor:
+            self._hedge_executor.shutdown(wait=True)
+        self.session.close()
+        if self.meta_cache:
+            self.meta_cache.close()
+
+    def pool_stats(self) -> Dict[str, Dict[str, int]]:
+        """各主机连接池的新建/复用次数"""
+        return session_pool_stats(self.session)
+
+    def _send(self, request: FundRequest, **kwargs) -> requests.Response:
+        """发出请求，kwargs 透传给 requests（如 stream=True）"""
+        return self.session.request(
+            request.method,
+            request.url,
+            headers=request.headers,
+            params=request.params,
+            json=request.json,
+            timeout=10,
+            verify=False,
+            expect_html=request.expect_html,
+            **kwargs
+        )
+
+    def _fetch_text(self, request: FundRequest, encoding: Optional[str] = None) -> str:
+        response = self._send(request)
+        if encoding:
+            response.encoding = encoding
+        return response.text
+
+    def _fetch_json(self, request: FundRequest) -> Dict:
+        return self._send(request).json()
+
+    def init_session(self) -> bool:
+        """初始化会话，获取CSRF令牌，返回是否成功"""
         try:
-            headers = {
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-                "Accept-Language": "zh-CN,zh;q=0.9",
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            }
-            response = self.session.get(
-                f"{self.FUND123_BASE_URL}/fund",
-                headers=headers,
-                timeout=10,
-                verify=False
-            )
-            csrf_match = re.search(r'"csrf":"(.*?)"', response.text)
-            if csrf_match:
-                self._csrf = csrf_match.group(1)
-                logger.debug(f"CSRF令牌获取成功: {self._csrf[:10]}...")
+            return self._on_csrf_page(self._fetch_text(self._csrf_page_request()))
         except Exception as e:
-            logger.warning(f"初始化天天基金会话失败，将使用东方财富网: {e}")
-            self.use_eastmoney = True
+            return self._on_csrf_error(e)
+
+    def _acquire_fund123(self, need_csrf: bool = True) -> bool:
+        """
+        请求天天基金前调用，熔断器放行且会话可用时返回 True（见 FundEngineBase._admit_fund123）
+
+        令牌被作废（见 _invalidate_csrf）后由第一个请求重新获取，同时等待的请求沿用新令牌
+        """
+        admitted, refresh = self._admit_fund123(need_csrf)
+        if not refresh:
+            return admitted
+
+        stale = self._csrf
+        with self._csrf_lock:
+            if self._csrf and self._csrf != stale:
+                return True
+            return self.init_session()
+
+    def _hedged(self, kind: str, primary, backup, fund_code: str) -> Tuple[Optional[Dict], bool]:
+        """
+        对冲请求：主请求在最近耗时的 hedge_percentile 分位内未返回时发出备用请求，取先返回的有效结果
+
+        落败的请求继续在后台执行（主请求完成后仍会写入缓存）
+
+        Returns:
+            (结果, 是否来自备用请求)
+        """
+        tracker = self._latency[kind]
+        delay = tracker.percentile(self.hedge_percentile)
+        started = time.monotonic()
+
+        def timed_primary():
+            try:
+                return primary(fund_code)
+            finally:
+                tracker.record(time.monotonic() - started)
+
+        primary_future = self._hedge_executor.submit(timed_primary)
+        done, _ = wait({primary_future}, timeout=delay)
+        if done:
+            self.hedge_stats.record(hedged=False, backup_won=False)
+            return primary_future.result(), False
+
+        futures = {primary_future: False, self._hedge_executor.submit(backup, fund_code): True}
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                from_backup = futures.pop(future)
+                result = None if future.exception() else future.result()
+                if result:
+                    self.hedge_stats.record(hedged=True, backup_won=from_backup)
+                    return result, from_backup
+
+        self.hedge_stats.record(hedged=True, backup_won=False)
+        return None, False
 
     def get_fund_info_from_eastmoney(self, fund_code: str) -> Optional[Dict]:
         """从东方财富网获取基金基本信息"""
-        try:
-            url = f"http://fund.eastmoney.com/pingzhongdata/{fund_code}.js"
-            headers = {
-                "Referer": f"http://fund.eastmoney.com/{fund_code}.html",
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            }
-
-            response = self.session.get(url, headers=headers, timeout=10, verify=False)
-            response.encoding = 'utf-8'
-
-            name_match = re.search(r'var fS_name = "(.*?)"', response.text)
-            fund_name = name_match.group(1) if name_match else f"基金{fund_code}"
-
-            code_match = re.search(r'var fS_code = "(.*?)"', response.text)
-            fund_code_actual = code_match.group(1) if code_match else fund_code
-
-            fund_info = {
-                "fund_key": fund_code_actual,
-                "fund_name": fund_name
-            }
-
-            self.fund_cache[fund_code] = fund_info
-            return fund_info
+        if not self._admit_eastmoney(fund_code, "信息"):
+            return None
 
+        try:
+            with self._send(self._pingzhongdata_request(fund_code), stream=True) as response:
+                fund_info = parse_eastmoney_info_stream(
+                    fund_code, response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+                )
+            return self._on_eastmoney_info(fund_code, fund_info)
         except Exception as e:
-            logger.error(f"从东方财富网获取基金{fund_code}信息失败: {e}")
-            return None
+            return self._on_eastmoney_error(f"从东方财富网获取基金{fund_code}信息失败", e)
 
     def get_fund_info(self, fund_code: str) -> Optional[Dict]:
         """获取基金基本信息"""
-        if fund_code in self.fund_cache:
-            return self.fund_cache[fund_code]
-
-        if self.use_eastmoney:
-            return self.get_fund_info_from_eastmoney(fund_code)
+        fund_info = self._cached_fund_info(fund_code)
+        if fund_info:
+            return fund_info
 
-        try:
-            headers = {
-                "Accept-Language": "zh-CN,zh;q=0.9",
-                "Content-Type": "application/json",
-                "Origin": "https://www.fund123.cn",
-                "Referer": "https://www.fund123.cn/fund",
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-                "X-API-Key": "foobar",
-                "accept": "json"
-            }
-
-            url = f"{self.FUND123_BASE_URL}/api/fund/searchFund"
-            params = {"_csrf": self._csrf}
-            data = {"fundCode": fund_code}
-
-            response = self.session.post(
-                url,
-                headers=headers,
-                params=params,
-                json=data,
-                timeout=10,
-                verify=False
+        if self._should_hedge():
+            fund_info, _ = self._hedged(
+                "info", self.get_fund_info_from_fund123, self.get_fund_info_from_eastmoney, fund_code
             )
+            return fund_info
 
-            result = response.json()
-            if result.get("success"):
-                fund_info = {
-                    "fund_key": result["fundInfo"]["key"],
-                    "fund_name": result["fundInfo"]["fundName"]
-                }
-                self.fund_cache[fund_code] = fund_info
-                return fund_info
-            else:
-                logger.warning(f"从天天基金获取基金{fund_code}信息失败，尝试东方财富网")
-                return self.get_fund_info_from_eastmoney(fund_code)
+        return self.get_fund_info_from_fund123(fund_code)
 
+    def get_fund_info_from_fund123(self, fund_code: str) -> Optional[Dict]:
+        """从天天基金获取基金基本信息，失败时改用东方财富网"""
+        if not self._acquire_fund123():
+            return self.get_fund_info_from_eastmoney(fund_code)
+
+        try:
+            fund_info = self._on_search_result(fund_code, self._fetch_json(self._search_request(fund_code)))
         except Exception as e:
-            logger.warning(f"从天天基金获取基金{fund_code}信息异常，尝试东方财富网: {e}")
+            self._on_fund123_error(f"从天天基金获取基金{fund_code}信息异常，尝试东方财富网", e)
             return self.get_fund_info_from_eastmoney(fund_code)
 
+        return fund_info or self.get_fund_info_from_eastmoney(fund_code)
+
     def get_fund_detail_from_eastmoney(self, fund_code: str) -> Optional[Dict]:
         """从东方财富网获取基金详细数据"""
-        try:
-            url = "http://fundgz.1234567.com.cn/js/" + fund_code + ".js"
-            headers = {
-                "Referer": "http://fund.eastmoney.com/",
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            }
-
-            response = self.session.get(url, headers=headers, timeout=10, verify=False)
-            response.encoding = 'utf-8'
-
-            jsonp_match = re.search(r'jsonpgz((.*?));', response.text)
-            if jsonp_match:
-                data = json.loads(jsonp_match.group(1))
-
-                net_value = data.get("dwjz", "N/A")
-                net_value_date = data.get("jzrq", "N/A")
-                estimate_value = data.get("gsz", "N/A")
-                estimate_growth = data.get("gszzl", "N/A")
-                estimate_time = data.get("gztime", "N/A")
-
-                day_growth = "N/A"
-                try:
-                    if net_value != "N/A" and estimate_value != "N/A":
-                        nv = float(net_value)
-                        ev = float(estimate_value)
-                        day_growth = str(round((ev - nv) / nv * 100, 2))
-                except:
-                    pass
-
-                return {
-                    "net_value": net_value,
-                    "net_value_date": net_value_date,
-                    "day_of_growth": day_growth,
-                    "estimate_value": estimate_value,
-                    "estimate_growth": estimate_growth,
-                    "estimate_time": estimate_time
-                }
-            else:
-                logger.warning(f"无法解析基金{fund_code}的估值数据")
-                return None
+        if not self._admit_eastmoney(fund_code, "详情"):
+            return None
 
+        try:
+            text = self._fetch_text(self._fundgz_request(fund_code), encoding="utf-8")
+            return self._on_fundgz_script(fund_code, text)
+        except self.TRANSPORT_ERRORS as e:
+            return self._on_eastmoney_error(f"从东方财富网获取基金{fund_code}详情失败", e)
         except Exception as e:
             logger.error(f"从东方财富网获取基金{fund_code}详情失败: {e}")
             return None
 
     def get_fund_detail(self, fund_code: str, fund_key: str = None) -> Optional[Dict]:
-        """获取基金详细数据"""
-        if self.use_eastmoney:
+        """获取基金详细数据，启用对冲时天天基金响应过慢会同时请求东方财富网"""
+        if self._should_hedge():
+            detail, _ = self._hedged(
+                "detail", self.get_fund_detail_from_fund123, self.get_fund_detail_from_eastmoney, fund_code
+            )
+            return detail
+
+        return self.get_fund_detail_from_fund123(fund_code)
+
+    def get_fund_detail_from_fund123(self, fund_code: str) -> Optional[Dict]:
+        """从天天基金获取基金净值详情，失败时改用东方财富网"""
+        if not self._acquire_fund123(need_csrf=False):
             return self.get_fund_detail_from_eastmoney(fund_code)
 
         try:
-            headers = {
-                "Accept-Language": "zh-CN,zh;q=0.9",
-                "Content-Type": "application/json",
-                "Origin": "https://www.fund123.cn",
-                "Referer": f"https://www.fund123.cn/matiaria?fundCode={fund_code}",
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-                "X-API-Key": "foobar",
-                "accept": "json"
-            }
-
-            url = f"{self.FUND123_BASE_URL}/matiaria?fundCode={fund_code}"
-            response = self.session.get(url, headers=headers, timeout=10, verify=False)
-
-            day_of_growth_match = re.search(r'"dayOfGrowth":"(.*?)"', response.text)
-            day_of_growth = day_of_growth_match.group(1) if day_of_growth_match else "N/A"
-
-            net_value_match = re.search(r'"netValue":"(.*?)"', response.text)
-            net_value = net_value_match.group(1) if net_value_match else "N/A"
-
-            net_value_date_match = re.search(r'"netValueDate":"(.*?)"', response.text)
-            net_value_date = net_value_date_match.group(1) if net_value_date_match else "N/A"
-
-            return {
-                "day_of_growth": day_of_growth,
-                "net_value": net_value,
-                "net_value_date": net_value_date
-            }
-
+            return self._on_matiaria_page(self._fetch_text(self._matiaria_request(fund_code)))
         except Exception as e:
-            logger.warning(f"从天天基金获取基金{fund_code}详情失败，尝试东方财富网: {e}")
+            self._on_fund123_error(f"从天天基金获取基金{fund_code}详情失败，尝试东方财富网", e)
             return self.get_fund_detail_from_eastmoney(fund_code)
 
     def get_fund_estimate(self, fund_code: str, fund_key: str) -> Optional[Dict]:
-        """获取基金实时估值数据"""
-        if self.use_eastmoney:
+        """获取基金实时估值数据，当日估值点超过一页时逐页获取（见 FundEngineBase._on_estimate_page）"""
+        if not self._acquire_fund123():
             return None
 
         try:
-            headers = {
-                "Accept-Language": "zh-CN,zh;q=0.9",
-                "Content-Type": "application/json",
-                "Origin": "https://www.fund123.cn",
-                "Referer": f"https://www.fund123.cn/matiaria?fundCode={fund_code}",
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-                "X-API-Key": "foobar",
-                "accept": "json"
-            }
-
-            url = f"{self.FUND123_BASE_URL}/api/fund/queryFundEstimateIntraday"
-            params = {"_csrf": self._csrf}
-
-            today = datetime.datetime.now().strftime("%Y-%m-%d")
-            tomorrow = (datetime.datetime.now() + datetime.timedelta(days=1)).strftime("%Y-%m-%d")
-
-            data = {
-                "startTime": today,
-                "endTime": tomorrow,
-                "limit": 200,
-                "productId": fund_key,
-                "format": True,
-                "source": "WEALTHBFFWEB"
-            }
-
-            response = self.session.post(
-                url,
-                headers=headers,
-                params=params,
-                json=data,
-                timeout=10,
-                verify=False
-            )
-
-            result = response.json()
-            if result.get("success"):
-                estimate_list = result.get("list", [])
-                if estimate_list:
-                    latest = estimate_list[-1]
-                    estimate_time = datetime.datetime.fromtimestamp(
-                        latest["time"] / 1000
-                    ).strftime("%H:%M")
-
-                    forecast_growth = latest.get("forecastGrowth", 0)
-                    forecast_net_value = latest.get("forecastNetValue", 0)
-
-                    return {
-                        "estimate_time": estimate_time,
-                        "forecast_growth": round(float(forecast_growth) * 100, 2) if forecast_growth else 0,
-                        "forecast_net_value": round(float(forecast_net_value), 4) if forecast_net_value else 0
-                    }
-                else:
-                    return {
-                        "estimate_time": "N/A",
-                        "forecast_growth": 0,
-                        "forecast_net_value": 0,
-                        "is_qdii": True
-                    }
-            else:
-                logger.warning(f"获取基金{fund_code}估值失败: {result}")
-                return None
-
+            request = self._estimate_request(fund_code, fund_key)
+            while True:
+                estimate, request = self._on_estimate_page(fund_code, fund_key, request, self._fetch_json(request))
+                if request is None:
+                    return estimate
         except Exception as e:
-            logger.warning(f"获取基金{fund_code}估值异常: {e}")
-            return None
-
-    def get_single_fund_data(self, fund_code: str) -> Optional[Dict]:
-        """获取单个基金的完整数据"""
-        fund_info = self.get_fund_info(fund_code)
+            return self._on_estimate_error(fund_code, e)
+
+    def get_single_fund_data(
+        self,
+        fund_code: str,
+        fund_type: Optional[str] = None,
+        fund_name: Optional[str] = None
+    ) -> Optional[FundQuote]:
+        """
+        获取单个基金的完整数据
+
+        每次调用占用一个自适应并发名额，耗时与成败用于调整并发上限；参数见 _fetch_single_fund_data
+        """
+        with self.concurrency.slot() as slot:
+            quote = self._fetch_single_fund_data(fund_code, fund_type, fund_name)
+            slot.ok = quote is not None and not quote.is_failed
+        return quote
+
+    def _fetch_single_fund_data(
+        self,
+        fund_code: str,
+        fund_type: Optional[str] = None,
+        fund_name: Optional[str] = None
+    ) -> Optional[FundQuote]:
+        """
+        获取单个基金的完整数据（不占用并发名额）
+
+        fund_key 已缓存时不再请求基金信息；天天基金路径下详情与估值
+        只依赖 fund_key，两者并行请求，耗时取两者中较慢的一个；
+        当日净值已知或尚未到发布时间时直接复用缓存的详情，只请求估值
+
+        Args:
+            fund_code: 基金代码
+            fund_type: 分类文件中的基金类型，用于选择获取计划（见 fund_plan.py）
+            fund_name: 分类文件中的基金名称，计划不需要 fund_key 时可省去基金信息请求
+        """
+        plan = plan_for_type(fund_type)
+
+        fund_info = self._named_fund_info(fund_code, plan, fund_name) or self.get_fund_info(fund_code)
         if not fund_info:
             return None
 
-        if self.use_eastmoney:
+        via_eastmoney, fund123_down = self._eastmoney_route(fund_info, plan)
+        if via_eastmoney:
             detail = self.get_fund_detail_from_eastmoney(fund_code)
-            if not detail:
+            if detail:
+                return build_eastmoney_quote(fund_code, fund_info, detail)
+            if fund123_down:
                 return None
+            # 计划优先的东方财富网不可用时退回天天基金完整路径
+            return self._fetch_single_fund_data(fund_code)
+
+        fund_key = fund_info["fund_key"]
+        fund_detail, need_detail, need_estimate = self._fund123_steps(fund_code, plan)
+        fund_estimate = None
+        if need_detail and need_estimate:
+            estimate_future = self._pipeline_executor.submit(self.get_fund_estimate, fund_code, fund_key)
+            fund_detail = self.get_fund_detail(fund_code, fund_key)
+            fund_estimate = estimate_future.result()
+        elif need_detail:
+            fund_detail = self.get_fund_detail(fund_code, fund_key)
+        elif need_estimate:
+            fund_estimate = self.get_fund_estimate(fund_code, fund_key)
+
+        return self._fund123_quote(fund_code, fund_info, plan, fund_detail, fund_estimate, fetched=need_detail)
+
+    def _dispatch_loop(self):
+        """调度线程：逐只等待并发名额，取得后交给线程池执行"""
+        while True:
+            item = self._dispatch_queue.get()
+            if item is None:
+                return
+            slot = self.concurrency.acquire()
+            self.executor.submit(self._run_in_slot, slot, *item)
+
+    def _run_in_slot(self, slot, future: Future, fetch, args: tuple):
+        """在已占用的并发名额内执行 fetch(*args)，结果写入 future 后归还名额"""
+        if not future.set_running_or_notify_cancel():
+            self.concurrency.release(slot, record=False)
+            return
+        try:
+            quote = fetch(*args)
+            slot.ok = quote is not None and not quote.is_failed
+            future.set_result(quote)
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            self.concurrency.release(slot)
+
+    def _submit(self, fetch, *args) -> Future:
+        future = Future()
+        self._dispatch_queue.put((future, fetch, args))
+        return future
+
+    def submit_fund(
+        self,
+        fund_code: str,
+        fund_type: Optional[str] = None,
+        fund_name: Optional[str] = None
+    ) -> Future:
+        """提交单只基金到共享线程池，不等待完成；Future 的结果与 get_single_fund_data 相同"""
+        return self._submit(self._fetch_single_fund_data, fund_code, fund_type, fund_name)
+
+    def _fetch_or_failed(self, code: str) -> FundQuote:
+        """获取单只基金（不占用并发名额），失败或异常时返回占位记录"""
+        try:
+            data = self._fetch_single_fund_data(code)
+        except Exception as e:
+            logger.error(f"基金 {code} 估值失败: {e}")
+            return FundQuote.failed(code, str(e))
+        return data if data else FundQuote.failed(code, "无法获取基金数据")
 
-            is_qdii = "QDII" in fund_info["fund_name"].upper()
+    def get_multiple_funds_data(self, fund_codes: List[str]) -> List[FundQuote]:
+        """批量获取多个基金的数据（使用共享线程池，结果顺序与 fund_codes 一致）"""
+        futures = [self._submit(self._fetch_or_failed, code) for code in fund_codes]
+        return [future.result() for future in futures]
 
-            forecast_growth = 0
-            try:
-                estimate_growth = detail.get("estimate_growth", "0")
-                forecast_growth = float(estimate_growth) if estimate_growth != "N/A" else 0
-            except:
-                pass
+    def submit_funds(self, fund_codes: Iterable[str]) -> Dict[str, Future]:
+        """逐只提交到共享线程池，不等待完成；返回 基金代码 → Future（结果为 FundQuote）"""
+        return {code: self._submit(self._fetch_or_failed, code) for code in fund_codes}
 
-            forecast_net_value = 0
-            try:
-                estimate_value = detail.get("estimate_value", "0")
-                forecast_net_value = float(estimate_value) if estimate_value != "N/A" else 0
-            except:
-                pass
-
-            return {
-                "fund_code": fund_code,
-                "fund_name": fund_info["fund_name"],
-                "fund_key": fund_info["fund_key"],
-                "net_value": detail.get("net_value", "N/A"),
-                "net_value_date": detail.get("net_value_date", "N/A"),
-                "day_of_growth": detail.get("day_of_growth", "N/A"),
-                "estimate_time": detail.get("estimate_time", "N/A"),
-                "forecast_growth": forecast_growth,
-                "forecast_net_value": forecast_net_value,
-                "is_qdii": is_qdii,
-                "update_time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-
-        fund_detail = self.get_fund_detail(fund_code, fund_info["fund_key"])
-        if not fund_detail:
-            return None
 
-        fund_estimate = self.get_fund_estimate(fund_code, fund_info["fund_key"])
-        if not fund_estimate:
-            fund_estimate = {
-                "estimate_time": "N/A",
-                "forecast_growth": 0,
-                "forecast_net_value": 0
-            }
-
-        is_qdii = "QDII" in fund_info["fund_name"].upper() or fund_estimate.get("is_qdii", False)
-
-        return {
-            "fund_code": fund_code,
-            "fund_name": fund_info["fund_name"],
-            "fund_key": fund_info["fund_key"],
-            "net_value": fund_detail["net_value"],
-            "net_value_date": fund_detail["net_value_date"],
-            "day_of_growth": fund_detail["day_of_growth"],
-            "estimate_time": fund_estimate["estimate_time"],
-            "forecast_growth": fund_estimate["forecast_growth"],
-            "forecast_net_value": fund_estimate["forecast_net_value"],
-            "is_qdii": is_qdii,
-            "update_time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-
-    def get_multiple_funds_data(self, fund_codes: List[str]) -> List[Dict]:
-        """批量获取多个基金的数据（使用多线程）"""
-        results = []
-        result_lock = threading.Lock()
-
-        def fetch_fund_data(code: str):
-            data = self.get_single_fund_data(code)
-            with result_lock:
-                if data:
-                    results.append(data)
-                else:
-                    results.append({
-                        "fund_code": code,
-                        "fund_name": "获取失败",
-                        "net_value": "N/A",
-                        "day_of_growth": "N/A",
-                        "estimate_time": "N/A",
-                        "forecast_growth": 0,
-                        "forecast_net_value": 0,
-                        "is_qdii": False,
-                        "update_time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    })
-
-        max_workers = min(4, len(fund_codes))
-        threads = []
+def format_fund_data(quote: FundQuote) -> str:
+    """格式化单个基金估值记录为字符串"""
+    growth_str = format_float(quote.forecast_growth, 2)
+    if not math.isnan(quote.forecast_growth):
+        growth_str = f"{quote.forecast_growth:+.2f}%"
 
-        for code in fund_codes:
-            t = threading.Thread(target=fetch_fund_data, args=(code,))
-            threads.append(t)
-            t.start()
+    day_growth_str = format_float(quote.day_of_growth, 2)
+    if not math.isnan(quote.day_of_growth):
+        day_growth_str = f"{quote.day_of_growth:+.2f}%"
 
-            while len([t for t in threads if t.is_alive()]) >= max_workers:
-                time.sleep(0.1)
+    qdii_mark = " [QDII]" if quote.is_qdii else ""
+    stale_mark = f" [沿用 {int(quote.age)} 秒前数据]" if quote.is_stale else ""
 
-        for t in threads:
-            t.join()
+    return (
+        f"[{quote.fund_code}] {quote.fund_name}{qdii_mark}{stale_mark}\n"
+        f"  净值: {format_float(quote.net_value, 4)} ({quote.net_value_date})\n"
+        f"  日涨幅: {day_growth_str}\n"
+        f"  估值: {format_float(quote.forecast_net_value, 4)} ({quote.estimate_time})\n"
+        f"  估值涨幅: {growth_str}\n"
+    )
 
-        code_order = {code: i for i, code in enumerate(fund_codes)}
-        results.sort(key=lambda x: code_order.get(x.get("fund_code", ""), 999))
 
-        return results
+class ReportStats:
+    """估值报告统计累加器（单次遍历，涨跌幅排行使用定长堆）"""
+
+    def __init__(self, top_n: int = 5):
+        self.top_n = top_n
+        self.total_count = 0
+        self.qdii_count = 0
+        self.valid_estimate_count = 0
+        self.failed_count = 0
+        self.stale_count = 0
+        self.growth_count = 0
+        self.growth_sum = 0.0
+        self.rise_count = 0
+        self.fall_count = 0
+        self.flat_count = 0
+        self.failed_funds = []
+        self._top = []
+        self._bottom = []
+
+    def add(self, quote: FundQuote):
+        """累加一只基金的估值记录"""
+        seq = self.total_count
+        self.total_count += 1
+
+        if quote.is_qdii:
+            self.qdii_count += 1
+        if quote.estimate_time != "N/A":
+            self.valid_estimate_count += 1
+        if quote.is_stale:
+            self.stale_count += 1
+        if quote.is_failed:
+            self.failed_count += 1
+            self.failed_funds.append((quote.fund_code, quote.error or "未知错误"))
+            return
+
+        # 无估值（如无盘中估值的 QDII）按 0 计入平盘，与以往报告的统计口径一致
+        growth = quote.forecast_growth
+        if math.isnan(growth):
+            growth = 0.0
+
+        self.growth_count += 1
+        self.growth_sum += growth
+        if growth > 0:
+            self.rise_count += 1
+        elif growth < 0:
+            self.fall_count += 1
+        else:
+            self.flat_count += 1
+
+        # 涨幅相同时保持原始顺序：前 N 名保留先出现的，后 N 名保留后出现的
+        entry = (quote.fund_code, quote.fund_name, growth)
+        top_item = ((growth, -seq), entry)
+        bottom_item = ((-growth, seq), entry)
+        if len(self._top) < self.top_n:
+            heapq.heappush(self._top, top_item)
+            heapq.heappush(self._bottom, bottom_item)
+        else:
+            heapq.heappushpop(self._top, top_item)
+            heapq.heappushpop(self._bottom, bottom_item)
+
+    @property
+    def success_count(self) -> int:
+        return self.total_count - self.failed_count
+
+    @property
+    def avg_growth(self) -> float:
+        return self.growth_sum / self.growth_count if self.growth_count else 0
+
+    def top(self) -> List[tuple]:
+        """涨幅前 N 名 (基金代码, 基金名称, 估值涨幅)，按涨幅从高到低"""
+        return [entry for _, entry in sorted(self._top, reverse=True)]
+
+    def bottom(self) -> List[tuple]:
+        """涨幅后 N 名 (基金代码, 基金名称, 估值涨幅)，按涨幅从高到低"""
+        return [entry for _, entry in sorted(self._bottom)]
+
+
+def write_report(
+    funds_data: Iterable[FundQuote],
+    fp: TextIO,
+    title: str = "场外基金实时估值"
+) -> ReportStats:
+    """
+    流式生成估值报告并写入文件对象
+
+    只遍历一次 funds_data（可以是生成器）：基金详情先写入临时缓冲区（超过阈值自动落盘），
+    统计完成后再依次写出报告头、统计信息和详情
+
+    Returns:
+        本次报告的统计结果
+    """
+    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    stats = ReportStats()
 
+    with tempfile.SpooledTemporaryFile(max_size=4 * 1024 * 1024, mode="w+", encoding="utf-8") as details:
+        for i, fund in enumerate(funds_data, 1):
+            stats.add(fund)
+            details.write(f"\n[{i}] {format_fund_data(fund)}\n")
 
-def format_fund_data(fund_data: Dict) -> str:
-    """格式化单个基金数据为字符串"""
-    code = fund_data.get("fund_code", "N/A")
-    name = fund_data.get("fund_name", "N/A")
-    net_value = fund_data.get("net_value", "N/A")
-    net_value_date = fund_data.get("net_value_date", "N/A")
-    day_growth = fund_data.get("day_of_growth", "N/A")
-    estimate_time = fund_data.get("estimate_time", "N/A")
-    forecast_growth = fund_data.get("forecast_growth", 0)
-    forecast_net_value = fund_data.get("forecast_net_value", 0)
-    is_qdii = fund_data.get("is_qdii", False)
+        fp.write("=" * 70 + "\n")
+        fp.write(f"  {title}\n")
+        fp.write(f"  更新时间: {now}\n")
+        fp.write("=" * 70 + "\n")
+        fp.write("\n")
 
-    if isinstance(forecast_growth, (int, float)):
-        growth_str = f"{forecast_growth:+.2f}%"
-    else:
-        growth_str = str(forecast_growth)
+        if not stats.total_count:
+            fp.write("暂无基金数据")
+            return stats
 
-    if isinstance(day_growth, (int, float)):
-        day_growth_str = f"{day_growth:+.2f}%"
-    else:
-        # 尝试转换为浮点数并保留两位小数
-        try:
-            day_growth_float = float(day_growth)
-            day_growth_str = f"{day_growth_float:+.2f}%"
-        except (ValueError, TypeError):
-            day_growth_str = str(day_growth)
+        fp.write(f"【统计信息】\n")
+        fp.write(f"  基金总数: {stats.total_count}\n")
+        fp.write(f"  QDII基金: {stats.qdii_count}\n")
+        fp.write(f"  有效估值: {stats.valid_estimate_count}\n")
+        fp.write(f"  获取失败: {stats.failed_count}\n")
+        if stats.stale_count:
+            fp.write(f"  沿用旧值: {stats.stale_count}\n")
+        fp.write(f"  平均估值涨幅: {stats.avg_growth:+.2f}%\n")
+        fp.write("\n")
 
-    qdii_mark = " [QDII]" if is_qdii else ""
+        fp.write(f"【涨跌分布】\n")
+        fp.write(f"  上涨: {stats.rise_count}  下跌: {stats.fall_count}  持平: {stats.flat_count}\n")
+        fp.write("\n")
 
-    return (
-        f"[{code}] {name}{qdii_mark}\n"
-        f"  净值: {net_value} ({net_value_date})\n"
-        f"  日涨幅: {day_growth_str}\n"
-        f"  估值: {forecast_net_value} ({estimate_time})\n"
-        f"  估值涨幅: {growth_str}\n"
-    )
+        fp.write("【基金详情】\n")
+        fp.write("-" * 70 + "\n")
 
+        details.seek(0)
+        shutil.copyfileobj(details, fp)
 
-def generate_report(funds_data: List[Dict], title: str = "场外基金实时估值") -> str:
-    """生成完整的估值报告"""
-    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    fp.write("\n")
+    fp.write("=" * 70 + "\n")
+    fp.write("数据来源: 东方财富网/天天基金网\n")
+    fp.write("=" * 70)
 
-    lines = []
-    lines.append("=" * 70)
-    lines.append(f"  {title}")
-    lines.append(f"  更新时间: {now}")
-    lines.append("=" * 70)
-    lines.append("")
-
-    if not funds_data:
-        lines.append("暂无基金数据")
-        return "\n".join(lines)
-
-    total_count = len(funds_data)
-    qdii_count = sum(1 for f in funds_data if f.get("is_qdii", False))
-    valid_estimate_count = sum(1 for f in funds_data if f.get("estimate_time") != "N/A")
-    failed_count = sum(1 for f in funds_data if f.get("fund_name") == "获取失败")
-
-    valid_growths = [f.get("forecast_growth", 0) for f in funds_data 
-                     if isinstance(f.get("forecast_growth"), (int, float)) and f.get("fund_name") != "获取失败"]
-    avg_growth = sum(valid_growths) / len(valid_growths) if valid_growths else 0
-
-    lines.append(f"【统计信息】")
-    lines.append(f"  基金总数: {total_count}")
-    lines.append(f"  QDII基金: {qdii_count}")
-    lines.append(f"  有效估值: {valid_estimate_count}")
-    lines.append(f"  获取失败: {failed_count}")
-    lines.append(f"  平均估值涨幅: {avg_growth:+.2f}%")
-    lines.append("")
-
-    rise_count = sum(1 for g in valid_growths if g > 0)
-    fall_count = sum(1 for g in valid_growths if g < 0)
-    flat_count = sum(1 for g in valid_growths if g == 0)
-
-    lines.append(f"【涨跌分布】")
-    lines.append(f"  上涨: {rise_count}  下跌: {fall_count}  持平: {flat_count}")
-    lines.append("")
-
-    lines.append("【基金详情】")
-    lines.append("-" * 70)
-
-    for i, fund in enumerate(funds_data, 1):
-        lines.append(f"\n[{i}] {format_fund_data(fund)}")
-
-    lines.append("")
-    lines.append("=" * 70)
-    lines.append("数据来源: 东方财富网/天天基金网")
-    lines.append("=" * 70)
-
-    return "\n".join(lines)
+    return stats
+
+
+def generate_report(funds_data: Iterable[FundQuote], title: str = "场外基金实时估值") -> str:
+    """生成完整的估值报告"""
+    buffer = io.StringIO()
+    write_report(funds_data, buffer, title)
+    return buffer.getvalue()
 
 
 def read_fund_codes_from_file(file_path: str) -> List[str]:
@@ -0,0 +1,529 @@
+# -*- coding: UTF-8 -*-
+"""
+场外基金异步估值模块 v1.0
+基于 asyncio + aiohttp 的批量估值引擎，单进程单事件循环即可保持数百个基金请求同时在途
+数据源与 fund_valuation.FundValuation 一致: 天天基金网(主) + 东方财富网(备用)
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+from loguru import logger
+
+from fund_cache import DEFAULT_CACHE_DIR
+from fund_calendar import MarketCalendar
+from fund_concurrency import INITIAL_CONCURRENCY, AdaptiveConcurrency
+from fund_engine import FundEngineBase, FundRequest, build_eastmoney_quote
+from fund_http import COMMON_HEADERS, PREWARM_URLS, ConnectionStats
+from fund_parser import STREAM_CHUNK_SIZE, EastmoneyInfoScanner
+from fund_plan import plan_for_type
+from fund_quote import FundQuote
+from fund_ratelimit import (
+    DEFAULT_RATE_LIMIT,
+    is_server_error,
+    is_throttle_response,
+    parse_retry_after,
+)
+
+
+class AsyncFundValuation(FundEngineBase):
+    """场外基金异步估值获取类（asyncio + aiohttp），请求构造、响应处理与获取计划见 fund_engine.FundEngineBase"""
+
+    # 计入东方财富网熔断的传输错误，解析失败只记录日志
+    TRANSPORT_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+    def __init__(
+        self,
+        max_concurrency: int = 200,
+        timeout: int = 10,
+        cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+        hedge_percentile: Optional[float] = None,
+        rate_limit: float = DEFAULT_RATE_LIMIT,
+        adaptive: bool = True,
+        calendar: Optional[MarketCalendar] = None
+    ):
+        """
+        初始化异步估值引擎
+
+        Args:
+            max_concurrency: 同时在途的基金数量上限（自适应并发的上限）
+            timeout: 单个请求超时时间（秒）
+            cache_dir: 基金元数据持久化缓存目录，None 表示不使用持久化缓存
+            hedge_percentile: 启用对冲请求时的耗时分位（如 95），None 表示不对冲
+            rate_limit: 每个主机的速率上限（次/秒），实际速率自动探测，遇到限流自动降速；0 表示不限速
+            adaptive: 是否按上游延迟与失败率自适应调整并发（AIMD），False 时固定为 max_concurrency
+            calendar: 交易日历（判断净值是否可能已更新），None 表示只按工作日判断交易日
+        """
+        super().__init__(cache_dir, hedge_percentile, rate_limit, calendar)
+        self.max_concurrency = max_concurrency
+        self.concurrency = AdaptiveConcurrency(max_concurrency, initial=INITIAL_CONCURRENCY, adaptive=adaptive)
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.session: Optional[aiohttp.ClientSession] = None
+        # 进行中的令牌刷新，同时作废令牌的请求合并为一次刷新
+        self._csrf_refresh: Optional[asyncio.Task] = None
+        self._session_initialized = False
+        # 对冲中落败但仍在执行的请求，保留引用直到完成
+        self._background_tasks = set()
+        self.connection_stats = ConnectionStats()
+        # 同步入口使用的常驻事件循环，HTTP 会话与连接在多次批量调用间保持
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        """创建HTTP会话、预连接各主机并获取CSRF令牌"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency,
+                keepalive_timeout=90,
+                ttl_dns_cache=300,
+                ssl=False
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers=COMMON_HEADERS,
+                trace_configs=[self._trace_config()]
+            )
+            await self._prewarm()
+
+        if not self._session_initialized:
+            await self.init_session()
+            self._session_initialized = True
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        """统计每个请求使用的是新建连接还是复用连接"""
+        stats = self.connection_stats
+
+        async def on_request_start(session, ctx, params):
+            ctx.host = f"{params.url.scheme}://{params.url.host}"
+
+        async def on_connection_create_end(session, ctx, params):
+            stats.record(ctx.host, reused=False)
+
+        async def on_connection_reuseconn(session, ctx, params):
+            stats.record(ctx.host, reused=True)
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+    async def _prewarm(self):
+        """预先建立到各主机的连接，失败只记录日志"""
+        async def warm(url: str):
+            try:
+                async with self.session.head(url, allow_redirects=False):
+                    pass
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.debug(f"预连接 {url} 失败: {e}")
+
+        await asyncio.gather(*(warm(url) for url in PREWARM_URLS))
+
+    @asynccontextmanager
+    async def _send(self, request: FundRequest):
+        """
+        发出请求（async with 用法与 session.request 相同）
+
+        请求前先获取所属主机的令牌：令牌等待不能放在 TraceConfig 回调里，否则会计入请求总超时；
+        429/503 以外的 5xx 响应抛出 aiohttp.ClientResponseError，由调用方计入数据源熔断
+        """
+        url = request.url
+        if self.rate_limiter:
+            await self.rate_limiter.acquire_async(url)
+        try:
+            async with self.session.request(
+                request.method, url, headers=request.headers, params=request.params, json=request.json
+            ) as response:
+                if is_server_error(response.status):
+                    raise aiohttp.ClientResponseError(
+                        response.request_info,
+                        response.history,
+                        status=response.status,
+                        message="服务器错误",
+                        headers=response.headers
+                    )
+                if self.rate_limiter:
+                    if is_throttle_response(
+                        response.status,
+                        response.headers.get("Content-Type", ""),
+                        request.expect_html
+                    ):
+                        self.rate_limiter.record_throttle(url, parse_retry_after(response.headers.get("Retry-After")))
+                    else:
+                        self.rate_limiter.record_success(url)
+                yield response
+        except asyncio.TimeoutError:
+            if self.rate_limiter:
+                self.rate_limiter.record_throttle(url)
+            raise
+
+    async def _fetch_text(self, request: FundRequest, encoding: Optional[str] = None) -> str:
+        async with self._send(request) as response:
+            return await response.text(encoding=encoding)
+
+    async def _fetch_json(self, request: FundRequest) -> Dict:
+        async with self._send(request) as response:
+            return await response.json(content_type=None)
+
+    def pool_stats(self) -> Dict[str, Dict[str, int]]:
+        """各主机新建/复用连接的次数"""
+        return self.connection_stats.snapshot()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """启动（或返回已启动的）后台常驻事件循环"""
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._loop_thread = threading.Thread(
+                target=self._loop.run_forever,
+                name="fund-async-loop",
+                daemon=True
+            )
+            self._loop_thread.start()
+        return self._loop
+
+    def submit(self, coro) -> Future:
+        """
+        在常驻事件循环中执行协程（同步代码调用），会话在首次调用时打开并保持到 shutdown
+
+        Returns:
+            concurrent.futures.Future
+        """
+        async def with_session():
+            await self.open()
+            return await coro
+
+        return asyncio.run_coroutine_threadsafe(with_session(), self._ensure_loop())
+
+    def shutdown(self):
+        """关闭会话并停止常驻事件循环"""
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join()
+        self._loop.close()
+        self._loop = None
+        self._loop_thread = None
+
+    async def close(self):
+        """关闭HTTP会话"""
+        for task in list(self._background_tasks):
+            task.cancel()
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def init_session(self) -> bool:
+        """初始化会话，获取CSRF令牌，返回是否成功"""
+        try:
+            return self._on_csrf_page(await self._fetch_text(self._csrf_page_request()))
+        except Exception as e:
+            return self._on_csrf_error(e)
+
+    async def _acquire_fund123(self, need_csrf: bool = True) -> bool:
+        """
+        请求天天基金前调用，熔断器放行且会话可用时返回 True（见 FundEngineBase._admit_fund123）
+
+        令牌被作废（见 _invalidate_csrf）后同时等待的请求共用一次刷新
+        """
+        admitted, refresh = self._admit_fund123(need_csrf)
+        if not refresh:
+            return admitted
+
+        task = self._csrf_refresh
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            task = self._csrf_refresh = asyncio.ensure_future(self.init_session())
+        return await asyncio.shield(task)
+
+    async def _hedged(self, kind: str, primary, backup, fund_code: str) -> Tuple[Optional[Dict], bool]:
+        """
+        对冲请求：主请求在最近耗时的 hedge_percentile 分位内未返回时发出备用请求，取先返回的有效结果
+
+        落败的请求继续在后台执行（主请求完成后仍会写入缓存）
+
+        Returns:
+            (结果, 是否来自备用请求)
+        """
+        tracker = self._latency[kind]
+        delay = tracker.percentile(self.hedge_percentile)
+        started = time.monotonic()
+
+        async def timed_primary():
+            try:
+                return await primary(fund_code)
+            finally:
+                tracker.record(time.monotonic() - started)
+
+        primary_task = asyncio.ensure_future(timed_primary())
+        done, _ = await asyncio.wait({primary_task}, timeout=delay)
+        if done:
+            self.hedge_stats.record(hedged=False, backup_won=False)
+            return primary_task.result(), False
+
+        tasks = {primary_task: False, asyncio.ensure_future(backup(fund_code)): True}
+        while tasks:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                from_backup = tasks.pop(task)
+                result = None if task.cancelled() or task.exception() else task.result()
+                if result:
+                    for loser in tasks:
+                        self._background_tasks.add(loser)
+                        loser.add_done_callback(self._background_tasks.discard)
+                    self.hedge_stats.record(hedged=True, backup_won=from_backup)
+                    return result, from_backup
+
+        self.hedge_stats.record(hedged=True, backup_won=False)
+        return None, False
+
+    async def get_fund_info_from_eastmoney(self, fund_code: str) -> Optional[Dict]:
+        """从东方财富网获取基金基本信息"""
+        if not self._admit_eastmoney(fund_code, "信息"):
+            return None
+
+        try:
+            scanner = EastmoneyInfoScanner(fund_code)
+            async with self._send(self._pingzhongdata_request(fund_code)) as response:
+                async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                    if scanner.feed(chunk):
+                        response.close()
+                        break
+            return self._on_eastmoney_info(fund_code, scanner.result())
+        except Exception as e:
+            return self._on_eastmoney_error(f"从东方财富网获取基金{fund_code}信息失败", e)
+
+    async def get_fund_info(self, fund_code: str) -> Optional[Dict]:
+        """获取基金基本信息"""
+        fund_info = self._cached_fund_info(fund_code)
+        if fund_info:
+            return fund_info
+
+        if self._should_hedge():
+            fund_info, _ = await self._hedged(
+                "info", self.get_fund_info_from_fund123, self.get_fund_info_from_eastmoney, fund_code
+            )
+            return fund_info
+
+        return await self.get_fund_info_from_fund123(fund_code)
+
+    async def get_fund_info_from_fund123(self, fund_code: str) -> Optional[Dict]:
+        """从天天基金获取基金基本信息，失败时改用东方财富网"""
+        if not await self._acquire_fund123():
+            return await self.get_fund_info_from_eastmoney(fund_code)
+
+        try:
+            fund_info = self._on_search_result(fund_code, await self._fetch_json(self._search_request(fund_code)))
+        except Exception as e:
+            self._on_fund123_error(f"从天天基金获取基金{fund_code}信息异常，尝试东方财富网", e)
+            return await self.get_fund_info_from_eastmoney(fund_code)
+
+        return fund_info or await self.get_fund_info_from_eastmoney(fund_code)
+
+    async def get_fund_detail_from_eastmoney(self, fund_code: str) -> Optional[Dict]:
+        """从东方财富网获取基金详细数据"""
+        if not self._admit_eastmoney(fund_code, "详情"):
+            return None
+
+        try:
+            text = await self._fetch_text(self._fundgz_request(fund_code), encoding="utf-8")
+            return self._on_fundgz_script(fund_code, text)
+        except self.TRANSPORT_ERRORS as e:
+            return self._on_eastmoney_error(f"从东方财富网获取基金{fund_code}详情失败", e)
+        except Exception as e:
+            logger.error(f"从东方财富网获取基金{fund_code}详情失败: {e}")
+            return None
+
+    async def get_fund_detail(self, fund_code: str, fund_key: str = None) -> Optional[Dict]:
+        """获取基金详细数据，启用对冲时天天基金响应过慢会同时请求东方财富网"""
+        if self._should_hedge():
+            detail, _ = await self._hedged(
+                "detail", self.get_fund_detail_from_fund123, self.get_fund_detail_from_eastmoney, fund_code
+            )
+            return detail
+
+        return await self.get_fund_detail_from_fund123(fund_code)
+
+    async def get_fund_detail_from_fund123(self, fund_code: str) -> Optional[Dict]:
+        """从天天基金获取基金净值详情，失败时改用东方财富网"""
+        if not await self._acquire_fund123(need_csrf=False):
+            return await self.get_fund_detail_from_eastmoney(fund_code)
+
+        try:
+            return self._on_matiaria_page(await self._fetch_text(self._matiaria_request(fund_code)))
+        except Exception as e:
+            self._on_fund123_error(f"从天天基金获取基金{fund_code}详情失败，尝试东方财富网", e)
+            return await self.get_fund_detail_from_eastmoney(fund_code)
+
+    async def get_fund_estimate(self, fund_code: str, fund_key: str) -> Optional[Dict]:
+        """获取基金实时估值数据，当日估值点超过一页时逐页获取（见 FundEngineBase._on_estimate_page）"""
+        if not await self._acquire_fund123():
+            return None
+
+        try:
+            request = self._estimate_request(fund_code, fund_key)
+            while True:
+                estimate, request = self._on_estimate_page(fund_code, fund_key, request, await self._fetch_json(request))
+                if request is None:
+                    return estimate
+        except Exception as e:
+            return self._on_estimate_error(fund_code, e)
+
+    async def get_single_fund_data(
+        self,
+        fund_code: str,
+        fund_type: Optional[str] = None,
+        fund_name: Optional[str] = None
+    ) -> Optional[FundQuote]:
+        """
+        获取单个基金的完整数据
+
+        每次调用占用一个自适应并发名额，耗时与成败用于调整并发上限；参数见 _fetch_single_fund_data
+        """
+        async with self.concurrency.async_slot() as slot:
+            quote = await self._fetch_single_fund_data(fund_code, fund_type, fund_name)
+            slot.ok = quote is not None and not quote.is_failed
+        return quote
+
+    async def _fetch_single_fund_data(
+        self,
+        fund_code: str,
+        fund_type: Optional[str] = None,
+        fund_name: Optional[str] = None
+    ) -> Optional[FundQuote]:
+        """
+        获取单个基金的完整数据（不占用并发名额）
+
+        fund_key 已缓存时不再请求基金信息；天天基金路径下详情与估值并发请求，
+        当日净值已知或尚未到发布时间时直接复用缓存的详情，只请求估值；
+        fund_type / fund_name 的含义与 FundValuation.get_single_fund_data 相同
+        """
+        plan = plan_for_type(fund_type)
+
+        fund_info = self._named_fund_info(fund_code, plan, fund_name) or await self.get_fund_info(fund_code)
+        if not fund_info:
+            return None
+
+        via_eastmoney, fund123_down = self._eastmoney_route(fund_info, plan)
+        if via_eastmoney:
+            detail = await self.get_fund_detail_from_eastmoney(fund_code)
+            if detail:
+                return build_eastmoney_quote(fund_code, fund_info, detail)
+            if fund123_down:
+                return None
+            # 计划优先的东方财富网不可用时退回天天基金完整路径
+            return await self._fetch_single_fund_data(fund_code)
+
+        fund_key = fund_info["fund_key"]
+        fund_detail, need_detail, need_estimate = self._fund123_steps(fund_code, plan)
+        fund_estimate = None
+        if need_detail and need_estimate:
+            fund_detail, fund_estimate = await asyncio.gather(
+                self.get_fund_detail(fund_code, fund_key),
+                self.get_fund_estimate(fund_code, fund_key)
+            )
+        elif need_detail:
+            fund_detail = await self.get_fund_detail(fund_code, fund_key)
+        elif need_estimate:
+            fund_estimate = await self.get_fund_estimate(fund_code, fund_key)
+
+        return self._fund123_quote(fund_code, fund_info, plan, fund_detail, fund_estimate, fetched=need_detail)
+
+    async def get_many(self, fund_codes: List[str]) -> List[FundQuote]:
+        """
+        批量异步获取多个基金的数据
+
+        Args:
+            fund_codes: 基金代码列表
+
+        Returns:
+            与 fund_codes 顺序一致的基金数据列表，失败的基金以占位数据填充
+        """
+        own_session = self.session is None or self.session.closed
+        await self.open()
+
+        try:
+            return await asyncio.gather(*(self._fetch_or_failed(code) for code in fund_codes))
+        finally:
+            if own_session:
+                await self.close()
+
+    async def iter_many(
+        self,
+        fund_codes: List[str],
+        categories: Optional[List[Dict]] = None
+    ) -> AsyncIterator[Tuple[int, FundQuote]]:
+        """
+        批量异步获取多个基金的数据，按完成顺序逐个产出
+
+        Args:
+            fund_codes: 基金代码列表
+            categories: 与 fund_codes 一一对应的分类记录（含 fund_type / fund_name），用于选择获取计划
+
+        Yields:
+            (基金在 fund_codes 中的序号, 基金数据)，失败的基金以占位数据填充
+        """
+        own_session = self.session is None or self.session.closed
+        await self.open()
+
+        async def fetch_fund_data(index: int, code: str) -> Tuple[int, FundQuote]:
+            category = categories[index] if categories else {}
+            try:
+                data = await self.get_single_fund_data(
+                    code, category.get("fund_type"), category.get("fund_name")
+                )
+            except Exception as e:
+                logger.error(f"基金 {code} 估值失败: {e}")
+                return index, FundQuote.failed(code, str(e))
+            return index, data if data else FundQuote.failed(code, "无法获取基金数据")
+
+        try:
+            tasks = [fetch_fund_data(i, code) for i, code in enumerate(fund_codes)]
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            if own_session:
+                await self.close()
+
+    async def _fetch_or_failed(self, code: str) -> FundQuote:
+        """获取单只基金，失败或异常时返回占位记录"""
+        try:
+            data = await self.get_single_fund_data(code)
+        except Exception as e:
+            logger.error(f"基金 {code} 估值失败: {e}")
+            return FundQuote.failed(code, str(e))
+        return data if data else FundQuote.failed(code, "无法获取基金数据")
+
+    def get_multiple_funds_data(self, fund_codes: List[str]) -> List[FundQuote]:
+        """批量获取多个基金的数据（同步入口，与 FundValuation 接口一致，连接在多次调用间复用）"""
+        return self.submit(self.get_many(fund_codes)).result()
+
+    def submit_fund(
+        self,
+        fund_code: str,
+        fund_type: Optional[str] = None,
+        fund_name: Optional[str] = None
+    ) -> Future:
+        """提交单只基金到常驻事件循环，不等待完成（同步入口，与 FundValuation.submit_fund 一致）"""
+        return self.submit(self.get_single_fund_data(fund_code, fund_type, fund_name))
+
+    def submit_funds(self, fund_codes: Iterable[str]) -> Dict[str, Future]:
+        """逐只提交到常驻事件循环，不等待完成（同步入口，与 FundValuation.submit_funds 一致）"""
+        loop = self._ensure_loop()
+        asyncio.run_coroutine_threadsafe(self.open(), loop).result()
+        return {
+            code: asyncio.run_coroutine_threadsafe(self._fetch_or_failed(code), loop)
+            for code in fund_codes
+        }
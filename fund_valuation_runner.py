@@ -2,30 +2,39 @@
 """
 基金估值执行模块 v1.0
 第二步：根据 category.txt 并行执行获取基金的实时估值
-输入：category.txt
+输入：category.txt（或 fund_category.py 转换得到的索引格式分类文件）
 输出：outputs/ 文件夹中的估值结果和分析报告
 """
 
 import argparse
 import json
 import os
+import shutil
 import sys
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, wait
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 from loguru import logger
 
-from fund_valuation import FundValuation, generate_report
+from fund_cache import DEFAULT_CACHE_DIR
+from fund_calendar import MarketCalendar, MarketScheduler, sleep_until
+from fund_category import CategoryStore, is_category_db, iter_category_text
+from fund_concurrency import ADAPTIVE_MAX_WORKERS, DEFAULT_MAX_WORKERS, default_max_workers
+from fund_http import format_pool_stats
+from fund_plan import plan_for_type
+from fund_quote import FundQuote, format_float
+from fund_ratelimit import DEFAULT_INITIAL_RATE, DEFAULT_RATE_LIMIT
+from fund_valuation import FundValuation, ReportStats, write_report
 
 
 class CategoryParser:
-    """分类文件解析器"""
+    """分类文件解析器（支持文本格式与 SQLite 索引格式）"""
 
     @staticmethod
     def parse(category_file: str) -> List[Dict]:
-        """解析 category.txt 文件"""
+        """解析 category.txt 文件，返回全部基金列表"""
         funds = []
 
         if not os.path.exists(category_file):
@@ -33,20 +42,11 @@ class CategoryParser:
             return funds
 
         try:
-            with open(category_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if not line or line.startswith('#'):
-                        continue
-
-                    parts = line.split('|')
-                    if parts[0] == 'FUND' and len(parts) >= 5:
-                        funds.append({
-                            'fund_code': parts[1],
-                            'fund_name': parts[2],
-                            'fund_type': parts[3],
-                            'status': parts[4]
-                        })
+            if is_category_db(category_file):
+                with CategoryStore(category_file) as store:
+                    funds = list(store)
+            else:
+                funds = list(iter_category_text(category_file))
 
             logger.info(f"从分类文件解析了 {len(funds)} 只基金")
             return funds
@@ -55,6 +55,72 @@ class CategoryParser:
             logger.error(f"解析分类文件失败: {e}")
             return []
 
+    @staticmethod
+    def load(category_file: str) -> Union[List[Dict], CategoryStore]:
+        """
+        加载分类文件；索引格式直接返回 CategoryStore，按需惰性遍历而不整体读入内存
+
+        Returns:
+            支持 len() 与迭代的基金集合
+        """
+        if not is_category_db(category_file):
+            return CategoryParser.parse(category_file)
+
+        try:
+            store = CategoryStore(category_file)
+            logger.info(f"已打开索引分类文件: {category_file} ({len(store)} 只基金)")
+            return store
+        except Exception as e:
+            logger.error(f"打开索引分类文件失败: {e}")
+            return []
+
+
+CSV_HEADER = '基金代码,基金名称,净值,日涨幅,估值,估值涨幅,更新时间'
+
+
+def format_csv_row(quote: FundQuote) -> str:
+    """格式化单只基金的CSV行"""
+    growth = format_float(quote.forecast_growth, 2)
+    if growth != "N/A":
+        growth += "%"
+    return (
+        f"{quote.fund_code},{quote.fund_name},{format_float(quote.net_value, 4)},"
+        f"{format_float(quote.day_of_growth, 2)},{format_float(quote.forecast_net_value, 4)},"
+        f"{growth},{quote.update_time}"
+    )
+
+
+class StreamingResultWriter:
+    """流式结果写入器，逐条追加写入 JSONL 与 CSV 文件"""
+
+    def __init__(self, output_dir: str, timestamp: str):
+        self.jsonl_file = os.path.join(output_dir, f"fund_valuation_{timestamp}.jsonl")
+        self.csv_file = os.path.join(output_dir, f"fund_valuation_{timestamp}.csv")
+        self.count = 0
+
+        self._jsonl = open(self.jsonl_file, 'w', encoding='utf-8')
+        self._csv = open(self.csv_file, 'w', encoding='utf-8')
+        self._csv.write(CSV_HEADER + '\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write(self, result: FundQuote):
+        """追加一条结果，写入后立即刷新以便外部实时读取"""
+        self._jsonl.write(json.dumps(result.to_dict(), ensure_ascii=False) + '\n')
+        self._jsonl.flush()
+        self._csv.write(format_csv_row(result) + '\n')
+        self._csv.flush()
+        self.count += 1
+
+    def close(self):
+        """关闭文件"""
+        self._jsonl.close()
+        self._csv.close()
+
 
 class FundValuationRunner:
     """基金估值执行器"""
@@ -63,56 +129,180 @@ class FundValuationRunner:
         self,
         category_file: str = "category.txt",
         output_dir: str = "outputs",
-        max_workers: int = 4
+        max_workers: Optional[int] = None,
+        engine: str = "thread",
+        concurrency: int = 200,
+        cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+        hedge_percentile: Optional[float] = None,
+        rate_limit: float = DEFAULT_RATE_LIMIT,
+        adaptive: bool = True,
+        calendar: Optional[MarketCalendar] = None
     ):
         self.category_file = category_file
         self.output_dir = output_dir
-        self.max_workers = max_workers
+        self.max_workers = max_workers or default_max_workers(adaptive)
+        self.engine = engine
+        self.concurrency = concurrency
+        # 基金代码 → (上次结果, 下次刷新时间)，只记录刷新周期大于 0 的基金类型
+        self._last_quotes = {}
 
         os.makedirs(output_dir, exist_ok=True)
 
-        self.funds = CategoryParser.parse(category_file)
-
-        self.valuation = FundValuation()
-
-    def run_single(self, fund_info: Dict) -> Dict:
-        """单线程执行单只基金估值"""
-        return self.valuation.get_single_fund_data(fund_info['fund_code'])
-
-    def run_parallel(self) -> List[Dict]:
-        """并行执行所有基金估值"""
-        logger.info(f"开始并行估值 {len(self.funds)} 只基金 (线程数: {self.max_workers})...")
+        self.funds = CategoryParser.load(category_file)
 
-        results = []
-
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            future_to_fund = {
-                executor.submit(self.run_single, fund): fund 
-                for fund in self.funds
-            }
+        if engine == "async":
+            from fund_valuation_async import AsyncFundValuation
+            self.valuation = AsyncFundValuation(
+                max_concurrency=concurrency, cache_dir=cache_dir, hedge_percentile=hedge_percentile,
+                rate_limit=rate_limit, adaptive=adaptive, calendar=calendar
+            )
+        else:
+            self.valuation = FundValuation(
+                max_workers=self.max_workers, cache_dir=cache_dir, hedge_percentile=hedge_percentile,
+                rate_limit=rate_limit, adaptive=adaptive, calendar=calendar
+            )
+
+    def run_single(self, fund_info: Dict) -> Optional[FundQuote]:
+        """单线程执行单只基金估值，按分类文件中的基金类型选择获取计划"""
+        return self.valuation.get_single_fund_data(
+            fund_info['fund_code'],
+            fund_info.get('fund_type'),
+            fund_info.get('fund_name')
+        )
+
+    def _cached_quote(self, fund: Dict) -> Optional[FundQuote]:
+        """基金尚未到达其类型的刷新周期时返回上一次的结果，否则返回 None"""
+        entry = self._last_quotes.get(fund['fund_code'])
+        if entry and time.time() < entry[1]:
+            return entry[0]
+        return None
+
+    def _remember(self, fund: Dict, result: FundQuote):
+        """记录成功的结果及其下次刷新时间"""
+        if result.is_failed:
+            return
+        interval = plan_for_type(fund.get('fund_type')).refresh_interval
+        if interval > 0:
+            self._last_quotes[fund['fund_code']] = (result, time.time() + interval)
+
+    def _iter_parallel(self, ordered: bool = False) -> Iterator[Tuple[int, FundQuote]]:
+        """
+        并行估值（线程池或异步引擎的常驻事件循环），按完成顺序产出 (序号, 结果)，在途任务数有上限
 
-            for future in as_completed(future_to_fund):
-                fund = future_to_fund[future]
+        ordered 时只提交序号不超过 最早未完成序号 + 在途上限 的基金，未到刷新周期的基金也按序号取出，
+        慢基金阻塞时不再继续提交，调用方的重排缓冲区随之有界
+        """
+        max_in_flight = self.concurrency if self.engine == "async" else self.max_workers * 4
+        pending = {}
+        reused = []
+        funds = iter(enumerate(self.funds))
+        finished = set()
+        # 已取出的基金数与最早未完成的序号
+        pulled = 0
+        next_index = 0
+
+        def submit_next() -> bool:
+            """取出下一只基金：需要刷新的提交到线程池，未到刷新周期的放入 reused"""
+            nonlocal pulled
+            for index, fund in funds:
+                pulled = index + 1
+                quote = self._cached_quote(fund)
+                if quote:
+                    reused.append((index, quote))
+                else:
+                    # 提交到估值器内的常驻线程池或事件循环，监控模式下各轮次不再重复创建线程与连接
+                    future = self.valuation.submit_fund(fund['fund_code'], fund.get('fund_type'), fund.get('fund_name'))
+                    pending[future] = (index, fund)
+                return True
+            return False
+
+        def fill():
+            """在在途上限（ordered 时还有序号窗口）内尽量提交"""
+            while len(pending) < max_in_flight:
+                if ordered and pulled - next_index >= max_in_flight:
+                    return
+                if not submit_next():
+                    return
+
+        def finish(index: int):
+            nonlocal next_index
+            finished.add(index)
+            while next_index in finished:
+                finished.remove(next_index)
+                next_index += 1
+
+        fill()
+
+        reused_count = 0
+        while pending or reused:
+            while reused:
+                reused_count += 1
+                index, quote = reused.pop()
+                finish(index)
+                yield index, quote
+            fill()
+            if not pending:
+                if reused:
+                    continue
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, fund = pending.pop(future)
                 try:
                     result = future.result()
-                    results.append(result)
+                    if not result:
+                        result = FundQuote.failed(fund['fund_code'], "无法获取基金数据")
                 except Exception as e:
                     logger.error(f"基金 {fund['fund_code']} 估值失败: {e}")
-                    results.append({
-                        'fund_code': fund['fund_code'],
-                        'fund_name': '获取失败',
-                        'status': 'failed',
-                        'error': str(e),
-                        'update_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    })
-
-        # 按基金代码排序
-        code_order = {fund['fund_code']: i for i, fund in enumerate(self.funds)}
-        results.sort(key=lambda x: code_order.get(x.get('fund_code', ''), 999))
+                    result = FundQuote.failed(fund['fund_code'], str(e))
+                self._remember(fund, result)
+                finish(index)
+                yield index, result
+            fill()
 
-        return results
+        if reused_count:
+            logger.info(f"{reused_count} 只基金未到其类型的刷新周期，复用上次结果")
+
+    def iter_results(self, ordered: bool = False) -> Iterator[FundQuote]:
+        """
+        流式执行所有基金估值，每只基金完成后立即产出结果
 
-    def run_sequential(self) -> List[Dict]:
+        Args:
+            ordered: 是否按分类文件顺序产出；开启时用重排缓冲区暂存提前完成的结果，
+                提交窗口限制缓冲区不超过在途上限
+
+        Yields:
+            单只基金的估值结果
+        """
+        source = self._iter_parallel(ordered)
+
+        if not ordered:
+            for _, result in source:
+                yield result
+            return
+
+        buffer = {}
+        next_index = 0
+        for index, result in source:
+            buffer[index] = result
+            while next_index in buffer:
+                yield buffer.pop(next_index)
+                next_index += 1
+
+    def run_parallel(self) -> List[FundQuote]:
+        """并行执行所有基金估值"""
+        logger.info(f"开始并行估值 {len(self.funds)} 只基金 (并发上限: {self.max_workers})...")
+
+        return list(self.iter_results(ordered=True))
+
+    def run_async(self) -> List[FundQuote]:
+        """使用异步引擎在单个事件循环中执行所有基金估值"""
+        logger.info(f"开始异步估值 {len(self.funds)} 只基金 (并发数: {self.concurrency})...")
+
+        return list(self.iter_results(ordered=True))
+
+    def run_sequential(self) -> List[FundQuote]:
         """串行执行所有基金估值"""
         logger.info(f"开始串行估值 {len(self.funds)} 只基金...")
 
@@ -120,20 +310,52 @@ class FundValuationRunner:
         for i, fund in enumerate(self.funds, 1):
             logger.info(f"[{i}/{len(self.funds)}] 估值基金 {fund['fund_code']}...")
             result = self.run_single(fund)
-            results.append(result)
-            time.sleep(0.2)
+            results.append(result if result else FundQuote.failed(fund['fund_code'], "无法获取基金数据"))
 
         return results
 
-    def save_reports(self, results: List[Dict]):
+    def run_streaming(self, ordered: bool = False) -> Dict:
+        """
+        流式执行所有基金估值
+
+        结果到达即追加写入 JSONL/CSV 文件，同时单次遍历生成文本报告与统计，
+        内存占用与基金数量无关
+        """
+        logger.info(f"开始流式估值 {len(self.funds)} 只基金...")
+
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        text_file = os.path.join(self.output_dir, f"fund_valuation_{timestamp}.txt")
+
+        with StreamingResultWriter(self.output_dir, timestamp) as writer:
+            def tee_results():
+                for result in self.iter_results(ordered=ordered):
+                    writer.write(result)
+                    yield result
+
+            with open(text_file, 'w', encoding='utf-8') as f:
+                stats = write_report(tee_results(), f)
+
+        latest_text = os.path.join(self.output_dir, "fund_valuation_latest.txt")
+        shutil.copyfile(text_file, latest_text)
+
+        logger.info(f"流式结果已保存: {writer.jsonl_file}, {writer.csv_file}, {text_file} (共 {writer.count} 条)")
+        return {
+            'jsonl': writer.jsonl_file,
+            'csv': writer.csv_file,
+            'text': text_file,
+            'latest': latest_text,
+            'count': writer.count,
+            'stats': stats
+        }
+
+    def save_reports(self, results: List[FundQuote]):
         """保存各种格式的报告"""
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
 
         # 1. 文本报告
-        text_report = generate_report(results)
         text_file = os.path.join(self.output_dir, f"fund_valuation_{timestamp}.txt")
         with open(text_file, 'w', encoding='utf-8') as f:
-            f.write(text_report)
+            stats = write_report((r for r in results if r), f)
         logger.info(f"文本报告已保存: {text_file}")
 
         # 2. JSON报告
@@ -141,9 +363,9 @@ class FundValuationRunner:
             'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'summary': {
                 'total_funds': len(results),
-                'valid_estimates': sum(1 for r in results if r and r.get('fund_name') != '获取失败'),
+                'valid_estimates': stats.success_count,
             },
-            'funds': results
+            'funds': [r.to_dict() for r in results if r]
         }
         json_file = os.path.join(self.output_dir, f"fund_valuation_{timestamp}.json")
         with open(json_file, 'w', encoding='utf-8') as f:
@@ -151,11 +373,10 @@ class FundValuationRunner:
         logger.info(f"JSON报告已保存: {json_file}")
 
         # 3. CSV报告
-        lines = ['基金代码,基金名称,净值,日涨幅,估值,估值涨幅,更新时间']
+        lines = [CSV_HEADER]
         for r in results:
             if r:
-                line = f"{r.get('fund_code','')},{r.get('fund_name','')},{r.get('net_value','N/A')},{r.get('day_of_growth','N/A')},{r.get('forecast_net_value',0)},{r.get('forecast_growth',0):.2f}%,{r.get('update_time','')}"
-                lines.append(line)
+                lines.append(format_csv_row(r))
         csv_file = os.path.join(self.output_dir, f"fund_valuation_{timestamp}.csv")
         with open(csv_file, 'w', encoding='utf-8') as f:
             f.write('\n'.join(lines))
@@ -163,8 +384,7 @@ class FundValuationRunner:
 
         # 4. 最新报告
         latest_text = os.path.join(self.output_dir, "fund_valuation_latest.txt")
-        with open(latest_text, 'w', encoding='utf-8') as f:
-            f.write(text_report)
+        shutil.copyfile(text_file, latest_text)
 
         return {
             'text': text_file,
@@ -173,50 +393,48 @@ class FundValuationRunner:
             'latest': latest_text
         }
 
-    def print_summary(self, results: List[Dict]):
+    def print_summary(self, results: Iterable[FundQuote]):
         """打印估值摘要"""
+        stats = ReportStats()
+        for r in results:
+            if r:
+                stats.add(r)
+        self.print_stats(stats)
+
+    def print_stats(self, stats: ReportStats):
+        """根据统计结果打印估值摘要"""
         print("\n" + "=" * 80)
         print("基金估值执行摘要")
         print("=" * 80)
 
-        total = len(results)
-        success = sum(1 for r in results if r and r.get('fund_name') != '获取失败')
-        failed = total - success
+        print(f"\n总计: {stats.total_count} 只基金")
+        print(f"成功: {stats.success_count} 只")
+        print(f"失败: {stats.failed_count} 只")
 
-        print(f"\n总计: {total} 只基金")
-        print(f"成功: {success} 只")
-        print(f"失败: {failed} 只")
+        if stats.growth_count:
+            print(f"\n平均估值涨幅: {stats.avg_growth:+.2f}%")
+            print(f"涨跌分布: 涨{stats.rise_count} 跌{stats.fall_count} 平{stats.flat_count}")
 
-        if success > 0:
-            valid_results = [r for r in results if r and r.get('fund_name') != '获取失败']
+            print("\n涨幅前五:")
+            for code, name, growth in stats.top():
+                print(f"  {code} {name}:        {growth:+.2f}%")
 
-            valid_growths = [r.get('forecast_growth', 0) for r in valid_results 
-                           if isinstance(r.get('forecast_growth'), (int, float))]
+            print("\n跌幅前五:")
+            for code, name, growth in stats.bottom():
+                print(f"  {code} {name}:        {growth:+.2f}%")
 
-            if valid_growths:
-                avg_growth = sum(valid_growths) / len(valid_growths)
-                print(f"\n平均估值涨幅: {avg_growth:+.2f}%")
-
-                rise = sum(1 for g in valid_growths if g > 0)
-                fall = sum(1 for g in valid_growths if g < 0)
-                flat = sum(1 for g in valid_growths if g == 0)
-
-                print(f"涨跌分布: 涨{rise} 跌{fall} 平{flat}")
-
-                print("\n涨幅前五:")
-                sorted_results = sorted(valid_results, key=lambda x: x.get('forecast_growth', 0), reverse=True)
-                for r in sorted_results[:5]:
-                    print(f"  {r['fund_code']} {r['fund_name']}:        {r.get('forecast_growth', 0):+.2f}%")
+        if stats.failed_funds:
+            print("\n估值失败的基金:")
+            for code, error in stats.failed_funds:
+                print(f"  {code}: {error}")
 
-                print("\n跌幅前五:")
-                for r in sorted_results[-5:]:
-                    print(f"  {r['fund_code']} {r['fund_name']}:        {r.get('forecast_growth', 0):+.2f}%")
+        if self.valuation.hedge_percentile:
+            print(f"\n{self.valuation.hedge_stats.summary()}")
 
-        failed_funds = [r for r in results if r and r.get('fund_name') == '获取失败']
-        if failed_funds:
-            print("\n估值失败的基金:")
-            for r in failed_funds:
-                print(f"  {r['fund_code']}: {r.get('error', '未知错误')}")
+        print(f"\n{self.valuation.concurrency.summary()}")
+        print(format_pool_stats(self.valuation.pool_stats()))
+        if self.valuation.rate_limiter:
+            print(self.valuation.rate_limiter.summary())
 
         print("\n" + "=" * 80)
 
@@ -242,28 +460,71 @@ def main():
 
   # 监控模式（定时刷新）
   python fund_valuation_runner.py --monitor -t 60
+
+  # 监控模式按交易时段调度（休市时休眠，节假日从文件读取）
+  python fund_valuation_runner.py --monitor -t 60 --market-hours --holidays holidays.txt
+
+  # 流式输出（结果到达即写入 JSONL/CSV，--ordered 保持分类文件顺序）
+  python fund_valuation_runner.py --stream --ordered
+
+  # 异步引擎（单进程保持数百个请求在途）
+  python fund_valuation_runner.py --engine async --concurrency 300
         """
     )
 
     parser.add_argument("-i", "--input", type=str, default="category.txt",
-                        help="输入分类文件路径 (默认: category.txt)")
+                        help="输入分类文件路径，支持文本与索引格式 (默认: category.txt)")
     parser.add_argument("-o", "--output", type=str, default="outputs",
                         help="输出目录路径 (默认: outputs)")
     parser.add_argument("--sequential", action="store_true",
                         help="串行执行（不使用并行）")
-    parser.add_argument("--workers", type=int, default=4,
-                        help="并行线程数 (默认: 4)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help=f"最大并行线程数，实际并发按上游延迟与失败率自适应调整 "
+                             f"(默认: {ADAPTIVE_MAX_WORKERS}，--fixed-concurrency 时为 {DEFAULT_MAX_WORKERS})")
+    parser.add_argument("--fixed-concurrency", action="store_true",
+                        help="固定并发：线程引擎固定为 --workers，异步引擎固定为 --concurrency，不做自适应调整")
+    parser.add_argument("--engine", type=str, choices=["thread", "async"], default="thread",
+                        help="估值引擎: thread(线程池) 或 async(asyncio) (默认: thread)")
+    parser.add_argument("--concurrency", type=int, default=200,
+                        help="异步引擎最大并发基金数 (默认: 200)")
+    parser.add_argument("--cache-dir", type=str, default=DEFAULT_CACHE_DIR,
+                        help=f"基金元数据缓存目录 (默认: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="不使用本地元数据缓存")
+    parser.add_argument("--hedge-percentile", type=float, default=None,
+                        help="对冲请求：天天基金超过该耗时分位（如 95）未返回时同时请求东方财富网 (默认: 不对冲)")
+    parser.add_argument("--rate-limit", type=float, default=DEFAULT_RATE_LIMIT,
+                        help=f"每个主机的速率上限（次/秒），实际速率从 {DEFAULT_INITIAL_RATE:g} 起自动探测，遇到限流自动降速，0 表示不限速 (默认: {DEFAULT_RATE_LIMIT:g})")
+    parser.add_argument("--stream", action="store_true",
+                        help="流式模式：结果到达即追加写入 JSONL/CSV")
+    parser.add_argument("--ordered", action="store_true",
+                        help="流式模式下按分类文件顺序输出")
     parser.add_argument("--monitor", action="store_true",
                         help="监控模式（定时刷新）")
     parser.add_argument("-t", "--interval", type=int, default=60,
                         help="监控模式刷新间隔秒数 (默认: 60)")
+    parser.add_argument("--market-hours", action="store_true",
+                        help="监控模式按交易时段调度：交易时段内按 --interval 刷新，交易日净值发布窗口（18-23 点）内"
+                             "按 --nav-interval 刷新，午休、夜间、周末与节假日休眠")
+    parser.add_argument("--nav-interval", type=int, default=600,
+                        help="按交易时段调度时，净值发布窗口内的刷新间隔秒数 (默认: 600)")
+    parser.add_argument("--holidays", type=str, default=None,
+                        help="节假日文件，每行一个 YYYY-MM-DD（# 开头为注释），用于判断交易日 (默认: 只按工作日判断)")
 
     args = parser.parse_args()
 
+    calendar = MarketCalendar.from_file(args.holidays)
     runner = FundValuationRunner(
         category_file=args.input,
         output_dir=args.output,
-        max_workers=args.workers
+        max_workers=args.workers,
+        engine=args.engine,
+        concurrency=args.concurrency,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        hedge_percentile=args.hedge_percentile,
+        rate_limit=args.rate_limit,
+        adaptive=not args.fixed_concurrency,
+        calendar=calendar
     )
 
     if not runner.funds:
@@ -272,7 +533,15 @@ def main():
 
     def run_once():
         """执行单次估值"""
-        if args.sequential:
+        if args.stream:
+            stream_files = runner.run_streaming(ordered=args.ordered)
+            runner.print_stats(stream_files['stats'])
+            logger.info(f"估值完成！共 {stream_files['count']} 只基金，已保存到 {args.output} 目录")
+            return
+
+        if args.engine == "async":
+            results = runner.run_async()
+        elif args.sequential:
             results = runner.run_sequential()
         else:
             results = runner.run_parallel()
@@ -285,13 +554,23 @@ def main():
 
     if args.monitor:
         logger.info(f"启动监控模式，刷新间隔: {args.interval}秒")
+        scheduler = MarketScheduler(calendar, args.interval, args.nav_interval) if args.market_hours else None
+        if scheduler:
+            logger.info(f"按交易时段调度，净值发布窗口刷新间隔: {args.nav_interval}秒")
         logger.info("按 Ctrl+C 停止监控")
 
         try:
             while True:
+                cycle_start = datetime.now()
                 run_once()
-                logger.info(f"\n等待 {args.interval} 秒后下次刷新...")
-                time.sleep(args.interval)
+                if scheduler is None:
+                    logger.info(f"\n等待 {args.interval} 秒后下次刷新...")
+                    time.sleep(args.interval)
+                    continue
+
+                next_run, reason = scheduler.next_run(cycle_start)
+                logger.info(f"\n下一次刷新: {next_run:%Y-%m-%d %H:%M:%S} ({reason})")
+                sleep_until(next_run)
         except KeyboardInterrupt:
             logger.info("\n监控已停止")
     else:
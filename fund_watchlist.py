@@ -0,0 +1,124 @@
+# -*- coding: UTF-8 -*-
+"""
+多基金列表调度模块 v1.0
+单个进程同时监控多个基金列表（组合），每个列表有各自的刷新间隔与优先级：
+- 多个列表共有的基金只获取一次，按所在列表中最短的刷新间隔、最高的优先级刷新
+- 堆中保存 (下次刷新时间, -优先级, 基金代码)，同时到期的基金按优先级先提交
+- 获取结果分发到包含该基金的每个列表的报告
+"""
+
+import heapq
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fund_valuation import read_fund_codes_from_file
+
+
+@dataclass
+class Watchlist:
+    """一个基金列表及其刷新设置"""
+
+    name: str
+    fund_codes: List[str]
+    interval: float
+    output_file: str
+    priority: int = 0
+    # 基金代码集合，用于快速判断列表是否包含某只基金
+    code_set: frozenset = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.code_set = frozenset(self.fund_codes)
+
+    @classmethod
+    def parse(cls, spec: str, default_interval: float) -> "Watchlist":
+        """
+        解析命令行列表参数：基金文件[,刷新间隔[,优先级[,输出文件]]]
+
+        输出文件默认与基金文件同目录，文件名为 <基金文件名>_valuation.txt
+        """
+        parts = [part.strip() for part in spec.split(",")]
+        fund_file = parts[0]
+        try:
+            interval = float(parts[1]) if len(parts) > 1 and parts[1] else default_interval
+            priority = int(parts[2]) if len(parts) > 2 and parts[2] else 0
+        except ValueError:
+            raise ValueError(f"基金列表参数格式不正确: {spec}（应为 基金文件[,刷新间隔[,优先级[,输出文件]]]）")
+        if interval <= 0:
+            raise ValueError(f"基金列表刷新间隔必须大于 0: {spec}")
+
+        stem = os.path.splitext(fund_file)[0]
+        output_file = parts[3] if len(parts) > 3 and parts[3] else f"{stem}_valuation.txt"
+        return cls(
+            name=os.path.basename(stem),
+            fund_codes=read_fund_codes_from_file(fund_file),
+            interval=interval,
+            output_file=output_file,
+            priority=priority
+        )
+
+
+class WatchlistScheduler:
+    """多个基金列表共用的刷新堆（按基金去重）"""
+
+    def __init__(self, watchlists: Iterable[Watchlist]):
+        self.watchlists = sorted(watchlists, key=lambda watchlist: -watchlist.priority)
+        # 基金代码 → (刷新间隔, 优先级)，取所在列表中最短的间隔与最高的优先级
+        self._plans: Dict[str, Tuple[float, int]] = {}
+        for watchlist in self.watchlists:
+            for code in watchlist.fund_codes:
+                interval, priority = self._plans.get(code, (watchlist.interval, watchlist.priority))
+                self._plans[code] = (min(interval, watchlist.interval), max(priority, watchlist.priority))
+
+        # 基金代码 → 当前有效的下次刷新时间；堆中与之不一致的条目已被重新安排，弹出时丢弃
+        self._due: Dict[str, float] = dict.fromkeys(self._plans, 0.0)
+        self._heap: List[Tuple[float, int, str]] = [
+            (0.0, -priority, code) for code, (_, priority) in self._plans.items()
+        ]
+        heapq.heapify(self._heap)
+
+    @property
+    def fund_codes(self) -> List[str]:
+        """所有列表去重后的基金代码"""
+        return list(self._plans)
+
+    def interval(self, code: str) -> float:
+        return self._plans[code][0]
+
+    def _discard_stale(self):
+        while self._heap and self._due.get(self._heap[0][2]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def next_due(self) -> Optional[float]:
+        """最早到期的时间戳，堆为空时返回 None"""
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> List[str]:
+        """
+        弹出所有已到期的基金，按优先级从高到低、到期时间从早到晚排列
+
+        弹出的基金需要调用 reschedule 重新安排
+        """
+        due = []
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > now:
+                break
+            due_at, neg_priority, code = heapq.heappop(self._heap)
+            del self._due[code]
+            due.append((neg_priority, due_at, code))
+        due.sort()
+        return [code for _, _, code in due]
+
+    def reschedule(self, code: str, now: float, delay: Optional[float] = None):
+        """安排基金下一次刷新，delay 默认为其刷新间隔"""
+        interval, priority = self._plans[code]
+        due_at = now + (interval if delay is None else delay)
+        self._due[code] = due_at
+        heapq.heappush(self._heap, (due_at, -priority, code))
+
+    def lists_for(self, codes: Iterable[str]) -> List[Watchlist]:
+        """包含任一基金的列表（按优先级从高到低）"""
+        codes = set(codes)
+        return [watchlist for watchlist in self.watchlists if not codes.isdisjoint(watchlist.code_set)]
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""
+fund_parser 解析耗时基准测试
+对保存的 matiaria 页面逐个比较旧的三次 re.search 与单次扫描解析，输出每只基金的平均解析耗时（微秒）
+
+用法:
+    python scripts/bench_parser.py [--fixtures scripts/fixtures] [--repeat 2000]
+
+fixtures 目录下的 *.html 为 https://www.fund123.cn/matiaria?fundCode=xxxxxx 页面，
+目录为空时使用合成页面。仓库自带的两个页面不是线上保存的页面，而是按页面结构（HTML + window.context
+内嵌状态 JSON）离线构造的，耗时只能作为相对比较；请将真实保存的页面放入该目录一并比较：
+- matiaria_000001.html: 普通混合型基金，fundInfo 之后还有相似基金列表中的同名字段
+- matiaria_164824.html: QDII 基金，fundInfo 缺少 dayOfGrowth，旧实现会取到相似基金的值
+
+解析结果以 json 解码 window.context 中 fundInfo 的结果为准，新实现与之不一致时以非零状态退出；
+旧实现与之不一致时只提示
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fund_parser import parse_csrf_token, parse_fund123_detail  # noqa: E402
+
+DEFAULT_FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def legacy_parse_fund123_detail(text: str) -> dict:
+    """v1 实现：三次独立的 re.search"""
+    day_of_growth_match = re.search(r'"dayOfGrowth":"(.*?)"', text)
+    net_value_match = re.search(r'"netValue":"(.*?)"', text)
+    net_value_date_match = re.search(r'"netValueDate":"(.*?)"', text)
+    return {
+        "day_of_growth": day_of_growth_match.group(1) if day_of_growth_match else "N/A",
+        "net_value": net_value_match.group(1) if net_value_match else "N/A",
+        "net_value_date": net_value_date_match.group(1) if net_value_date_match else "N/A"
+    }
+
+
+def legacy_parse_csrf_token(text: str) -> str:
+    csrf_match = re.search(r'"csrf":"(.*?)"', text)
+    return csrf_match.group(1) if csrf_match else ""
+
+
+def reference_parse(text: str):
+    """json 解码 window.context 状态 JSON，返回 (fundInfo 中的净值数据, CSRF令牌)；页面没有状态 JSON 时返回 None"""
+    start = text.find("window.context")
+    if start < 0:
+        return None
+    start = text.find("{", start)
+    state, _ = json.JSONDecoder().raw_decode(text, start)
+    fund_info = state.get("fundInfo", {})
+    detail = {
+        "day_of_growth": fund_info.get("dayOfGrowth", "N/A"),
+        "net_value": fund_info.get("netValue", "N/A"),
+        "net_value_date": fund_info.get("netValueDate", "N/A")
+    }
+    return detail, state.get("csrf", "")
+
+
+def synthetic_page() -> str:
+    """构造与 matiaria 页面结构相近的合成页面（大段 HTML + 内嵌状态 JSON）"""
+    filler = "<div class=\"row\"><span>占位内容</span><a href=\"/fund/000001\">链接</a></div>\n" * 3000
+    state = (
+        '<script>window.context = {"csrf":"abcdef0123456789",'
+        '"fundInfo":{"fundCode":"000001","fundName":"华夏成长混合","key":"F000001",'
+        '"dayOfGrowth":"0.52","netValue":"1.2345","netValueDate":"2024-01-02"}}</script>\n'
+    )
+    return "<html><head><title>matiaria</title></head><body>\n" + filler + state + filler + "</body></html>"
+
+
+def load_fixtures(fixtures_dir: str) -> dict:
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(fixtures_dir, "*.html"))):
+        with open(path, "r", encoding="utf-8") as f:
+            pages[os.path.basename(path)] = f.read()
+    if not pages:
+        pages["<synthetic>"] = synthetic_page()
+    return pages
+
+
+def bench(func, text: str, repeat: int) -> float:
+    """返回单次调用的平均耗时（微秒）"""
+    return timeit.timeit(lambda: func(text), number=repeat) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fund_parser 解析耗时基准测试")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES_DIR, help="保存的页面目录")
+    parser.add_argument("--repeat", type=int, default=2000, help="每个页面的重复次数")
+    args = parser.parse_args()
+
+    pages = load_fixtures(args.fixtures)
+
+    print(f"{'页面':<24}{'大小(KB)':>10}{'旧详情(µs)':>14}{'新详情(µs)':>14}{'旧CSRF(µs)':>14}{'新CSRF(µs)':>14}")
+    totals = [0.0, 0.0, 0.0, 0.0]
+    for name, text in pages.items():
+        expected = reference_parse(text)
+        if expected:
+            if (parse_fund123_detail(text), parse_csrf_token(text)) != expected:
+                print(f"{name}: 解析结果与状态 JSON 不一致", file=sys.stderr)
+                sys.exit(1)
+            if legacy_parse_fund123_detail(text) != expected[0]:
+                print(f"{name}: 旧实现取到了 fundInfo 以外的字段", file=sys.stderr)
+
+        timings = [
+            bench(legacy_parse_fund123_detail, text, args.repeat),
+            bench(parse_fund123_detail, text, args.repeat),
+            bench(legacy_parse_csrf_token, text, args.repeat),
+            bench(parse_csrf_token, text, args.repeat)
+        ]
+        totals = [t + v for t, v in zip(totals, timings)]
+        print(f"{name:<24}{len(text) / 1024:>10.1f}" + "".join(f"{v:>14.1f}" for v in timings))
+
+    count = len(pages)
+    print(f"{'平均':<24}{'':>10}" + "".join(f"{v / count:>14.1f}" for v in totals))
+
+
+if __name__ == "__main__":
+    main()